@@ -0,0 +1,73 @@
+# api_paging.py
+"""
+Paginação por chave (keyset) para as APIs de listagem do app.py e web_app.py.
+
+Parâmetros aceitos na query string:
+    limit   itens por página (padrão `config.API_PAGE_SIZE`, máximo `config.API_PAGE_SIZE_MAX`)
+    cursor  valor da chave do último registro da página anterior (ex.: idpedido)
+    q       texto de busca
+    status  filtro de status
+
+O corpo continua sendo uma lista JSON; a paginação vai nos cabeçalhos:
+    X-Total-Count  total de registros que atendem aos filtros
+    X-Next-Cursor  cursor da próxima página (ausente na última)
+    Link           URL da próxima página (rel="next")
+"""
+from urllib.parse import urlencode
+
+from flask import jsonify, request
+
+import config
+
+
+class PageArgsError(ValueError):
+    """Parâmetro de paginação inválido (responder com 400)."""
+
+
+def parse_page_args(args=None):
+    """Lê limit/cursor/q/status da requisição, validando os valores numéricos."""
+    args = request.args if args is None else args
+    try:
+        limit = int(args.get('limit', config.API_PAGE_SIZE))
+    except ValueError:
+        raise PageArgsError("Parâmetro 'limit' deve ser um número inteiro")
+    if limit < 1:
+        raise PageArgsError("Parâmetro 'limit' deve ser maior que zero")
+
+    cursor = args.get('cursor') or None
+    if cursor is not None:
+        try:
+            cursor = int(cursor)
+        except ValueError:
+            raise PageArgsError("Parâmetro 'cursor' inválido")
+
+    return {
+        'limit': min(limit, config.API_PAGE_SIZE_MAX),
+        'cursor': cursor,
+        'q': (args.get('q') or '').strip() or None,
+        'status': (args.get('status') or '').strip() or None,
+    }
+
+
+def like(term):
+    """Padrão LIKE para busca por trecho, escapando os curingas do próprio termo."""
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def where_clause(conditions):
+    """Monta o WHERE a partir de uma lista de condições (vazio se não houver nenhuma)."""
+    return "WHERE " + " AND ".join(conditions) if conditions else ""
+
+
+def paged_response(data, total, next_cursor, page):
+    """Resposta JSON (lista) com os cabeçalhos de paginação."""
+    response = jsonify(data)
+    response.headers['X-Total-Count'] = str(total)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+        query = {k: v for k, v in request.args.items() if k != 'cursor'}
+        query['cursor'] = next_cursor
+        query['limit'] = page['limit']
+        response.headers['Link'] = f'<{request.path}?{urlencode(query)}>; rel="next"'
+    return response
@@ -0,0 +1,110 @@
+# api_stream.py
+"""
+Respostas JSON em streaming para as APIs de listagem do web_app.py.
+
+Por padrão as rotas fazem `fetchall()` + `jsonify`, o que mantém o resultado
+inteiro duas vezes na memória do worker (linhas + texto JSON). No modo
+streaming a consulta usa um cursor sem buffer (`SSDictCursor`) e o corpo é
+gerado em blocos de `config.API_STREAM_BATCH` linhas, então a memória fica
+constante qualquer que seja o tamanho do resultado.
+
+O modo é opcional, escolhido pela requisição:
+    ?stream=1                       lista JSON (`[{...},{...}]`) enviada aos poucos
+    ?stream=ndjson                  um objeto JSON por linha (application/x-ndjson)
+    Accept: application/x-ndjson    o mesmo que ?stream=ndjson
+
+Uso numa rota:
+    fmt = stream_format()
+    if fmt:
+        return stream_query(sql, params, fmt, transform=...)
+
+A conexão fica emprestada até o fim do envio e volta ao pool mesmo se o
+cliente desconectar no meio. Um erro depois que o corpo começou a ser enviado
+não pode mais virar um 500: em NDJSON vai uma última linha `{"error": ...}`,
+em JSON a lista fica incompleta (JSON inválido) e o erro vai para o log.
+"""
+import logging
+
+import pymysql
+from flask import Response, current_app, request, stream_with_context
+
+import config
+from models import get_raw_connection
+
+logger = logging.getLogger(__name__)
+
+FORMATO_JSON = 'json'
+FORMATO_NDJSON = 'ndjson'
+MIMETYPES = {
+    FORMATO_JSON: 'application/json',
+    FORMATO_NDJSON: 'application/x-ndjson',
+}
+
+
+def stream_format(args=None, headers=None):
+    """Formato de streaming pedido pela requisição ('json', 'ndjson') ou None (resposta normal)."""
+    args = request.args if args is None else args
+    headers = request.headers if headers is None else headers
+    valor = (args.get('stream') or '').strip().lower()
+    if valor == FORMATO_NDJSON or 'application/x-ndjson' in headers.get('Accept', ''):
+        return FORMATO_NDJSON
+    if valor in ('1', 'true', FORMATO_JSON):
+        return FORMATO_JSON
+    return None
+
+
+def _linhas(cursor, transform):
+    """Lê o cursor em lotes, aplicando `transform` a cada linha."""
+    while True:
+        lote = cursor.fetchmany(config.API_STREAM_BATCH)
+        if not lote:
+            return
+        if transform is not None:
+            lote = [transform(row) for row in lote]
+        yield lote
+
+
+def _gerar(connection, cursor, fmt, transform):
+    dumps = current_app.json.dumps
+    primeiro = True
+    try:
+        if fmt == FORMATO_JSON:
+            yield '['
+        for lote in _linhas(cursor, transform):
+            if fmt == FORMATO_NDJSON:
+                yield ''.join(dumps(row) + '\n' for row in lote)
+            else:
+                corpo = ','.join(dumps(row) for row in lote)
+                yield corpo if primeiro else ',' + corpo
+            primeiro = False
+        if fmt == FORMATO_JSON:
+            yield ']'
+    except Exception as e:
+        logger.exception("Erro durante o envio em streaming: %s", e)
+        if fmt == FORMATO_NDJSON:
+            yield dumps({"error": "Erro ao buscar dados"}) + '\n'
+    finally:
+        # SSCursor.close() descarta as linhas não lidas, liberando a conexão para o pool
+        try:
+            cursor.close()
+        finally:
+            connection.close()
+
+
+def stream_query(sql, params=None, fmt=FORMATO_JSON, transform=None):
+    """
+    Executa `sql` com cursor sem buffer e devolve uma Response que envia as linhas aos poucos.
+
+    A consulta é executada antes de montar a resposta, então erros de SQL/conexão
+    ainda sobem para o `except` da rota (e viram o 500 habitual).
+    `transform(row)` pode ajustar cada linha (ex.: converter datas) antes da serialização.
+    """
+    connection = get_raw_connection()
+    try:
+        cursor = connection.cursor(pymysql.cursors.SSDictCursor)
+        cursor.execute(sql, params)
+    except Exception:
+        connection.close()
+        raise
+    return Response(stream_with_context(_gerar(connection, cursor, fmt, transform)),
+                    mimetype=MIMETYPES[fmt])
@@ -2,10 +2,12 @@
 import os
 import secrets
 import hashlib
+import hmac
 import json
 import traceback
 import io
 from datetime import datetime, timezone, timedelta
+from functools import wraps
 import logging
 
 from flask import (
@@ -15,13 +17,20 @@ from flask import (
 from markupsafe import Markup
 from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
-from sqlalchemy import func, desc, text
+from sqlalchemy import func, desc, text, bindparam
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import scoped_session, sessionmaker
 
 # models & config
-from models import Base, User, RememberToken, get_engine, get_session
+from models import Base, User, RememberToken, get_engine, get_session, get_engine_metrics, get_raw_connection
 import config
+from api_paging import PageArgsError, parse_page_args, paged_response, like, where_clause
+from ref_cache import cached, invalidate, cache_stats
+from http_cache import conditional_response
+from log_setup import setup_logging, logging_stats
+import request_metrics
+from slow_query import slow_query_report
+from migrations import upgrade_on_startup
 
 # passlib handlers (passlib bcrypt + legacy handlers)
 from passlib.context import CryptContext
@@ -42,12 +51,12 @@ print("passlib bcrypt exemplo:", pwd_context.hash("teste")[:60], "...")
 app = Flask(__name__, static_folder='static', template_folder='templates')
 app.secret_key = config.SECRET_KEY
 app.permanent_session_lifetime = config.PERMANENT_SESSION_LIFETIME
+request_metrics.init_app(app)  # Server-Timing + percentis por endpoint (/metrics/requests)
 
-# Logging to stdout (Render captures stdout/stderr)
-LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG")
-logging.basicConfig(level=getattr(logging, LOG_LEVEL.upper(), logging.DEBUG),
-                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+# Logging to stdout (Render captures stdout/stderr) + config.LOG_FILE, via fila (log_setup.py)
+setup_logging()
 logger = logging.getLogger(__name__)
+request_logger = logging.getLogger('requests')
 
 # Enable debug if running on Render or if FLASK_DEBUG is set
 app.debug = (os.getenv("RENDER", "0") == "1") or (os.getenv("FLASK_DEBUG", "0") == "1")
@@ -104,6 +113,7 @@ app.register_blueprint(menu_bp)
 # Database setup
 engine = get_engine()
 Base.metadata.create_all(engine)
+upgrade_on_startup(get_raw_connection)  # só com DB_AUTO_MIGRATE=1 (ver migrations.py)
 SessionLocal = scoped_session(sessionmaker(bind=engine))
 
 @app.teardown_appcontext
@@ -111,17 +121,10 @@ def shutdown_session(exception=None):
     """Garante que a sessão do banco de dados seja removida após cada requisição."""
     SessionLocal.remove()
 
-# Logger (write simple debug + timings) - mantém seu arquivo de log local também
+# Logger (write simple debug + timings) - vai para config.LOG_FILE pela fila do log_setup
 def write_debug_log(entries: dict):
-    try:
-        with open(config.LOG_FILE, 'a', encoding='utf-8') as f:
-            f.write(datetime.now(timezone.utc).strftime('[%Y-%m-%d %H:%M:%S] '))
-            for k, v in entries.items():
-                f.write(f"{k}: {v}\n")
-            f.write("\n")
-    except Exception as e:
-        # se não der para escrever no arquivo, garantir que algo seja logado no stdout
-        logger.exception("Falha ao escrever em config.LOG_FILE: %s", e)
+    # Uma linha só; a gravação em disco acontece na thread do QueueListener
+    request_logger.debug(" ".join(f"{k}={v}" for k, v in entries.items()))
 
 @app.before_request
 def before_request_logging():
@@ -132,9 +135,8 @@ def before_request_logging():
         "SERVER_NAME": request.host,
         "SCRIPT_NAME": request.path
     }
-    # escreve no arquivo local (se houver) e no stdout
+    # escreve no arquivo local e no stdout (DEBUG: amostrado conforme LOG_DEBUG_SAMPLE_RATE)
     write_debug_log(entries)
-    logger.debug("Request: %s %s", request.method, request.path)
 
 # -------------------------
 # Helpers: remember-me token
@@ -378,6 +380,7 @@ def install():
             db.add(u)
             try:
                 db.commit()
+                invalidate('usuarios')
                 flash("Usuário criado. Faça login.", "success")
                 return redirect(url_for('login'))
             except IntegrityError:
@@ -424,47 +427,112 @@ def inicio():
         traceback.print_exc()
         return f"Erro ao carregar pedidos: {e}", 500
 
+# Tabelas lidas pelas APIs do dashboard (marcam as entradas do ref_cache).
+# As do slide-data não têm `atualizado_em`, então essa rota fica sem ETag (http_cache.py).
+SLIDE_DATA_TABLES = ('cliente', 'cliente_produto', 'equipamento_produto', 'equipamento', 'produto')
+PEDIDOS_TABLES = ('pedido', 'add_cliente', 'cliente_item')
+
 @app.route('/api/slide-data')
 def api_slide_data():
-    """Endpoint da API para fornecer dados para o dashboard."""
+    """
+    Endpoint da API para fornecer dados para o dashboard.
+    Paginado por cliente (idcliente crescente): cada página traz todos os itens de até `limit` clientes.
+    """
     if not session.get('user_id'):
         return jsonify({"error": "Não autorizado"}), 401
-
-    db = SessionLocal()
     try:
-        sql = text("""
-        SELECT
-            c.cliente AS nome_cliente,
-            cp.status_producao,
-            e.equipamento_pai,
-            p.conjunto
+        page = parse_page_args()
+    except PageArgsError as e:
+        return jsonify({"error": str(e)}), 400
+
+    base_from = """
         FROM cliente AS c
         LEFT JOIN cliente_produto AS cp ON c.idcliente = cp.id_cliente
         LEFT JOIN equipamento_produto AS ep ON cp.id_equipamento_produto = ep.id_equipamento_produto
         LEFT JOIN equipamento AS e ON ep.idequipamento = e.idequipamento
         LEFT JOIN produto AS p ON ep.idproduto = p.idproduto
-        WHERE cp.status_producao IS NOT NULL 
-          AND cp.status_producao != ''
-          AND cp.status_producao != 'Finalizado'
-        ORDER BY c.idcliente
-        """)
-        result = db.execute(sql).mappings().all()
-        # Converte a lista de RowMapping para uma lista de dicionários
-        data = [dict(row) for row in result]
-        return jsonify(data)
+    """
+    where = [
+        "cp.status_producao IS NOT NULL",
+        "cp.status_producao != ''",
+        "cp.status_producao != 'Finalizado'",
+    ]
+    params = {}
+    if page['q']:
+        where.append("(c.cliente LIKE :q OR e.equipamento_pai LIKE :q OR p.conjunto LIKE :q)")
+        params['q'] = like(page['q'])
+    if page['status']:
+        where.append("cp.status_producao = :status")
+        params['status'] = page['status']
+    page_where = where + (["c.idcliente > :cursor"] if page['cursor'] is not None else [])
+
+    def carregar():
+        db = SessionLocal()
+        total = db.execute(text(f"SELECT COUNT(DISTINCT c.idcliente) {base_from} {where_clause(where)}"), params).scalar()
+
+        # Clientes da página (um a mais para saber se existe a próxima)
+        ids = db.execute(
+            text(f"SELECT DISTINCT c.idcliente {base_from} {where_clause(page_where)} ORDER BY c.idcliente LIMIT :limit"),
+            dict(params, cursor=page['cursor'], limit=page['limit'] + 1)).scalars().all()
+        next_cursor = ids[page['limit'] - 1] if len(ids) > page['limit'] else None
+        ids = ids[:page['limit']]
+
+        data = []
+        if ids:
+            sql = text(f"""
+            SELECT
+                c.cliente AS nome_cliente,
+                cp.status_producao,
+                e.equipamento_pai,
+                p.conjunto
+            {base_from}
+            {where_clause(where + ["c.idcliente IN :ids"])}
+            ORDER BY c.idcliente
+            """).bindparams(bindparam('ids', expanding=True))
+            result = db.execute(sql, dict(params, ids=ids)).mappings().all()
+            # Converte a lista de RowMapping para uma lista de dicionários
+            data = [dict(row) for row in result]
+        return {'data': data, 'total': total, 'next_cursor': next_cursor}
+
+    try:
+        # Compartilhado entre os workers quando REF_CACHE_BACKEND é sqlite/redis
+        pagina = cached(('app:slide-data', tuple(sorted(page.items()))), SLIDE_DATA_TABLES,
+                        carregar, ttl=config.DASHBOARD_CACHE_TTL)
+        return paged_response(pagina['data'], pagina['total'], pagina['next_cursor'], page)
     except Exception as e:
         logger.exception("Erro na API /api/slide-data: %s", e)
         return jsonify({"error": "Erro interno ao buscar dados"}), 500
 
 @app.route('/api/pedidos')
+@conditional_response(*PEDIDOS_TABLES)
 def api_pedidos():
-    """Endpoint da API para fornecer a lista de pedidos."""
+    """
+    Endpoint da API para fornecer a lista de pedidos, do mais recente para o mais antigo.
+    Aceita `q` (número, cliente ou endereço), `status` (status de algum item do pedido),
+    `limit` e `cursor` (idpedido do último pedido da página anterior).
+    """
     if not session.get('user_id'):
         return jsonify({"error": "Não autorizado"}), 401
-
-    db = SessionLocal()
     try:
-        pedidos_sql = text("""
+        page = parse_page_args()
+    except PageArgsError as e:
+        return jsonify({"error": str(e)}), 400
+
+    where, params = [], {}
+    if page['q']:
+        where.append("(p.numero_pedido LIKE :q OR ac.cliente LIKE :q OR ac.endereco LIKE :q)")
+        params['q'] = like(page['q'])
+    if page['status']:
+        where.append("EXISTS (SELECT 1 FROM cliente_item ci WHERE ci.idpedido = p.idpedido AND ci.status_producao = :status)")
+        params['status'] = page['status']
+    page_where = where + (["p.idpedido < :cursor"] if page['cursor'] is not None else [])
+
+    def carregar():
+        db = SessionLocal()
+        base_from = "FROM pedido p LEFT JOIN add_cliente ac ON p.idcliente = ac.idcliente"
+        total = db.execute(text(f"SELECT COUNT(*) {base_from} {where_clause(where)}"), params).scalar()
+
+        pedidos_sql = text(f"""
             SELECT 
                 p.idpedido, 
                 p.numero_pedido, 
@@ -472,11 +540,17 @@ def api_pedidos():
                 ac.endereco,
                 p.data_entrega,
                 p.pdf
-            FROM pedido p
-            LEFT JOIN add_cliente ac ON p.idcliente = ac.idcliente
+            {base_from}
+            {where_clause(page_where)}
             ORDER BY p.idpedido DESC
+            LIMIT :limit
         """)
-        pedidos_result = db.execute(pedidos_sql).mappings().all()
+        # Um a mais para saber se existe a próxima página
+        pedidos_result = db.execute(pedidos_sql, dict(params, cursor=page['cursor'], limit=page['limit'] + 1)).mappings().all()
+        next_cursor = None
+        if len(pedidos_result) > page['limit']:
+            pedidos_result = pedidos_result[:page['limit']]
+            next_cursor = pedidos_result[-1]['idpedido']
         
         # Converte o resultado para uma lista de dicionários, formatando datas
         data = []
@@ -485,8 +559,12 @@ def api_pedidos():
             if isinstance(row_dict.get('data_entrega'), datetime):
                 row_dict['data_entrega'] = row_dict['data_entrega'].strftime('%Y-%m-%d')
             data.append(row_dict)
-            
-        return jsonify(data)
+        return {'data': data, 'total': total, 'next_cursor': next_cursor}
+
+    try:
+        pagina = cached(('app:pedidos', tuple(sorted(page.items()))), PEDIDOS_TABLES,
+                        carregar, ttl=config.DASHBOARD_CACHE_TTL)
+        return paged_response(pagina['data'], pagina['total'], pagina['next_cursor'], page)
     except Exception as e:
         logger.exception("Erro na API /api/pedidos: %s", e)
         return jsonify({"error": "Erro interno ao buscar dados de pedidos"}), 500
@@ -600,6 +678,7 @@ def pedido():
                 # Corrigido para deletar da tabela 'pedido' usando 'idpedido'
                 db.execute(text("DELETE FROM pedido WHERE idpedido = :id"), {'id': pedido_id_to_delete})
                 db.commit()
+                invalidate('pedido')
                 flash(f"Pedido {pedido_id_to_delete} excluído com sucesso.", "success")
             except Exception as e:
                 db.rollback()
@@ -626,6 +705,7 @@ def pedido():
                     'data_entrega': request.form.get('data_entrega')
                 })
                 db.commit()
+                invalidate('pedido')
                 flash("Novo pedido criado com sucesso!", "success")
             except Exception as e:
                 db.rollback()
@@ -721,6 +801,37 @@ def logout():
     set_app_cookie(resp, config.REMEMBER_COOKIE_NAME, '', expires=0, httponly=True, path='/')
     return resp
 
+def metrics_required(f):
+    """Decorator das rotas /metrics: admin logado ou o token METRICS_TOKEN (cabeçalho X-Metrics-Token ou ?token=)."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = request.headers.get('X-Metrics-Token') or request.args.get('token') or ''
+        # compare_digest: o tempo da comparação não revela quantos caracteres do token acertaram
+        token_ok = bool(config.METRICS_TOKEN) and hmac.compare_digest(token.encode(), config.METRICS_TOKEN.encode())
+        if not (is_admin() or token_ok):
+            return jsonify({"error": "Não autorizado"}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+@app.route('/metrics')
+@metrics_required
+def metrics():
+    """Estado do pool de conexões deste worker (conexões em uso, tempo de espera)."""
+    return jsonify({"engine": get_engine_metrics(), "ref_cache": cache_stats(), "logging": logging_stats()})
+
+@app.route('/metrics/requests')
+@metrics_required
+def metrics_requests():
+    """Percentis de tempo total/banco por endpoint deste worker (mais lentos primeiro)."""
+    return jsonify({"pid": os.getpid(), "endpoints": request_metrics.endpoint_stats()})
+
+@app.route('/metrics/slow-queries')
+@metrics_required
+def metrics_slow_queries():
+    """Consultas lentas deste worker com EXPLAIN (o agregado de todos: `python slow_query.py`)."""
+    return jsonify({"pid": os.getpid(), "threshold_ms": config.SLOW_QUERY_MS,
+                    "queries": slow_query_report(request.args.get('top', 20, type=int))})
+
 def create_user_cli():
     db = SessionLocal()
     username = input("username: ").strip()
@@ -731,6 +842,7 @@ def create_user_cli():
     db.add(u)
     try:
         db.commit()
+        invalidate('usuarios')
         print("Usuário criado.")
     except IntegrityError:
         db.rollback()
@@ -4,11 +4,23 @@ import customtkinter as ctk
 import copy
 import random
 import math
+import multiprocessing
+import threading
+
+import config
+from corte_barras import ESTRATEGIAS, otimizar_estoque
+from encaixe_chapas import ESTRATEGIAS as ESTRATEGIAS_2D, aproveitamento, busca_paralela, encaixar
+from db_pool import get_connection
+from tk_worker import CanalDeCarga, executar_em_segundo_plano
+
+SEM_RETALHOS = "(não usar retalhos)"
 
 class EditorChapaWindow(tk.Toplevel):
     """
     Uma janela de edição separada para uma única chapa, permitindo uma visão ampliada.
     Permite arrastar, soltar e rotacionar as peças manualmente.
+    Planos do modo 'serra' (com 'cortes') mostram a sequência de cortes passo a passo;
+    mover ou girar uma peça descarta a sequência, que deixa de valer.
     """
     def __init__(self, master, app, chapa_data, chapa_index):
         super().__init__(master)
@@ -19,8 +31,12 @@ class EditorChapaWindow(tk.Toplevel):
         self.title(f"Editando Chapa {self.chapa_index + 1}")
         self.geometry("1000x700")
 
+        self.corte_atual = 0 # Cortes da sequência já mostrados (0 = nenhum)
+
         # Calcula uma nova escala para a janela do editor
         padding = 50 
+        if self.chapa_data.get('cortes'):
+            padding += 40 # Espaço dos controles da sequência de cortes
         scale_w = (1000 - padding) / self.app.chapa_w_val
         scale_h = (700 - padding) / self.app.chapa_h_val
         self.scale = min(scale_w, scale_h, 1)
@@ -28,6 +44,9 @@ class EditorChapaWindow(tk.Toplevel):
         canvas_w = int(self.app.chapa_w_val * self.scale)
         canvas_h = int(self.app.chapa_h_val * self.scale)
 
+        if self.chapa_data.get('cortes'):
+            self._criar_controles_cortes()
+
         # Frame para centralizar o canvas
         center_frame = ttk.Frame(self)
         center_frame.pack(fill=tk.BOTH, expand=True)
@@ -53,6 +72,56 @@ class EditorChapaWindow(tk.Toplevel):
         self.grab_set()
         master.wait_window(self)
 
+    def _criar_controles_cortes(self):
+        self.cortes_frame = ttk.Frame(self, padding=5)
+        self.cortes_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        ttk.Button(self.cortes_frame, text="◀ Corte Anterior", command=lambda: self._mudar_corte(-1)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.cortes_frame, text="Próximo Corte ▶", command=lambda: self._mudar_corte(1)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.cortes_frame, text="Todos", command=lambda: self._mudar_corte(len(self.chapa_data['cortes']))).pack(side=tk.LEFT, padx=5)
+        self.corte_label = ttk.Label(self.cortes_frame)
+        self.corte_label.pack(side=tk.LEFT, padx=10)
+        self._atualizar_label_corte()
+
+    def _mudar_corte(self, passo):
+        cortes = self.chapa_data.get('cortes') or []
+        self.corte_atual = max(0, min(len(cortes), self.corte_atual + passo))
+        self._atualizar_label_corte()
+        self._redraw_canvas()
+
+    def _atualizar_label_corte(self):
+        cortes = self.chapa_data.get('cortes') or []
+        if not cortes:
+            texto = "Sequência de cortes descartada: as peças foram movidas."
+        elif self.corte_atual == 0:
+            texto = f"{len(cortes)} cortes. Use 'Próximo Corte' para ver a sequência."
+        else:
+            corte = cortes[self.corte_atual - 1]
+            direcao = "horizontal" if corte['orientacao'] == 'H' else "vertical"
+            posicao = f"y = {corte['y1']:g}" if corte['orientacao'] == 'H' else f"x = {corte['x1']:g}"
+            texto = (f"Corte {corte['ordem']}/{len(cortes)} - Fase {corte['fase']}: {direcao} em {posicao} mm "
+                     f"(kerf {corte['kerf']:g} mm)")
+        self.corte_label.config(text=texto)
+
+    def _descartar_cortes(self):
+        """Peça movida à mão: a sequência calculada deixa de corresponder ao plano."""
+        if self.chapa_data.pop('cortes', None) is not None:
+            self.corte_atual = 0
+            self._atualizar_label_corte()
+
+    def _desenhar_cortes(self):
+        for corte in (self.chapa_data.get('cortes') or [])[:self.corte_atual]:
+            atual = corte['ordem'] == self.corte_atual
+            meio = corte['kerf'] / 2 # A linha fica no meio da faixa consumida pelo disco
+            dx, dy = (0, meio) if corte['orientacao'] == 'H' else (meio, 0)
+            x1, y1 = (corte['x1'] + dx) * self.scale, (corte['y1'] + dy) * self.scale
+            x2, y2 = (corte['x2'] + dx) * self.scale, (corte['y2'] + dy) * self.scale
+            largura = max(1, math.ceil(corte['kerf'] * self.scale))
+            self.editor_canvas.create_line(x1, y1, x2, y2, fill="#ff8c00" if atual else "red",
+                                           width=largura + 2 if atual else largura)
+            if atual:
+                self.editor_canvas.create_text((x1 + x2) / 2, (y1 + y2) / 2, text=str(corte['ordem']),
+                                               font=('Arial', 11, 'bold'), fill="#ff8c00")
+
     def on_close(self):
         # Atualiza a visualização do aplicativo principal antes de fechar
         self.app.atualizar_desenho_principal(self.chapa_index)
@@ -84,6 +153,8 @@ class EditorChapaWindow(tk.Toplevel):
             self.editor_canvas.create_rectangle(x1, y1, x2, y2, fill=cor_peca, outline=outline_color, width=2)
             self.editor_canvas.create_text((x1 + x2) / 2, (y1 + y2) / 2, text=f"P{peca['id']}", font=('Arial', 10, 'bold'))
 
+        self._desenhar_cortes()
+
     def _start_drag(self, event):
         orig_x = event.x / self.scale
         orig_y = event.y / self.scale
@@ -126,6 +197,8 @@ class EditorChapaWindow(tk.Toplevel):
             # Reverte para a posição original se houver colisão
             peca['x'] = self.drag_data['original_x']
             peca['y'] = self.drag_data['original_y']
+        elif (peca['x'], peca['y']) != (self.drag_data['original_x'], self.drag_data['original_y']):
+            self._descartar_cortes()
 
         self.drag_data = None
         self._redraw_canvas()
@@ -155,6 +228,7 @@ class EditorChapaWindow(tk.Toplevel):
                     peca['y'] = y_original
                     messagebox.showwarning("Rotação Inválida", "A peça não pode ser rotacionada pois colidiria com outra peça ou sairia da chapa.", parent=self)
                 else:
+                    self._descartar_cortes()
                     self._redraw_canvas()
                 
                 return
@@ -207,14 +281,28 @@ class AproveitamentoApp:
         self.canvas_chapas = {} 
         self.chapa_w_val = 3000
         self.chapa_h_val = 1200
+        self.chapa_estrategia_var = tk.StringVar(value=ESTRATEGIAS_2D['auto'])
+        self.encaixe_estrategia = None # Algoritmo que gerou as chapas atuais
+        self.encaixe_parcial = False # True enquanto a busca paralela ainda pode melhorar o resultado
+        self.busca_paralela_var = tk.BooleanVar(value=False)
+        self.busca_tempo_var = tk.StringVar(value="20") # Tempo da busca paralela (s)
+        self._parar_busca = None # threading.Event da busca paralela em andamento
         
         # --- Variáveis para Corte de Barra (1D) ---
         self.barra_entries = []
         self.barra_length_var = tk.StringVar(value="6000")
         self.kerf_var = tk.StringVar(value="3")
         self.barras_geradas = {} # Armazena o resultado da otimização 1D
+        self.barra_estrategia_var = tk.StringVar(value=ESTRATEGIAS['ffd'])
+        self.barra_tempo_var = tk.StringVar(value="5") # Limite da estratégia exata (s)
+        self.barra_retalho_var = tk.StringVar(value=SEM_RETALHOS) # Material dos retalhos (materiais.descricao_material)
 
         self._setup_notebook()
+        self._calculo_barra = CanalDeCarga(self.frame) # O cálculo 1D roda fora da thread da interface
+        self._calculo_chapa = CanalDeCarga(self.frame) # Idem para o encaixe 2D
+        executar_em_segundo_plano(self.frame, self._buscar_materiais_retalho,
+                                  ao_concluir=lambda nomes: self.barra_retalho_combo.configure(values=[SEM_RETALHOS] + nomes),
+                                  ao_falhar=lambda e: print(f"Erro ao carregar os retalhos: {e}"))
 
         # Inicialização das listas de peças
         self.adicionar_peca() # 2D
@@ -248,12 +336,25 @@ class AproveitamentoApp:
         barra_config_frame = ttk.Frame(config_frame)
         barra_config_frame.pack(fill=tk.X, pady=5)
         
-        ttk.Label(barra_config_frame, text="Comprimento Padrão (mm):").grid(row=0, column=0, sticky="w", padx=5)
-        ttk.Entry(barra_config_frame, textvariable=self.barra_length_var, width=10).grid(row=0, column=1, padx=5)
+        # Vários comprimentos separados por vírgula; "12000x4" limita a 4 barras, sem "x" não há limite
+        ttk.Label(barra_config_frame, text="Barras em Estoque (mm[xQtd]):").grid(row=0, column=0, sticky="w", padx=5)
+        ttk.Entry(barra_config_frame, textvariable=self.barra_length_var, width=20).grid(row=0, column=1, padx=5)
         
         ttk.Label(barra_config_frame, text="Perda de Corte (Kerf - mm):").grid(row=1, column=0, sticky="w", padx=5)
         ttk.Entry(barra_config_frame, textvariable=self.kerf_var, width=10).grid(row=1, column=1, padx=5)
 
+        ttk.Label(barra_config_frame, text="Estratégia:").grid(row=2, column=0, sticky="w", padx=5)
+        ttk.Combobox(barra_config_frame, textvariable=self.barra_estrategia_var, values=list(ESTRATEGIAS.values()),
+                     state="readonly", width=28).grid(row=2, column=1, padx=5, pady=2)
+
+        ttk.Label(barra_config_frame, text="Tempo Máx. Exato (s):").grid(row=3, column=0, sticky="w", padx=5)
+        ttk.Entry(barra_config_frame, textvariable=self.barra_tempo_var, width=10).grid(row=3, column=1, padx=5)
+
+        ttk.Label(barra_config_frame, text="Retalhos do Material:").grid(row=4, column=0, sticky="w", padx=5)
+        self.barra_retalho_combo = ttk.Combobox(barra_config_frame, textvariable=self.barra_retalho_var,
+                                                values=[SEM_RETALHOS], state="readonly", width=28)
+        self.barra_retalho_combo.grid(row=4, column=1, padx=5, pady=2)
+
         ttk.Separator(config_frame, orient='horizontal').pack(fill=tk.X, pady=10)
 
         # Container para as peças de barra com scroll
@@ -332,13 +433,17 @@ class AproveitamentoApp:
     def gerar_encaixe_barra(self):
         """Coleta dados e executa a otimização de corte 1D."""
         try:
-            barra_length = float(self.barra_length_var.get())
+            estoque = self._ler_estoque_barras(self.barra_length_var.get())
             kerf = float(self.kerf_var.get())
-            if barra_length <= 0 or kerf < 0:
+            limite_tempo = float(self.barra_tempo_var.get())
+            if not estoque or kerf < 0 or limite_tempo <= 0:
                  raise ValueError("Valores devem ser positivos ou zero para Kerf.")
         except ValueError:
-            messagebox.showerror("Erro de Entrada", "O comprimento da barra e o Kerf devem ser números válidos.", parent=self.master)
+            messagebox.showerror("Erro de Entrada", "As barras em estoque (ex.: 6000, 12000x4), o Kerf e o tempo máximo devem ser números válidos.", parent=self.master)
             return
+        barra_length = max(c for c, _ in estoque)
+        estrategia = next(chave for chave, nome in ESTRATEGIAS.items()
+                          if nome == self.barra_estrategia_var.get())
 
         pecas_necessarias = []
         pecas_validas = True
@@ -362,83 +467,87 @@ class AproveitamentoApp:
              return
 
         if not pecas_necessarias:
+            self._calculo_barra.cancelar()
             self.barras_geradas = {}
             self.desenhar_resultados_barra()
             return
 
-        self.barras_geradas = self.otimizar_corte_barras(barra_length, pecas_necessarias, kerf)
+        for widget in self.barra_draw_frame.winfo_children():
+            widget.destroy()
+        ttk.Label(self.barra_draw_frame, text=f"Calculando ({ESTRATEGIAS[estrategia]})...").pack(padx=20, pady=20)
+        material = self.barra_retalho_var.get()
+        self._calculo_barra.executar(self._calcular_corte_barras, estoque, pecas_necessarias, kerf,
+                                     estrategia, limite_tempo, None if material == SEM_RETALHOS else material,
+                                     ao_concluir=self._exibir_corte_barras,
+                                     ao_falhar=self._falha_corte_barras)
+
+    @staticmethod
+    def _ler_estoque_barras(texto):
+        """'6000, 12000x4' -> [(6000.0, None), (12000.0, 4)]; ValueError se mal formatado."""
+        estoque = []
+        for item in texto.replace(';', ',').split(','):
+            if not item.strip():
+                continue
+            comprimento, _, quantidade = item.lower().partition('x')
+            comprimento = float(comprimento)
+            quantidade = int(quantidade) if quantidade.strip() else None
+            if comprimento <= 0 or (quantidade is not None and quantidade <= 0):
+                raise ValueError(item)
+            estoque.append((comprimento, quantidade))
+        return estoque
+
+    def _buscar_materiais_retalho(self):
+        """Materiais com retalhos disponíveis (roda no executor do tk_worker)."""
+        conn = get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT DISTINCT descricao_material FROM materiais
+                    WHERE tipo_material = 'retalho' AND comprimento > 0 AND quant_un > 0
+                      AND COALESCE(reserva, 0) = 0
+                    ORDER BY descricao_material
+                """)
+                return [row['descricao_material'] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def _buscar_retalhos(self, material):
+        """Retalhos livres (não reservados) do material, para o corte 1D."""
+        conn = get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT idmateriais, codigo_material, comprimento, quant_un FROM materiais
+                    WHERE tipo_material = 'retalho' AND descricao_material = %s
+                      AND comprimento > 0 AND quant_un > 0 AND COALESCE(reserva, 0) = 0
+                    ORDER BY comprimento
+                """, (material,))
+                return [{'id': row['idmateriais'], 'codigo': row['codigo_material'],
+                         'comprimento': float(row['comprimento']), 'quantidade': int(row['quant_un'])}
+                        for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def _calcular_corte_barras(self, estoque, pecas_necessarias, kerf, estrategia, limite_tempo, material):
+        retalhos = self._buscar_retalhos(material) if material else []
+        return self.otimizar_corte_barras(estoque, pecas_necessarias, kerf, estrategia, limite_tempo, retalhos)
+
+    def _exibir_corte_barras(self, resultado):
+        self.barras_geradas = resultado
         self.desenhar_resultados_barra()
-    
-    def otimizar_corte_barras(self, comprimento_barra: float, pecas_necessarias: list[tuple[float, int]], perda_corte: float) -> dict:
-        """Implementação do algoritmo First-Fit Decreasing (FFD) para corte 1D."""
-        
-        pecas_para_cortar = []
-        for comprimento, quantidade in pecas_necessarias:
-            pecas_para_cortar.extend([comprimento] * quantidade)
-        
-        pecas_para_cortar.sort(reverse=True)
 
-        barras = []
-        total_comprimento_util = 0
-
-        for peca in pecas_para_cortar:
-            colocado = False
-            
-            for barra in barras:
-                required_space = peca
-                # Adiciona Kerf se não for a primeira peça na barra
-                if barra['pecas']:
-                    required_space += perda_corte
-
-                if barra['comprimento_restante'] >= required_space:
-                    barra['pecas'].append(peca)
-                    barra['comprimento_restante'] -= required_space
-                    colocado = True
-                    break
-            
-            if not colocado:
-                # Nova barra (não precisa de Kerf no primeiro corte)
-                comprimento_restante = comprimento_barra - peca
-                barras.append({
-                    'comprimento_total': comprimento_barra,
-                    'comprimento_restante': comprimento_restante,
-                    'pecas': [peca]
-                })
-            
-            total_comprimento_util += peca
+    def _falha_corte_barras(self, erro):
+        self.barras_geradas = {}
+        self.desenhar_resultados_barra()
+        messagebox.showerror("Erro", f"Falha no cálculo do corte: {erro}", parent=self.master)
 
-        total_desperdicio_final = 0
-        total_perda_corte = 0
-        
-        for barra in barras:
-            barra['sobra_final'] = round(barra['comprimento_restante'], 2)
-            total_desperdicio_final += barra['sobra_final']
-            
-            num_cortes = len(barra['pecas']) - 1
-            perda_kerf_barra = num_cortes * perda_corte
-            barra['perda_corte_kerf'] = round(perda_kerf_barra, 2)
-            total_perda_corte += perda_kerf_barra
-            
-            barra['pecas'] = [round(p, 2) for p in barra['pecas']] # Arredonda o comprimento das peças
+    def otimizar_corte_barras(self, estoque: list[tuple[float, int | None]], pecas_necessarias: list[tuple[float, int]],
+                              perda_corte: float, estrategia: str = 'ffd', limite_tempo: float = 5.0,
+                              retalhos: list[dict] = ()) -> dict:
+        """Plano de corte 1D pela estratégia escolhida (ver corte_barras.otimizar_estoque)."""
+        return otimizar_estoque(estoque, pecas_necessarias, perda_corte, estrategia, limite_tempo,
+                                retalhos, sobra_minima=config.RETALHO_BARRA_MIN_MM)
 
-        total_material_usado = comprimento_barra * len(barras)
-        
-        eficiencia = 0
-        if total_material_usado > 0:
-            eficiencia = (total_comprimento_util / total_material_usado) * 100
-
-        return {
-            'barras': barras,
-            'resumo': {
-                'barras_necessarias': len(barras),
-                'comprimento_util_total': round(total_comprimento_util, 2),
-                'desperdicio_final_total': round(total_desperdicio_final, 2),
-                'perda_corte_total': round(total_perda_corte, 2),
-                'material_total_usado': round(total_material_usado, 2),
-                'eficiencia': round(eficiencia, 2)
-            }
-        }
-    
     def desenhar_resultados_barra(self):
         """Desenha o plano de corte e exibe o resumo para a otimização 1D."""
         for widget in self.barra_draw_frame.winfo_children():
@@ -450,7 +559,7 @@ class AproveitamentoApp:
             
         resumo = self.barras_geradas['resumo']
         barras_data = self.barras_geradas['barras']
-        barra_w = barras_data[0]['comprimento_total'] if barras_data else 0
+        barra_w = max((b['comprimento_total'] for b in barras_data), default=0) # Escala comum a todas as barras
         
         # --- Resumo Estatístico (Topo) ---
         resumo_frame = ttk.LabelFrame(self.barra_draw_frame, text="Estatísticas", padding=10)
@@ -460,6 +569,27 @@ class AproveitamentoApp:
         ttk.Label(resumo_frame, text=f"Eficiência de Corte: {resumo['eficiencia']}%", font=('Arial', 10, 'bold')).grid(row=0, column=1, sticky='w', padx=5, pady=2)
         ttk.Label(resumo_frame, text=f"Desperdício Final (Sobra): {resumo['desperdicio_final_total']} mm").grid(row=1, column=0, sticky='w', padx=5, pady=2)
         ttk.Label(resumo_frame, text=f"Perda por Kerf Total: {resumo['perda_corte_total']} mm").grid(row=1, column=1, sticky='w', padx=5, pady=2)
+        if resumo['otimo'] is None:
+            otimo = f"{resumo['tempo_s']} s"
+        elif resumo['otimo']:
+            otimo = f"ótimo comprovado, {resumo['tempo_s']} s"
+        else:
+            otimo = f"mínimo teórico: {resumo['limite_inferior']} barras, {resumo['tempo_s']} s"
+        ttk.Label(resumo_frame, text=f"Estratégia: {ESTRATEGIAS[resumo['estrategia']]} ({otimo})").grid(row=2, column=0, columnspan=2, sticky='w', padx=5, pady=2)
+
+        # Material comprado por comprimento, retalhos consumidos e retalhos gerados
+        compradas = {}
+        for barra in barras_data:
+            if barra['retalho'] is None:
+                compradas[barra['comprimento_total']] = compradas.get(barra['comprimento_total'], 0) + 1
+        texto_compradas = ", ".join(f"{qtd} x {comp:g} mm" for comp, qtd in sorted(compradas.items())) or "nenhuma"
+        ttk.Label(resumo_frame, text=f"Barras Novas: {texto_compradas} ({resumo['material_comprado']} mm)").grid(row=3, column=0, columnspan=2, sticky='w', padx=5, pady=2)
+        if resumo['retalhos_consumidos']:
+            codigos = ", ".join(str(r.get('codigo') or r['id']) for r in resumo['retalhos_consumidos'])
+            ttk.Label(resumo_frame, text=f"Retalhos a Consumir: {codigos}", wraplength=650).grid(row=4, column=0, columnspan=2, sticky='w', padx=5, pady=2)
+        if resumo['novos_retalhos']:
+            sobras = ", ".join(f"{s:g} mm" for s in resumo['novos_retalhos'])
+            ttk.Label(resumo_frame, text=f"Novos Retalhos (>= {config.RETALHO_BARRA_MIN_MM:g} mm): {sobras}", wraplength=650).grid(row=5, column=0, columnspan=2, sticky='w', padx=5, pady=2)
 
         # --- Desenho das Barras ---
         CANVAS_WIDTH = 700  # Tamanho fixo em pixels para a visualização da barra
@@ -474,11 +604,16 @@ class AproveitamentoApp:
             barra_frame = ttk.Frame(self.barra_draw_frame, padding=5)
             barra_frame.pack(fill=tk.X, padx=10, pady=5)
             
-            ttk.Label(barra_frame, text=f"Barra {i + 1} ({barra_w} mm)", font=('Arial', 10, 'bold')).pack(anchor='w')
+            if barra['retalho'] is not None:
+                titulo = f"Barra {i + 1} - Retalho {barra['retalho'].get('codigo') or barra['retalho']['id']} ({barra['comprimento_total']:g} mm)"
+            else:
+                titulo = f"Barra {i + 1} ({barra['comprimento_total']:g} mm)"
+            ttk.Label(barra_frame, text=titulo, font=('Arial', 10, 'bold')).pack(anchor='w')
             
             details_frame = ttk.Frame(barra_frame)
             details_frame.pack(anchor='w', pady=2)
-            ttk.Label(details_frame, text=f"Sobra Final: {barra['sobra_final']} mm | Perda Kerf: {barra['perda_corte_kerf']} mm").pack(side=tk.LEFT)
+            destino_sobra = " (novo retalho)" if barra['novo_retalho'] else ""
+            ttk.Label(details_frame, text=f"Sobra Final: {barra['sobra_final']} mm{destino_sobra} | Perda Kerf: {barra['perda_corte_kerf']} mm").pack(side=tk.LEFT)
             
             # Canvas de desenho da barra
             canvas = tk.Canvas(barra_frame, width=CANVAS_WIDTH, height=BAR_HEIGHT, bg="#f0f0f0", relief=tk.SOLID, borderwidth=1)
@@ -503,7 +638,7 @@ class AproveitamentoApp:
                 current_x = x2
                 
                 # Desenha a perda de corte (Kerf), se não for a última peça
-                kerf = float(self.kerf_var.get())
+                kerf = resumo['perda_corte'] # O Kerf do cálculo, não o que está no campo agora
                 if piece_index < len(barra['pecas']) - 1:
                     kerf_visual_length = kerf * scale_factor
                     
@@ -527,8 +662,8 @@ class AproveitamentoApp:
         self.barra_draw_frame.update_idletasks()
         self.barra_draw_canvas.config(scrollregion=self.barra_draw_canvas.bbox("all"))
 
-    # O restante dos métodos (adicionar_peca, remover_peca, inverter_medidas, gerar_encaixe, 
-    # algoritmo_shelf_bin_packing, _tentar_colocar_na_chapa_shelf, desenhar_resultados, 
+    # O restante dos métodos (adicionar_peca, remover_peca, inverter_medidas, gerar_encaixe
+    # (o encaixe em si está em encaixe_chapas.py), desenhar_resultados,
     # _redraw_chapa_canvas, toggle_edit_mode, atualizar_desenho_principal, 
     # _on_mousewheel_pecas, _on_mousewheel_resultados) permanece essencialmente o mesmo.
     
@@ -546,8 +681,13 @@ class AproveitamentoApp:
         ttk.Entry(chapa_frame, textvariable=self.chapa_width_var, width=10).grid(row=0, column=1, padx=5)
         ttk.Label(chapa_frame, text="Altura da Chapa:").grid(row=1, column=0, sticky="w", padx=5)
         ttk.Entry(chapa_frame, textvariable=self.chapa_height_var, width=10).grid(row=1, column=1, padx=5)
-        ttk.Label(chapa_frame, text="Espaço entre Peças:").grid(row=2, column=0, sticky="w", padx=5)
+        ttk.Label(chapa_frame, text="Espaço entre Peças (Kerf na serra):").grid(row=2, column=0, sticky="w", padx=5)
         ttk.Entry(chapa_frame, textvariable=self.espaco_var, width=10).grid(row=2, column=1, padx=5)
+        ttk.Label(chapa_frame, text="Algoritmo:").grid(row=3, column=0, sticky="w", padx=5)
+        ttk.Combobox(chapa_frame, textvariable=self.chapa_estrategia_var, values=list(ESTRATEGIAS_2D.values()),
+                     state="readonly", width=30).grid(row=3, column=1, padx=5, pady=2)
+        ttk.Checkbutton(chapa_frame, text="Busca paralela (s):", variable=self.busca_paralela_var).grid(row=4, column=0, sticky="w", padx=5)
+        ttk.Entry(chapa_frame, textvariable=self.busca_tempo_var, width=10).grid(row=4, column=1, sticky="w", padx=5)
 
         ttk.Separator(config_frame, orient='horizontal').pack(fill=tk.X, pady=10)
 
@@ -650,8 +790,9 @@ class AproveitamentoApp:
             self.chapa_w_val = int(self.chapa_width_var.get())
             self.chapa_h_val = int(self.chapa_height_var.get())
             espaco = int(self.espaco_var.get())
+            limite_tempo = float(self.busca_tempo_var.get()) if self.busca_paralela_var.get() else 0
         except ValueError:
-            messagebox.showerror("Erro de Entrada", "As dimensões da chapa e o espaçamento devem ser números inteiros.")
+            messagebox.showerror("Erro de Entrada", "As dimensões da chapa e o espaçamento devem ser números inteiros e o tempo da busca um número.")
             return
 
         pecas_para_cortar = []
@@ -667,79 +808,52 @@ class AproveitamentoApp:
             messagebox.showerror("Erro de Entrada", "As dimensões e quantidades das peças devem ser números inteiros.")
             return
 
-        def sort_key(p):
-            is_full_width = (p['largura'] == self.chapa_w_val or p['altura'] == self.chapa_w_val)
-            return (not is_full_width, -max(p['largura'], p['altura']))
-        pecas_para_cortar.sort(key=sort_key)
+        estrategia = next(chave for chave, nome in ESTRATEGIAS_2D.items()
+                          if nome == self.chapa_estrategia_var.get())
+        for widget in self.draw_frame.winfo_children():
+            widget.destroy()
+        ttk.Label(self.draw_frame, text=f"Calculando ({ESTRATEGIAS_2D[estrategia]})...").pack()
+        if self._parar_busca is not None:
+            self._parar_busca.set() # Uma busca paralela anterior ainda em andamento
+            self._parar_busca = None
+
+        if limite_tempo <= 0:
+            self._calculo_chapa.executar(encaixar, pecas_para_cortar, self.chapa_w_val, self.chapa_h_val, espaco, estrategia,
+                                         ao_concluir=self._exibir_encaixe,
+                                         ao_falhar=lambda e: messagebox.showerror("Erro", f"Falha no encaixe: {e}"))
+            return
 
-        self.chapas_geradas = self.algoritmo_shelf_bin_packing(pecas_para_cortar, self.chapa_w_val, self.chapa_h_val, espaco)
+        # Busca paralela: as melhoras chegam da thread do tk_worker e são desenhadas via after()
+        parar = self._parar_busca = threading.Event()
+
+        def ao_melhorar(*resultado):
+            if not parar.is_set():
+                self.frame.after(0, lambda: parar.is_set() or self._exibir_encaixe(resultado, parcial=True))
+
+        def concluir(resultado):
+            if self._parar_busca is parar:
+                self._parar_busca = None
+            self._exibir_encaixe(resultado)
+
+        self._calculo_chapa.executar(busca_paralela, pecas_para_cortar, self.chapa_w_val, self.chapa_h_val, espaco,
+                                     limite_tempo, ao_melhorar, config.ENCAIXE_PROCESSOS or None, parar,
+                                     estrategia=estrategia,
+                                     ao_concluir=concluir,
+                                     ao_falhar=lambda e: messagebox.showerror("Erro", f"Falha no encaixe: {e}"))
+
+    def _exibir_encaixe(self, resultado, parcial=False):
+        chapas, nao_couberam, self.encaixe_estrategia = resultado
+        self.encaixe_parcial = parcial
+        for chapa in chapas:
+            for peca in chapa['pecas_colocadas']:
+                # Atribui uma cor fixa com base no ID da peça
+                peca['cor'] = self.cores[(peca['id'] - 1) % len(self.cores)]
+        self.chapas_geradas = chapas
         self.desenhar_resultados()
-
-    def algoritmo_shelf_bin_packing(self, pecas, chapa_w, chapa_h, espaco):
-        chapas = []
-        for peca in pecas:
-            peca_colocada = False
-            for chapa in chapas:
-                if self._tentar_colocar_na_chapa_shelf(peca, chapa, chapa_w, chapa_h, espaco):
-                    peca_colocada = True
-                    break
-            
-            if not peca_colocada:
-                nova_chapa = {'pecas_colocadas': [], 'shelves': []}
-                if self._tentar_colocar_na_chapa_shelf(peca, nova_chapa, chapa_w, chapa_h, espaco):
-                    chapas.append(nova_chapa)
-                else:
-                    print(f"Atenção: Peça ID {peca['id']} não coube em uma nova chapa.")
-        
-        return chapas
-
-    def _tentar_colocar_na_chapa_shelf(self, peca, chapa, chapa_w, chapa_h, espaco):
-        orientacoes = [
-            {'w': peca['largura'], 'h': peca['altura'], 'rot': False},
-            {'w': peca['altura'], 'h': peca['largura'], 'rot': True}
-        ]
-        best_fit = None
-
-        for shelf in chapa['shelves']:
-            for o in orientacoes:
-                # Inclui o espaçamento na largura do fit
-                if o['h'] <= shelf['height'] and (shelf['current_w'] + o['w'] + espaco) <= chapa_w:
-                    waste = shelf['height'] - o['h']
-                    if best_fit is None or waste < best_fit['waste']:
-                        best_fit = {'waste': waste, 'shelf': shelf, 'w': o['w'], 'h': o['h']}
-
-        if best_fit:
-            shelf = best_fit['shelf']
-            w, h = best_fit['w'], best_fit['h']
-            x, y = shelf['current_w'], shelf['y']
-            
-            # Atribui uma cor fixa com base no ID da peça
-            peca_cor = self.cores[(peca['id'] - 1) % len(self.cores)]
-            peca_pos = {'id': peca['id'], 'x': x, 'y': y, 'largura': w, 'altura': h, 'cor': peca_cor}
-            
-            chapa['pecas_colocadas'].append(peca_pos)
-            shelf['current_w'] += w + espaco
-            shelf['max_piece_height'] = max(shelf['max_piece_height'], h)
-            return True
-            
-        # Tenta criar uma nova "shelf" na parte superior
-        last_y = max([s['y'] + s['max_piece_height'] for s in chapa['shelves']], default=0) + (espaco if chapa['shelves'] else 0)
-
-        # Tenta encaixar a peça na orientação original
-        w, h = peca['largura'], peca['altura']
-        if last_y + h <= chapa_h:
-            chapa['shelves'].append({'y': last_y, 'height': h, 'current_w': 0, 'max_piece_height': h})
-            # Chama a função novamente para colocar na nova prateleira (shelf)
-            return self._tentar_colocar_na_chapa_shelf(peca, chapa, chapa_w, chapa_h, espaco)
-        
-        # Tenta encaixar a peça rotacionada
-        w, h = peca['altura'], peca['largura']
-        if last_y + h <= chapa_h:
-            chapa['shelves'].append({'y': last_y, 'height': h, 'current_w': 0, 'max_piece_height': h})
-            # Chama a função novamente para colocar na nova prateleira (shelf)
-            return self._tentar_colocar_na_chapa_shelf(peca, chapa, chapa_w, chapa_h, espaco)
-            
-        return False
+        if nao_couberam and not parcial:
+            ids = sorted({p['id'] for p in nao_couberam})
+            messagebox.showwarning("Peça Grande", f"{len(nao_couberam)} peça(s) não cabem na chapa e foram ignoradas: "
+                                   + ", ".join(f"P{i}" for i in ids))
 
     def desenhar_resultados(self):
         for widget in self.draw_frame.winfo_children():
@@ -758,12 +872,22 @@ class AproveitamentoApp:
 
         canvas_w = int(self.chapa_w_val * self.scale)
         canvas_h = int(self.chapa_h_val * self.scale)
+
+        if self.encaixe_estrategia:
+            ttk.Label(self.draw_frame, font=('Arial', 10, 'bold'),
+                      text=f"{len(self.chapas_geradas)} chapa(s) | Aproveitamento geral: "
+                           f"{aproveitamento(self.chapas_geradas, self.chapa_w_val, self.chapa_h_val):.2f}% | "
+                           f"Algoritmo: {ESTRATEGIAS_2D[self.encaixe_estrategia]}"
+                           + (" | Buscando encaixe melhor..." if self.encaixe_parcial else "")).pack(anchor='w', padx=10)
         
         for i, chapa_data in enumerate(self.chapas_geradas):
             chapa_frame = ttk.Frame(self.draw_frame, padding=10)
             chapa_frame.pack(pady=10, anchor='w')
 
-            ttk.Label(chapa_frame, text=f"Chapa {i + 1}", font=('Arial', 12, 'bold')).pack(anchor='w')
+            titulo = f"Chapa {i + 1}"
+            if chapa_data.get('cortes'):
+                titulo += f" - {len(chapa_data['cortes'])} cortes (duplo clique para ver a sequência)"
+            ttk.Label(chapa_frame, text=titulo, font=('Arial', 12, 'bold')).pack(anchor='w')
             
             canvas = tk.Canvas(chapa_frame, width=canvas_w, height=canvas_h, bg="#f0f0f0", relief=tk.SOLID, borderwidth=1)
             canvas.pack()
@@ -808,6 +932,15 @@ class AproveitamentoApp:
         canvas = event.widget
         chapa_index = canvas.chapa_index
         chapa_data = self.chapas_geradas[chapa_index]
+
+        if self._parar_busca is not None:
+            # O plano vai ser editado à mão: a busca paralela para e o resultado dela é descartado,
+            # senão uma melhora posterior trocaria as chapas e perderia a edição
+            self._parar_busca.set()
+            self._parar_busca = None
+            self._calculo_chapa.cancelar()
+            self.encaixe_parcial = False
+            self.desenhar_resultados()
         
         # Abre a nova janela de edição
         EditorChapaWindow(self.master, self, chapa_data, chapa_index)
@@ -834,6 +967,7 @@ class AproveitamentoApp:
                 canvas.yview_scroll(1, "units")
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # Busca paralela do encaixe no executável (PyInstaller)
     root = tk.Tk()
     root.title("Sistema de Aproveitamento de Materiais")
     
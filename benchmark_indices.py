@@ -0,0 +1,242 @@
+# benchmark_indices.py
+"""
+Mede a latência das consultas mais frequentes antes e depois das migrações
+de `migrations.py`, num banco descartável com dados gerados.
+
+    python benchmark_indices.py [--escala 1.0] [--repeticoes 30] [--banco js_system_bench] [--manter]
+
+O banco `--banco` é criado (e apagado no fim, salvo `--manter`) no mesmo
+servidor do `.env`; o usuário precisa de CREATE/DROP DATABASE. As tabelas
+têm só as colunas usadas pelas consultas e nenhum índice além da chave
+primária, como um banco criado sem as migrações. Depois da primeira rodada,
+`migrations.upgrade()` é aplicado nesse banco e as mesmas consultas rodam de
+novo com os mesmos parâmetros.
+
+Com --escala 1.0: 500 clientes, 5 mil pedidos, 5 mil itens, 20 mil
+composições, 100 mil vínculos em cliente_item, 5 mil linhas de estoque e
+10 mil materiais.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pymysql
+
+import config
+import migrations
+
+TABELAS = [
+    """CREATE TABLE add_cliente (
+        idcliente INT AUTO_INCREMENT PRIMARY KEY,
+        cliente VARCHAR(100), endereco VARCHAR(200))""",
+    """CREATE TABLE pedido (
+        idpedido INT AUTO_INCREMENT PRIMARY KEY,
+        idcliente INT, numero_pedido VARCHAR(30), data_entrega DATE,
+        data_insercao DATETIME, status VARCHAR(30))""",
+    """CREATE TABLE itens (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        codigo VARCHAR(50), descricao VARCHAR(200))""",
+    """CREATE TABLE item_composicao (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        id_item_pai INT, id_item_filho INT, quantidade INT)""",
+    """CREATE TABLE cliente_item (
+        id_item INT AUTO_INCREMENT PRIMARY KEY,
+        idpedido INT, item_raiz_id INT, id_composicao INT, quantidade_prod INT,
+        lote VARCHAR(30), tag VARCHAR(50), data_engenharia DATE, prioridade INT)""",
+    """CREATE TABLE estoque (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        id_produto INT, quantidade INT, localizacao VARCHAR(50), data_atualizacao DATETIME)""",
+    """CREATE TABLE materiais (
+        idmateriais INT AUTO_INCREMENT PRIMARY KEY,
+        descricao_material VARCHAR(200), tipo_material VARCHAR(20),
+        bitola DECIMAL(8,2), largura DECIMAL(10,2), comprimento DECIMAL(10,2), quant_un INT)""",
+    # Vazia: só para as migrações que leem/alteram as TRs (4 e 6)
+    """CREATE TABLE pedidos_tr (
+        idpedidos_tr INT AUTO_INCREMENT PRIMARY KEY,
+        id_pedido INT, modelo VARCHAR(100), id_vinculo INT, vinculos_item TEXT, status VARCHAR(60))""",
+]
+
+TIPOS_MATERIAL = ['chapa', 'retalho', 'unitario', 'serra']
+
+# (nome, SQL, gerador de parâmetros); o mesmo SQL é medido antes e depois das migrações.
+CONSULTAS = [
+    ("itens do pedido (Obras)", """
+        SELECT ci.id_item, ci.quantidade_prod, ci.lote, ci.tag, pi.codigo, pi.descricao,
+               si.codigo AS codigo_conjunto, si.descricao AS conjunto
+        FROM cliente_item ci
+        LEFT JOIN item_composicao ic ON ci.id_composicao = ic.id
+        LEFT JOIN itens pi ON ci.item_raiz_id = pi.id
+        LEFT JOIN itens si ON ic.id_item_filho = si.id
+        WHERE ci.idpedido = %s""", lambda n: (random.randint(1, n['pedidos']),)),
+    ("vínculos de um equipamento", """
+        SELECT COUNT(*) AS n FROM cliente_item WHERE item_raiz_id = %s""",
+     lambda n: (random.randint(1, n['itens']),)),
+    ("vínculos de uma composição", """
+        SELECT id_item FROM cliente_item WHERE id_composicao = %s""",
+     lambda n: (random.randint(1, n['composicoes']),)),
+    ("composição de um item pai", """
+        SELECT ic.id, i.codigo, i.descricao, ic.quantidade
+        FROM item_composicao ic JOIN itens i ON ic.id_item_filho = i.id
+        WHERE ic.id_item_pai = %s""", lambda n: (random.randint(1, n['itens']),)),
+    ("onde um conjunto é usado", """
+        SELECT id_item_pai FROM item_composicao WHERE id_item_filho = %s""",
+     lambda n: (random.randint(1, n['itens']),)),
+    ("pedidos de um cliente", """
+        SELECT idpedido, numero_pedido FROM pedido WHERE idcliente = %s""",
+     lambda n: (random.randint(1, n['clientes']),)),
+    ("estoque total de um produto", """
+        SELECT COALESCE(SUM(quantidade), 0) AS total FROM estoque WHERE id_produto = %s""",
+     lambda n: (random.randint(1, n['itens']),)),
+    ("materiais por tipo (tela de material)", """
+        SELECT idmateriais, descricao_material, bitola, largura, comprimento, quant_un
+        FROM materiais WHERE tipo_material = %s ORDER BY descricao_material ASC""",
+     lambda n: (random.choice(TIPOS_MATERIAL),)),
+]
+
+
+def _conectar(banco=None):
+    kwargs = dict(host=config.DB_HOST, user=config.DB_USER, password=config.DB_PASS,
+                  port=int(config.DB_PORT or 3306), charset='utf8mb4',
+                  cursorclass=pymysql.cursors.DictCursor, database=banco)
+    if os.path.exists(config.SSL_CA_PATH):
+        kwargs['ssl'] = {'ca': config.SSL_CA_PATH}
+    return pymysql.connect(**kwargs)
+
+
+def _inserir(cursor, sql, linhas, lote=2000):
+    # executemany do pymysql junta cada lote num único INSERT ... VALUES (...), (...)
+    for i in range(0, len(linhas), lote):
+        cursor.executemany(sql, linhas[i:i + lote])
+
+
+def gerar_dados(connection, escala):
+    n = {
+        'clientes': max(10, int(500 * escala)),
+        'pedidos': max(100, int(5000 * escala)),
+        'itens': max(100, int(5000 * escala)),
+        'composicoes': max(400, int(20000 * escala)),
+        'vinculos': max(2000, int(100000 * escala)),
+        'estoque': max(100, int(5000 * escala)),
+        'materiais': max(200, int(10000 * escala)),
+    }
+    inicio_datas = datetime(2019, 1, 1)
+    with connection.cursor() as cursor:
+        for ddl in TABELAS:
+            cursor.execute(ddl)
+        _inserir(cursor, "INSERT INTO add_cliente (cliente, endereco) VALUES (%s, %s)",
+                 [(f"Cliente {i}", f"Rua {i}") for i in range(n['clientes'])])
+        _inserir(cursor, "INSERT INTO pedido (idcliente, numero_pedido, data_entrega, data_insercao, status) "
+                         "VALUES (%s, %s, %s, %s, %s)",
+                 [(random.randint(1, n['clientes']), f"P{i:06d}",
+                   (inicio_datas + timedelta(days=random.randint(0, 2550))).date(),
+                   inicio_datas + timedelta(minutes=random.randint(0, 2550 * 1440)), 'aberto')
+                  for i in range(n['pedidos'])])
+        _inserir(cursor, "INSERT INTO itens (codigo, descricao) VALUES (%s, %s)",
+                 [(f"IT-{i:06d}", f"Item {i}") for i in range(n['itens'])])
+        _inserir(cursor, "INSERT INTO item_composicao (id_item_pai, id_item_filho, quantidade) VALUES (%s, %s, %s)",
+                 [(random.randint(1, n['itens']), random.randint(1, n['itens']), random.randint(1, 10))
+                  for _ in range(n['composicoes'])])
+        _inserir(cursor, "INSERT INTO cliente_item (idpedido, item_raiz_id, id_composicao, quantidade_prod, "
+                         "lote, tag, data_engenharia, prioridade) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                 [(random.randint(1, n['pedidos']), random.randint(1, n['itens']),
+                   random.randint(1, n['composicoes']), random.randint(1, 20), f"L{random.randint(1, 99)}",
+                   f"TAG{i}", None, random.randint(0, 5))
+                  for i in range(n['vinculos'])])
+        _inserir(cursor, "INSERT INTO estoque (id_produto, quantidade, localizacao, data_atualizacao) "
+                         "VALUES (%s, %s, %s, NOW())",
+                 [(random.randint(1, n['itens']), random.randint(0, 50), f"E{random.randint(1, 30)}")
+                  for _ in range(n['estoque'])])
+        _inserir(cursor, "INSERT INTO materiais (descricao_material, tipo_material, bitola, largura, "
+                         "comprimento, quant_un) VALUES (%s, %s, %s, %s, %s, %s)",
+                 [(f"Material {i}", random.choice(TIPOS_MATERIAL), random.choice([1.5, 2, 3, 4.75, 6.3]),
+                   random.randint(100, 1500), random.randint(100, 6000), random.randint(0, 20))
+                  for i in range(n['materiais'])])
+        cursor.execute("ANALYZE TABLE add_cliente, pedido, itens, item_composicao, cliente_item, estoque, materiais")
+        cursor.fetchall()
+    connection.commit()
+    return n
+
+
+def medir(connection, parametros):
+    """{nome: (mediana_ms, p95_ms, índice usado)} de cada consulta."""
+    resultado = {}
+    with connection.cursor() as cursor:
+        for (nome, sql, _), params in zip(CONSULTAS, parametros):
+            tempos = []
+            for p in params:
+                inicio = time.perf_counter()
+                cursor.execute(sql, p)
+                cursor.fetchall()
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            cursor.execute("EXPLAIN " + sql, params[0])
+            chaves = sorted({row['key'] for row in cursor.fetchall() if row.get('key')})
+            tempos.sort()
+            resultado[nome] = (statistics.median(tempos),
+                               tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))],
+                               ', '.join(chaves) or 'nenhum')
+    return resultado
+
+
+def formatar(antes, depois):
+    linhas = [f"{'consulta':<38} {'antes p50':>10} {'p95':>9} {'depois p50':>11} {'p95':>9} {'ganho':>7}  índice"]
+    for nome, _, _ in CONSULTAS:
+        a50, a95, _ = antes[nome]
+        d50, d95, chave = depois[nome]
+        ganho = f"{a50 / d50:.1f}x" if d50 > 0 else '-'
+        linhas.append(f"{nome:<38} {a50:>8.2f}ms {a95:>7.2f}ms {d50:>9.2f}ms {d95:>7.2f}ms {ganho:>7}  {chave}")
+    return '\n'.join(linhas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das consultas antes/depois das migrações.")
+    parser.add_argument('--escala', type=float, default=1.0, help="multiplica o volume de dados gerados")
+    parser.add_argument('--repeticoes', type=int, default=30, help="execuções de cada consulta")
+    parser.add_argument('--banco', default='js_system_bench', help="banco descartável criado para o teste")
+    parser.add_argument('--manter', action='store_true', help="não apaga o banco no fim")
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args(argv)
+    if args.banco == config.DB_NAME:
+        parser.error("--banco não pode ser o banco da aplicação")
+    random.seed(args.semente)
+
+    admin = _conectar()
+    with admin.cursor() as cursor:
+        cursor.execute(f"DROP DATABASE IF EXISTS `{args.banco}`")
+        cursor.execute(f"CREATE DATABASE `{args.banco}` CHARACTER SET utf8mb4")
+    try:
+        connection = _conectar(args.banco)
+        try:
+            inicio = time.perf_counter()
+            n = gerar_dados(connection, args.escala)
+            print(f"Dados gerados em {time.perf_counter() - inicio:.1f}s: "
+                  + ', '.join(f"{k}={v}" for k, v in n.items()))
+
+            # Mesmos parâmetros nas duas rodadas
+            parametros = [[gerar(n) for _ in range(args.repeticoes)] for _, _, gerar in CONSULTAS]
+            antes = medir(connection, parametros)
+
+            inicio = time.perf_counter()
+            aplicadas = migrations.upgrade(connection)
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE TABLE pedido, item_composicao, cliente_item, estoque, materiais")
+                cursor.fetchall()
+            print(f"Migrações {aplicadas} aplicadas em {time.perf_counter() - inicio:.1f}s\n")
+
+            depois = medir(connection, parametros)
+            print(formatar(antes, depois))
+        finally:
+            connection.close()
+    finally:
+        if not args.manter:
+            with admin.cursor() as cursor:
+                cursor.execute(f"DROP DATABASE IF EXISTS `{args.banco}`")
+        admin.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, font
 import customtkinter as ctk
-import pymysql
-from config import DB_HOST, DB_USER, DB_PASS, DB_NAME
+from db_pool import get_connection
+from tk_worker import CanalDeCarga
+from text_truncate import truncar_texto
+from ref_cache import cached, invalidate
 from select2_tkinter import Select2Tkinter
 
 class CadastroItensApp:
@@ -17,15 +19,14 @@ class CadastroItensApp:
         self.child_selectors = []
         self.create_widgets()
         self.full_text_map = {} # Dicionário para guardar o texto completo dos itens da árvore
+        self.displayed_text_map = {} # Texto (truncado) atualmente exibido em cada item da árvore
+        self._resize_job = None
+        self._carga_hierarquia = CanalDeCarga(self.main_frame) # Recargas seguidas: só a última monta a árvore
         self.load_all_data()
 
     def get_db_connection(self):
         """Retorna uma conexão com o banco de dados."""
-        return pymysql.connect(
-            host=DB_HOST, user=DB_USER, password=DB_PASS,
-            database=DB_NAME, charset='utf8mb4',
-            cursorclass=pymysql.cursors.DictCursor
-        )
+        return get_connection()
 
     def create_widgets(self):
         """Cria os widgets da interface gráfica."""
@@ -149,19 +150,18 @@ class CadastroItensApp:
         self.load_items()
         self.load_hierarchy()
 
+    def _fetch_items(self):
+        with self.get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT id, codigo, descricao FROM itens ORDER BY descricao ASC")
+            return cursor.fetchall()
+
     def load_items(self):
         """Carrega os itens do banco e atualiza a Listbox e os Select2."""
         try:
-            conn = self.get_db_connection()
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT id, codigo, descricao FROM itens ORDER BY descricao ASC")
-                self.itens_data = cursor.fetchall()
+            self.itens_data = cached(('itens',), ('itens',), self._fetch_items)
         except Exception as e:
             messagebox.showerror("Erro de Banco de Dados", f"Não foi possível carregar os itens: {e}")
             self.itens_data = []
-        finally:
-            if conn:
-                conn.close()
 
         # Atualiza a Listbox
         self.items_listbox.delete(0, tk.END)
@@ -243,38 +243,44 @@ class CadastroItensApp:
         self.child_selectors = [s for s in self.child_selectors if s['selector'] != selector_to_remove]
 
     def load_hierarchy(self):
-        """Carrega e constrói a árvore de hierarquia."""
+        """Carrega a hierarquia no executor de segundo plano e constrói a árvore ao terminar."""
+        self._carga_hierarquia.executar(self._fetch_hierarchy,
+                                        ao_concluir=self._build_hierarchy_tree,
+                                        ao_falhar=self._on_hierarchy_error)
+
+    def _fetch_hierarchy(self):
+        """Busca os vínculos pai/filho (fora da thread da interface)."""
+        sql = """
+            SELECT 
+                ic.id_item_pai, 
+                p.codigo AS pai_codigo,
+                p.descricao AS pai_desc, 
+                ic.id_item_filho, 
+                f.codigo AS filho_codigo,
+                f.descricao AS filho_desc,
+                ic.quantidade
+            FROM item_composicao ic
+            JOIN itens p ON ic.id_item_pai = p.id
+            JOIN itens f ON ic.id_item_filho = f.id
+            ORDER BY p.descricao, f.descricao
+        """
+        with self.get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.fetchall()
+
+    def _on_hierarchy_error(self, error):
+        messagebox.showerror("Erro de Banco de Dados", f"Não foi possível carregar a hierarquia: {error}")
+        self._build_hierarchy_tree([])
+
+    def _build_hierarchy_tree(self, hierarchy_data):
+        """Constrói a árvore de hierarquia com os dados carregados."""
+        self.hierarchy_data = hierarchy_data
         for i in self.tree.get_children():
             self.tree.delete(i)
-        
-        try:
-            conn = self.get_db_connection()
-            with conn.cursor() as cursor:
-                sql = """
-                    SELECT 
-                        ic.id_item_pai, 
-                        p.codigo AS pai_codigo,
-                        p.descricao AS pai_desc, 
-                        ic.id_item_filho, 
-                        f.codigo AS filho_codigo,
-                        f.descricao AS filho_desc,
-                        ic.quantidade
-                    FROM item_composicao ic
-                    JOIN itens p ON ic.id_item_pai = p.id
-                    JOIN itens f ON ic.id_item_filho = f.id
-                    ORDER BY p.descricao, f.descricao
-                """
-                cursor.execute(sql)
-                self.hierarchy_data = cursor.fetchall()
-        except Exception as e:
-            messagebox.showerror("Erro de Banco de Dados", f"Não foi possível carregar a hierarquia: {e}")
-            self.hierarchy_data = []
-        finally:
-            if conn:
-                conn.close()
 
         # Constrói a árvore
         self.full_text_map.clear() # Limpa o mapa de textos
+        self.displayed_text_map.clear()
         nodes = {}
         for link in self.hierarchy_data:
             id_pai = str(link['id_item_pai'])
@@ -296,32 +302,19 @@ class CadastroItensApp:
 
     def _truncate_text(self, text, max_width, font_obj, margin=20):
         """Trunca o texto com '...' se exceder a largura máxima e substitui espaços para evitar quebra de linha."""
-        if not isinstance(text, str):
-            return text
+        return truncar_texto(text, max_width, font_obj, margin=margin, sem_quebra=True)
 
-        text_width = font_obj.measure(text)
-        
-        # Se o texto não couber, trunca
-        if text_width > max_width - margin:
-            temp_text = text
-            # Reduz o texto até que ele (com '...') caiba na largura
-            while font_obj.measure(temp_text + '...') > max_width - margin and len(temp_text) > 0:
-                temp_text = temp_text[:-1]
-            final_text = temp_text + '...'
-        else:
-            final_text = text
-        
-        # Substitui espaços por 'non-breaking spaces' para forçar uma única linha no Treeview
-        return final_text.replace(' ', '\u00A0')
-    
     def on_tree_configure(self, event=None):
         """Chamado quando a árvore é redimensionada. Atualiza os textos."""
         # Usamos 'after' para garantir que o redimensionamento da janela já tenha sido processado
-        # antes de tentarmos calcular as novas larguras.
-        self.main_frame.after(50, self._resize_and_update_text)
+        # antes de tentarmos calcular as novas larguras. Eventos seguidos são agrupados em um só.
+        if self._resize_job is not None:
+            self.main_frame.after_cancel(self._resize_job)
+        self._resize_job = self.main_frame.after(50, self._resize_and_update_text)
 
     def _resize_and_update_text(self):
         """Calcula a largura das colunas e atualiza o texto."""
+        self._resize_job = None
         if not self.tree.winfo_exists():
             return
         
@@ -340,12 +333,13 @@ class CadastroItensApp:
         col_width = self.tree.column('#0', 'width')
         default_font = font.nametofont("TkDefaultFont")
 
-        for iid in self.full_text_map:
-            if self.tree.exists(iid):
-                full_text = self.full_text_map[iid]
-                # A margem aqui é importante para compensar ícones e padding interno da Treeview
-                truncated_text = self._truncate_text(full_text, col_width, default_font, margin=35)
+        for iid, full_text in self.full_text_map.items():
+            # A margem aqui é importante para compensar ícones e padding interno da Treeview
+            truncated_text = self._truncate_text(full_text, col_width, default_font, margin=35)
+            # Só chama o Tk para os itens cujo texto exibido mudou
+            if self.displayed_text_map.get(iid) != truncated_text and self.tree.exists(iid):
                 self.tree.item(iid, text=truncated_text)
+                self.displayed_text_map[iid] = truncated_text
 
     def filter_items_list(self, event=None):
         """Filtra a lista de itens com base na busca."""
@@ -414,6 +408,7 @@ class CadastroItensApp:
                 with conn.cursor() as cursor:
                     cursor.execute("INSERT INTO itens (codigo, descricao) VALUES (%s, %s)", (codigo, descricao))
                 conn.commit()
+                invalidate('itens')
                 messagebox.showinfo("Sucesso", "Item adicionado com sucesso!", parent=modal)
                 modal.destroy()
                 self.load_items() # Recarrega a lista de itens
@@ -524,6 +519,7 @@ class CadastroItensApp:
                 cursor.executemany(sql, dados_para_inserir)
                 
             conn.commit()
+            invalidate('item_composicao')
             messagebox.showinfo("Sucesso", "Vínculos criados com sucesso!")
             self.load_hierarchy()
             self._reset_child_selectors() # Limpa os campos de filho após o sucesso
@@ -552,6 +548,7 @@ class CadastroItensApp:
                 sql = "DELETE FROM item_composicao WHERE id_item_pai = %s"
                 cursor.execute(sql, (id_item_pai,))
             conn.commit()
+            invalidate('item_composicao')
             messagebox.showinfo("Sucesso", f"Todos os vínculos de {parent_text} foram excluídos.")
             self.load_hierarchy() # Recarrega a árvore para atualizar
         except Exception as e:
@@ -582,6 +579,7 @@ class CadastroItensApp:
                 sql = "DELETE FROM item_composicao WHERE id_item_pai = %s AND id_item_filho = %s"
                 cursor.execute(sql, (id_item_pai, id_item_filho))
             conn.commit()
+            invalidate('item_composicao')
             messagebox.showinfo("Sucesso", "Vínculo excluído com sucesso.")
             self.load_hierarchy()
         except Exception as e:
@@ -658,6 +656,7 @@ class CadastroItensApp:
                     sql = "UPDATE item_composicao SET quantidade = %s WHERE id_item_pai = %s AND id_item_filho = %s"
                     cursor.execute(sql, (nova_quantidade, id_item_pai, id_item_filho))
                 conn.commit()
+                invalidate('item_composicao')
                 messagebox.showinfo("Sucesso", "Vínculo atualizado com sucesso!", parent=modal)
                 modal.destroy()
                 self.load_hierarchy() # Recarrega a árvore para mostrar a nova quantidade
@@ -1,5 +1,6 @@
 # config.py
 import os
+import tempfile
 from datetime import timedelta
 from dotenv import load_dotenv
 
@@ -21,6 +22,51 @@ SSL_CA_PATH = os.path.join(BASE_DIR, 'ca.pem')
 # URL de conexão para SQLAlchemy. O `ssl_ca` requer o arquivo ca.pem no diretório raiz.
 DB_URL = f"mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}?ssl_ca={SSL_CA_PATH}"
 
+# Pool de conexões pymysql (db_pool.py)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))                    # conexões abertas no máximo
+DB_POOL_IDLE_TIMEOUT = int(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))  # s ociosa antes de fechar
+DB_POOL_MAX_LIFETIME = int(os.getenv("DB_POOL_MAX_LIFETIME", "1800")) # s de vida máxima da conexão
+DB_POOL_WAIT_TIMEOUT = int(os.getenv("DB_POOL_WAIT_TIMEOUT", "30"))   # s esperando conexão livre
+DB_POOL_PING = os.getenv("DB_POOL_PING", "1") == "1"                  # ping ao retirar do pool
+
+# Engine SQLAlchemy compartilhado por app.py e web_app.py (models.get_engine)
+DB_ENGINE_POOL_SIZE = int(os.getenv("DB_ENGINE_POOL_SIZE", "5"))
+DB_ENGINE_MAX_OVERFLOW = int(os.getenv("DB_ENGINE_MAX_OVERFLOW", "5"))
+DB_ENGINE_POOL_TIMEOUT = int(os.getenv("DB_ENGINE_POOL_TIMEOUT", "30"))     # s esperando conexão livre
+DB_ENGINE_POOL_RECYCLE = int(os.getenv("DB_ENGINE_POOL_RECYCLE", "1800"))   # s antes de renovar a conexão
+DB_ENGINE_POOL_PRE_PING = os.getenv("DB_ENGINE_POOL_PRE_PING", "1") == "1"
+
+# Migrações do esquema (migrations.py): aplica as pendentes ao iniciar o app.py
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "0") == "1"
+
+# Token opcional para consultar /metrics sem sessão de admin (ex.: monitoramento)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Paginação das APIs de listagem (/api/pedidos, /api/slide-data)
+API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", "100"))          # itens por página quando `limit` não é informado
+API_PAGE_SIZE_MAX = int(os.getenv("API_PAGE_SIZE_MAX", "1000"))  # maior `limit` aceito
+API_STREAM_BATCH = int(os.getenv("API_STREAM_BATCH", "500"))   # linhas por bloco nas respostas em streaming (?stream=1)
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "1") == "1"  # ETag/304 nas APIs somente leitura
+
+# Cache dos dados de referência (clientes, itens, composição) - ref_cache.py
+REF_CACHE_ENABLED = os.getenv("REF_CACHE_ENABLED", "1") == "1"
+REF_CACHE_TTL = int(os.getenv("REF_CACHE_TTL", "300"))                  # s até uma entrada expirar
+REF_CACHE_MAX_ENTRIES = int(os.getenv("REF_CACHE_MAX_ENTRIES", "256"))  # entradas no LRU
+REF_CACHE_BACKEND = os.getenv("REF_CACHE_BACKEND", "memory")            # memory | sqlite | redis
+# Arquivo SQLite (backend sqlite) ou URL redis:// (backend redis)
+REF_CACHE_URL = os.getenv("REF_CACHE_URL", os.path.join(tempfile.gettempdir(), "js_system_cache.sqlite3"))
+DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", "30"))      # s para /api/slide-data e /api/pedidos
+
+# Medição por requisição (Server-Timing e /metrics/requests) - request_metrics.py
+REQUEST_METRICS_ENABLED = os.getenv("REQUEST_METRICS_ENABLED", "1") == "1"
+METRICS_SAMPLES = int(os.getenv("METRICS_SAMPLES", "500"))  # requisições guardadas por endpoint para os percentis
+
+# Log de consultas lentas com EXPLAIN - slow_query.py (relatório: python slow_query.py)
+SLOW_QUERY_ENABLED = os.getenv("SLOW_QUERY_ENABLED", "1") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))            # limite para registrar a consulta
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "1") == "1"    # captura o EXPLAIN (1ª ocorrência)
+SLOW_QUERY_FILE = os.getenv("SLOW_QUERY_FILE", os.path.join(BASE_DIR, 'slow_queries.jsonl'))
+
 # App
 SECRET_KEY = os.getenv("SECRET_KEY", os.urandom(32))  # chave secreta do Flask
 PERMANENT_SESSION_LIFETIME = timedelta(days=7)        # tempo de sessão
@@ -29,5 +75,25 @@ PERMANENT_SESSION_LIFETIME = timedelta(days=7)        # tempo de sessão
 REMEMBER_COOKIE_NAME = "remember_token"
 REMEMBER_COOKIE_DURATION_DAYS = 30
 
+# Tela de Obras: busca os itens de cada pedido só quando ele é selecionado
+OBRAS_LAZY_ITENS = os.getenv("OBRAS_LAZY_ITENS", "1") == "1"
+
+# Threads que executam as consultas das telas Tk (tk_worker.py); mantenha <= DB_POOL_SIZE
+TK_WORKERS = int(os.getenv("TK_WORKERS", "4"))
+
+# Aproveitamento de barra (1D): sobra mínima (mm) que vira retalho; abaixo disso é sucata
+RETALHO_BARRA_MIN_MM = float(os.getenv("RETALHO_BARRA_MIN_MM", "300"))
+
+# Corte de chapa: processos da busca paralela do encaixe (0 = todos os núcleos)
+ENCAIXE_PROCESSOS = int(os.getenv("ENCAIXE_PROCESSOS", "0"))
+
 # Logs
 LOG_FILE = os.path.join(os.path.dirname(__file__), 'error.log')
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(5 * 1024 * 1024)))  # rotação por tamanho (0 = externa, ex.: logrotate)
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))             # arquivos antigos mantidos
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "")                     # ex.: 'midnight' (rotação por tempo)
+LOG_BUFFER_CAPACITY = int(os.getenv("LOG_BUFFER_CAPACITY", "200"))      # registros por gravação no arquivo
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "2"))        # s máximos de um registro no buffer
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))              # registros pendentes antes de descartar
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))  # fração dos DEBUG mantida
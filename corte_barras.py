@@ -0,0 +1,415 @@
+# corte_barras.py
+"""
+Motor de corte linear (1D) da aba "Aproveitamento de Barra" do AproveitamentoApp.
+
+Estratégias (`ESTRATEGIAS`):
+    ffd    First-Fit Decreasing: cada peça, da maior para a menor, vai para a
+           primeira barra aberta onde cabe. A barra é achada numa árvore de
+           segmentos (O(n log n)); o plano é o mesmo do algoritmo antigo.
+    bfd    Best-Fit Decreasing: cada peça vai para a barra que fica com a menor
+           sobra. As sobras ficam numa lista ordenada (busca binária com bisect).
+    exato  Branch-and-bound por padrões de corte (bin completion), partindo da
+           melhor heurística e limitado a `limite_tempo` segundos. Se a busca
+           termina sem cortar padrões (`MAX_PADROES_POR_BARRA`), o número de
+           barras é o mínimo possível; senão fica a melhor solução encontrada.
+
+Perda de corte (kerf): uma barra com k peças consome a soma das peças mais
+(k - 1) * kerf. Somando o kerf a cada peça e ao comprimento da barra, o
+problema vira um bin packing comum, que é o que as estratégias resolvem.
+
+Com vários comprimentos em estoque e retalhos (`otimizar_estoque`), os
+retalhos são consumidos primeiro e o objetivo é o menor material comprado.
+
+Uso:
+    resultado = otimizar(6000, [(1200, 10), (850.5, 4)], perda_corte=3, estrategia='bfd')
+    resultado['barras'][0]['pecas'], resultado['resumo']['barras_necessarias']
+
+    resultado = otimizar_estoque([(6000, None), (12000, 4)], pecas, 3,
+                                 retalhos=[{'id': 7, 'comprimento': 2300, 'quantidade': 1}],
+                                 sobra_minima=300)
+    resultado['resumo']['retalhos_consumidos'], resultado['resumo']['novos_retalhos']
+"""
+import math
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+EPS = 1e-6  # mm; tolerância nas comparações de comprimento
+
+ESTRATEGIAS = OrderedDict([
+    ('ffd', "First-Fit Decreasing (rápido)"),
+    ('bfd', "Best-Fit Decreasing"),
+    ('exato', "Exato / quase ótimo"),
+])
+
+MAX_BARRAS_EXATO = 400     # acima disso a busca exata não roda (profundidade da recursão)
+MAX_PADROES_POR_BARRA = 60  # padrões de corte tentados em cada nível da busca
+
+
+class _ArvoreFirstFit:
+    """
+    Árvore de segmentos (máximo) sobre as barras em ordem de abertura.
+    Barras ainda não abertas valem a capacidade inteira, então a "primeira
+    barra onde cabe" pode ser uma barra nova, sem tratamento especial.
+    """
+
+    def __init__(self, n, capacidade):
+        self.tamanho = 1
+        while self.tamanho < max(1, n):
+            self.tamanho *= 2
+        self.arvore = [capacidade] * (2 * self.tamanho)
+
+    def colocar(self, x):
+        """Desconta `x` da primeira barra com sobra >= x e retorna o índice dela."""
+        no = 1
+        while no < self.tamanho:
+            no = 2 * no if self.arvore[2 * no] >= x - EPS else 2 * no + 1
+        indice = no - self.tamanho
+        self.arvore[no] -= x
+        no //= 2
+        while no:
+            self.arvore[no] = max(self.arvore[2 * no], self.arvore[2 * no + 1])
+            no //= 2
+        return indice
+
+
+def first_fit_decreasing(tamanhos, capacidade):
+    """Barras (listas de tamanhos) pelo FFD; `tamanhos` em ordem decrescente."""
+    arvore = _ArvoreFirstFit(len(tamanhos), capacidade)
+    barras = []
+    for x in tamanhos:
+        indice = arvore.colocar(x)
+        if indice == len(barras):
+            barras.append([])
+        barras[indice].append(x)
+    return barras
+
+
+def best_fit_decreasing(tamanhos, capacidade):
+    """Barras (listas de tamanhos) pelo BFD; `tamanhos` em ordem decrescente."""
+    barras = []
+    sobras = []  # (sobra, índice da barra), ordenada
+    menor = tamanhos[-1] if tamanhos else 0
+    for x in tamanhos:
+        i = bisect_left(sobras, (x - EPS, -1))
+        if i < len(sobras):
+            sobra, indice = sobras.pop(i)
+            sobra -= x
+        else:
+            indice, sobra = len(barras), capacidade - x
+            barras.append([])
+        barras[indice].append(x)
+        # Peças vêm em ordem decrescente: sobra menor que a menor peça não recebe mais nada
+        if sobra >= menor - EPS:
+            insort(sobras, (sobra, indice))
+    return barras
+
+
+class _TempoEsgotado(Exception):
+    pass
+
+
+def _limite_inferior(tamanhos, demanda, capacidade):
+    """Mínimo de barras: soma/capacidade e peças maiores que meia barra (uma por barra)."""
+    total = sum(t * q for t, q in zip(tamanhos, demanda))
+    grandes = sum(q for t, q in zip(tamanhos, demanda) if t > capacidade / 2 + EPS)
+    return max(math.ceil(total / capacidade - EPS), grandes)
+
+
+def _padroes(tamanhos, demanda, i0, capacidade, prazo, obrigatorio=True):
+    """
+    Padrões de corte maximais (nenhuma peça restante ainda caberia) que contêm
+    a maior peça restante (tipo `i0`; com obrigatorio=False ela pode ficar de
+    fora), dos mais cheios para os mais vazios. Retorna (padrões, completos):
+    completos=False quando a lista foi cortada em `MAX_PADROES_POR_BARRA`.
+    """
+    m = len(tamanhos)
+    contagem = [0] * m
+    encontrados = []
+
+    def dfs(j, livre):
+        if len(encontrados) >= MAX_PADROES_POR_BARRA * 4:
+            return
+        if time.monotonic() > prazo:
+            raise _TempoEsgotado()
+        if j == m:
+            for k in range(i0, m):
+                if demanda[k] > contagem[k] and tamanhos[k] <= livre + EPS:
+                    return
+            encontrados.append((capacidade - livre, tuple(contagem)))
+            return
+        if demanda[j] == 0:
+            dfs(j + 1, livre)
+            return
+        maximo = min(demanda[j], int((livre + EPS) // tamanhos[j]))
+        for c in range(maximo, (1 if obrigatorio and j == i0 else 0) - 1, -1):
+            contagem[j] = c
+            dfs(j + 1, livre - c * tamanhos[j])
+        contagem[j] = 0
+
+    dfs(i0, capacidade)
+    encontrados.sort(key=lambda p: -p[0])
+    completos = len(encontrados) <= MAX_PADROES_POR_BARRA
+    return [padrao for _, padrao in encontrados[:MAX_PADROES_POR_BARRA]], completos
+
+
+def branch_and_bound(tamanhos, demanda, capacidade, inicial, limite_tempo):
+    """
+    Busca exata por padrões (uma barra por nível, sempre com a maior peça
+    restante). `inicial` é a melhor solução conhecida (lista de padrões).
+    Retorna (padrões, provado_otimo). Se algum nível teve os padrões cortados,
+    a busca não cobriu tudo e só o limite inferior prova o ótimo.
+    """
+    demanda = list(demanda)
+    melhor = list(inicial)
+    limite = _limite_inferior(tamanhos, demanda, capacidade)
+    if len(melhor) <= limite:
+        return melhor, True
+    if limite >= MAX_BARRAS_EXATO:
+        return melhor, False
+
+    prazo = time.monotonic() + limite_tempo
+    atual = []
+    completa = True
+
+    def busca():
+        nonlocal melhor, completa
+        i0 = next((i for i, q in enumerate(demanda) if q), None)
+        if i0 is None:
+            melhor = list(atual)
+            return
+        if len(atual) + _limite_inferior(tamanhos, demanda, capacidade) >= len(melhor):
+            return
+        padroes, completos = _padroes(tamanhos, demanda, i0, capacidade, prazo)
+        completa = completa and completos
+        for padrao in padroes:
+            for i, c in enumerate(padrao):
+                demanda[i] -= c
+            atual.append(padrao)
+            busca()
+            atual.pop()
+            for i, c in enumerate(padrao):
+                demanda[i] += c
+            if len(melhor) <= limite:
+                return
+
+    try:
+        busca()
+        return melhor, completa or len(melhor) <= limite
+    except _TempoEsgotado:
+        return melhor, len(melhor) <= limite
+
+
+def _empacotar(agrupadas, comprimento_barra, perda_corte, estrategia, limite_tempo):
+    """
+    Peças {comprimento: quantidade} em barras de `comprimento_barra` pela estratégia.
+    Retorna (barras como listas de comprimentos, provado_otimo, limite_inferior).
+    """
+    capacidade = comprimento_barra + perda_corte
+    # Tipos em ordem decrescente, já com o kerf somado
+    comprimentos = sorted((c for c, q in agrupadas.items() if q), reverse=True)
+    tamanhos = [c + perda_corte for c in comprimentos]
+    demanda = [agrupadas[c] for c in comprimentos]
+    original = dict(zip(tamanhos, comprimentos))
+    expandidos = [t for t, q in zip(tamanhos, demanda) for _ in range(q)]
+    limite = _limite_inferior(tamanhos, demanda, capacidade)
+
+    if estrategia == 'ffd':
+        barras = first_fit_decreasing(expandidos, capacidade)
+        otimo = len(barras) <= limite
+    elif estrategia == 'bfd':
+        barras = best_fit_decreasing(expandidos, capacidade)
+        otimo = len(barras) <= limite
+    else:
+        barras = min(first_fit_decreasing(expandidos, capacidade),
+                     best_fit_decreasing(expandidos, capacidade), key=len)
+        indice = {t: i for i, t in enumerate(tamanhos)}
+        inicial = []
+        for barra in barras:
+            padrao = [0] * len(tamanhos)
+            for t in barra:
+                padrao[indice[t]] += 1
+            inicial.append(tuple(padrao))
+        padroes, otimo = branch_and_bound(tamanhos, demanda, capacidade, inicial, limite_tempo)
+        barras = [[t for t, c in zip(tamanhos, padrao) for _ in range(c)] for padrao in padroes]
+
+    return [[original[t] for t in barra] for barra in barras], otimo, limite
+
+
+def _usado(pecas, perda_corte):
+    return sum(pecas) + (len(pecas) - 1) * perda_corte if pecas else 0
+
+
+def _encher_retalho(agrupadas, comprimento, perda_corte):
+    """Peças (retiradas de `agrupadas`) que melhor ocupam um retalho de `comprimento`."""
+    comprimentos = sorted((c for c, q in agrupadas.items() if q and c <= comprimento + EPS), reverse=True)
+    if not comprimentos:
+        return []
+    tamanhos = [c + perda_corte for c in comprimentos]
+    demanda = [agrupadas[c] for c in comprimentos]
+    capacidade = comprimento + perda_corte
+    try:
+        padroes, _ = _padroes(tamanhos, demanda, 0, capacidade, time.monotonic() + 0.5, obrigatorio=False)
+        padrao = padroes[0]
+    except (_TempoEsgotado, IndexError):
+        # Sem padrão a tempo: enche o retalho na ordem decrescente
+        padrao, livre = [], capacidade
+        for t, q in zip(tamanhos, demanda):
+            c = min(q, int((livre + EPS) // t))
+            padrao.append(c)
+            livre -= c * t
+    pecas = []
+    for c, q in zip(comprimentos, padrao):
+        agrupadas[c] -= q
+        pecas.extend([c] * q)
+    return pecas
+
+
+def _distribuir_comprimentos(barras, estoque, perda_corte):
+    """
+    Troca cada barra pelo menor comprimento do estoque que comporta as peças dela,
+    respeitando as quantidades. Retorna [(comprimento, peças)] ou None se faltar barra.
+    """
+    disponivel = {c: q for c, q in estoque}
+    comprimentos = sorted(disponivel)
+    saida = []
+    for pecas in sorted(barras, key=lambda b: -_usado(b, perda_corte)):
+        usado = _usado(pecas, perda_corte)
+        escolhido = next((c for c in comprimentos
+                          if c >= usado - EPS and (disponivel[c] is None or disponivel[c] > 0)), None)
+        if escolhido is None:
+            return None
+        if disponivel[escolhido] is not None:
+            disponivel[escolhido] -= 1
+        saida.append((escolhido, pecas))
+    return saida
+
+
+def _resultado(barras, perda_corte, estrategia, otimo, limite, inicio, sobra_minima=None):
+    """
+    Monta o dicionário exibido pela tela (mesmo formato do algoritmo antigo).
+    `barras` são (comprimento, peças, retalho de origem ou None).
+    """
+    saida = []
+    total_util = total_sobra = total_kerf = total_material = comprado = 0
+    retalhos_consumidos, novos_retalhos = [], []
+    for comprimento_barra, pecas, retalho in barras:
+        pecas = sorted(pecas, reverse=True)
+        kerf_barra = (len(pecas) - 1) * perda_corte
+        restante = comprimento_barra - sum(pecas) - kerf_barra
+        novo_retalho = sobra_minima is not None and restante >= sobra_minima - EPS
+        saida.append({
+            'comprimento_total': comprimento_barra,
+            'comprimento_restante': restante,
+            'pecas': [round(p, 2) for p in pecas],
+            'sobra_final': round(restante, 2),
+            'perda_corte_kerf': round(kerf_barra, 2),
+            'retalho': retalho,
+            'novo_retalho': novo_retalho,
+        })
+        total_util += sum(pecas)
+        total_sobra += round(restante, 2)
+        total_kerf += kerf_barra
+        total_material += comprimento_barra
+        if retalho is None:
+            comprado += comprimento_barra
+        else:
+            retalhos_consumidos.append(retalho)
+        if novo_retalho:
+            novos_retalhos.append(round(restante, 2))
+
+    return {
+        'barras': saida,
+        'resumo': {
+            'barras_necessarias': len(saida),
+            'comprimento_util_total': round(total_util, 2),
+            'desperdicio_final_total': round(total_sobra, 2),
+            'perda_corte_total': round(total_kerf, 2),
+            'material_total_usado': round(total_material, 2),
+            'eficiencia': round(total_util / total_material * 100, 2) if total_material else 0,
+            'material_comprado': round(comprado, 2),
+            'retalhos_consumidos': retalhos_consumidos,
+            'novos_retalhos': novos_retalhos,
+            'perda_corte': perda_corte,
+            'estrategia': estrategia,
+            'otimo': otimo,
+            'limite_inferior': limite,
+            'tempo_s': round(time.perf_counter() - inicio, 3),
+        }
+    }
+
+
+def _agrupar(pecas_necessarias):
+    agrupadas = {}
+    for comprimento, quantidade in pecas_necessarias:
+        agrupadas[comprimento] = agrupadas.get(comprimento, 0) + quantidade
+    return agrupadas
+
+
+def otimizar(comprimento_barra, pecas_necessarias, perda_corte, estrategia='ffd', limite_tempo=5.0):
+    """
+    Plano de corte das `pecas_necessarias` ([(comprimento, quantidade)], todas
+    <= comprimento_barra) em barras de `comprimento_barra`.
+    `resumo['otimo']` é True quando o número de barras é comprovadamente o mínimo.
+    """
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError(f"Estratégia de corte desconhecida: {estrategia}")
+    inicio = time.perf_counter()
+    barras, otimo, limite = _empacotar(_agrupar(pecas_necessarias), comprimento_barra, perda_corte,
+                                       estrategia, limite_tempo)
+    return _resultado([(comprimento_barra, b, None) for b in barras], perda_corte, estrategia,
+                      otimo, limite, inicio)
+
+
+def otimizar_estoque(estoque, pecas_necessarias, perda_corte, estrategia='ffd', limite_tempo=5.0,
+                     retalhos=(), sobra_minima=None):
+    """
+    Plano de corte com barras de vários comprimentos e retalhos.
+
+    estoque: [(comprimento, quantidade)], quantidade None = sem limite (compra).
+    retalhos: dicts com 'comprimento' e 'quantidade' (demais chaves, como o id
+        em `materiais`, voltam em `barra['retalho']` e `resumo['retalhos_consumidos']`).
+    sobra_minima: sobra a partir da qual a barra gera um retalho novo
+        (`barra['novo_retalho']`, `resumo['novos_retalhos']`).
+
+    Os retalhos são usados primeiro, do menor para o maior, cada um com as peças
+    que melhor o ocupam. O restante vai para as barras: a estratégia empacota
+    tudo em cada comprimento do estoque e cada barra é trocada pelo menor
+    comprimento que comporta as peças dela; fica o plano de menor material
+    comprado (empate: menos barras). ValueError se o estoque não comportar as peças.
+    """
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError(f"Estratégia de corte desconhecida: {estrategia}")
+    inicio = time.perf_counter()
+    agrupadas = _agrupar(pecas_necessarias)
+
+    barras = []
+    for retalho in sorted(retalhos, key=lambda r: r['comprimento']):
+        for _ in range(int(retalho.get('quantidade') or 1)):
+            pecas = _encher_retalho(agrupadas, retalho['comprimento'], perda_corte)
+            if not pecas:
+                break
+            barras.append((retalho['comprimento'], pecas, retalho))
+
+    otimo = limite = None
+    if any(agrupadas.values()):
+        maior_peca = max(c for c, q in agrupadas.items() if q)
+        candidatos = sorted({c for c, _ in estoque if c >= maior_peca - EPS})
+        melhor = None
+        for comprimento in candidatos:
+            empacotadas, otimo_c, limite_c = _empacotar(agrupadas, comprimento, perda_corte, estrategia,
+                                                        limite_tempo / len(candidatos))
+            distribuidas = _distribuir_comprimentos(empacotadas, estoque, perda_corte)
+            if distribuidas is None:
+                continue
+            custo = (sum(c for c, _ in distribuidas), len(distribuidas))
+            if melhor is None or custo < melhor[0]:
+                melhor = (custo, distribuidas, otimo_c, limite_c)
+        if melhor is None:
+            raise ValueError("As barras em estoque não comportam todas as peças.")
+        _, distribuidas, otimo, limite = melhor
+        if len({c for c, _ in estoque}) > 1 or barras:
+            otimo = limite = None  # O limite inferior só vale para um único comprimento
+        barras.extend((c, pecas, None) for c, pecas in distribuidas)
+
+    return _resultado(barras, perda_corte, estrategia, otimo, limite, inicio, sobra_minima)
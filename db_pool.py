@@ -0,0 +1,315 @@
+# db_pool.py
+"""
+Pool de conexões pymysql compartilhado por todos os módulos do sistema.
+
+Abrir uma conexão TLS com o MySQL remoto custa de 50 a 150 ms de handshake.
+Este módulo mantém um conjunto de conexões abertas e reaproveita cada uma
+delas entre as consultas das telas Tk e das rotas do `web_app.py`.
+
+Uso:
+    from db_pool import get_connection
+
+    with get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+    # ou, no estilo antigo:
+    conn = get_connection()
+    ...
+    conn.close()  # devolve a conexão ao pool em vez de fechá-la
+"""
+import os
+import time
+import atexit
+import threading
+from collections import deque
+
+import pymysql
+import config
+from slow_query import TimedCursor
+
+
+class PoolTimeoutError(pymysql.err.OperationalError):
+    """Nenhuma conexão foi liberada dentro do tempo de espera configurado."""
+
+
+class _PoolEntry:
+    """Conexão física guardada no pool, com os instantes de criação e último uso."""
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class PooledConnection:
+    """
+    Envelope de uma conexão emprestada do pool.
+
+    Repassa tudo para a conexão pymysql original, mas `close()` (e a saída do
+    bloco `with`) devolve a conexão ao pool em vez de encerrá-la.
+    """
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    @property
+    def raw(self):
+        if self._entry is None:
+            raise pymysql.err.InterfaceError(0, "Conexão já devolvida ao pool")
+        return self._entry.conn
+
+    @property
+    def open(self):
+        return self._entry is not None and self._entry.conn.open
+
+    def cursor(self, *args, **kwargs):
+        # Medido pelo log de consultas lentas (slow_query.py)
+        return TimedCursor(self.raw.cursor(*args, **kwargs))
+
+    def close(self):
+        if self._entry is not None:
+            entry, self._entry = self._entry, None
+            self._pool.release(entry)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Garante a devolução caso o chamador esqueça de fechar a conexão
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Pool de conexões thread-safe.
+
+    size:          número máximo de conexões abertas ao mesmo tempo
+    idle_timeout:  segundos que uma conexão ociosa pode ficar no pool
+    max_lifetime:  idade máxima (segundos) de uma conexão antes de ser renovada
+    wait_timeout:  segundos que `acquire` espera por uma conexão livre
+    ping:          faz `ping()` na conexão ao retirá-la do pool
+    """
+
+    def __init__(self, connect_kwargs, size=5, idle_timeout=300, max_lifetime=1800,
+                 wait_timeout=30, ping=True):
+        self.connect_kwargs = dict(connect_kwargs)
+        self.size = max(1, int(size))
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.wait_timeout = wait_timeout
+        self.ping = ping
+
+        self._lock = threading.Condition()
+        self._idle = deque()
+        self._open = 0
+        self._pid = os.getpid()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._stats = {
+            'hits': 0,          # conexões reaproveitadas do pool
+            'misses': 0,        # conexões novas (handshake completo)
+            'waits': 0,         # vezes em que foi preciso esperar uma conexão livre
+            'wait_time': 0.0,   # tempo total de espera (s)
+            'timeouts': 0,      # esperas que estouraram `wait_timeout`
+            'expired': 0,       # conexões descartadas por ociosidade/idade
+            'broken': 0,        # conexões descartadas por falha no ping/rollback
+            'connect_time': 0.0,  # tempo total gasto abrindo conexões (s)
+        }
+
+    def _check_fork(self):
+        """Após um fork (workers do gunicorn) as conexões herdadas não podem ser reusadas."""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle.clear()
+            self._open = 0
+            self._reset_stats()
+
+    def _is_expired(self, entry, now):
+        if self.max_lifetime and now - entry.created_at > self.max_lifetime:
+            return True
+        if self.idle_timeout and now - entry.last_used > self.idle_timeout:
+            return True
+        return False
+
+    def _discard(self, entry):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+
+    def _connect(self):
+        start = time.perf_counter()
+        conn = pymysql.connect(**self.connect_kwargs)
+        with self._lock:
+            self._stats['connect_time'] += time.perf_counter() - start
+        return _PoolEntry(conn)
+
+    def acquire(self, timeout=None):
+        """Retira uma conexão do pool, abrindo uma nova se houver vaga."""
+        timeout = self.wait_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout if timeout else None
+        waited = False
+        wait_start = None
+
+        while True:
+            entry = None
+            create = False
+            with self._lock:
+                self._check_fork()
+                while self._idle:
+                    candidate = self._idle.pop()  # LIFO: a conexão mais "quente" primeiro
+                    if self._is_expired(candidate, time.monotonic()):
+                        self._open -= 1
+                        self._stats['expired'] += 1
+                        self._discard(candidate)
+                        continue
+                    entry = candidate
+                    break
+
+                if entry is None:
+                    if self._open < self.size:
+                        self._open += 1
+                        create = True
+                    else:
+                        if not waited:
+                            waited = True
+                            wait_start = time.monotonic()
+                            self._stats['waits'] += 1
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            self._stats['timeouts'] += 1
+                            self._stats['wait_time'] += time.monotonic() - wait_start
+                            raise PoolTimeoutError(
+                                2013, f"Tempo esgotado aguardando conexão do pool ({timeout}s)")
+                        self._lock.wait(remaining)
+                        continue
+
+                if waited:
+                    self._stats['wait_time'] += time.monotonic() - wait_start
+                    wait_start = time.monotonic()
+
+            if create:
+                try:
+                    entry = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._open -= 1
+                        self._lock.notify()
+                    raise
+                with self._lock:
+                    self._stats['misses'] += 1
+                return PooledConnection(self, entry)
+
+            if self.ping:
+                try:
+                    entry.conn.ping(reconnect=False)
+                except Exception:
+                    # Conexão derrubada pelo servidor: descarta e tenta de novo
+                    self._discard(entry)
+                    with self._lock:
+                        self._open -= 1
+                        self._stats['broken'] += 1
+                    continue
+
+            with self._lock:
+                self._stats['hits'] += 1
+            return PooledConnection(self, entry)
+
+    def release(self, entry):
+        """Devolve a conexão ao pool, desfazendo qualquer transação pendente."""
+        healthy = entry.conn.open
+        if healthy:
+            try:
+                # Encerra o snapshot/transação aberto para a próxima consulta ver dados atuais
+                entry.conn.rollback()
+            except Exception:
+                healthy = False
+
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            if healthy:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            else:
+                self._open -= 1
+                self._stats['broken'] += 1
+                self._discard(entry)
+            self._lock.notify()
+
+    def close_all(self):
+        """Fecha todas as conexões ociosas (as emprestadas são fechadas ao voltar)."""
+        with self._lock:
+            while self._idle:
+                self._open -= 1
+                self._discard(self._idle.pop())
+            self._lock.notify_all()
+
+    def stats(self):
+        """Retorna os contadores do pool (hits, misses, esperas, conexões abertas/ociosas)."""
+        with self._lock:
+            self._check_fork()
+            data = dict(self._stats)
+            data['size'] = self.size
+            data['open'] = self._open
+            data['idle'] = len(self._idle)
+            data['checked_out'] = self._open - len(self._idle)
+            total = data['hits'] + data['misses']
+            data['hit_ratio'] = (data['hits'] / total) if total else 0.0
+        return data
+
+
+# --- Instância única usada pelo sistema ---
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Retorna o pool global, criando-o na primeira chamada."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    connect_kwargs=dict(
+                        host=config.DB_HOST,
+                        user=config.DB_USER,
+                        password=config.DB_PASS,
+                        database=config.DB_NAME,
+                        charset='utf8mb4',
+                        cursorclass=pymysql.cursors.DictCursor,
+                    ),
+                    size=config.DB_POOL_SIZE,
+                    idle_timeout=config.DB_POOL_IDLE_TIMEOUT,
+                    max_lifetime=config.DB_POOL_MAX_LIFETIME,
+                    wait_timeout=config.DB_POOL_WAIT_TIMEOUT,
+                    ping=config.DB_POOL_PING,
+                )
+                atexit.register(_pool.close_all)
+    return _pool
+
+
+def get_connection(timeout=None):
+    """Empresta uma conexão do pool global. `close()` a devolve ao pool."""
+    return get_pool().acquire(timeout=timeout)
+
+
+def pool_stats():
+    """Contadores do pool global (vazio se o pool ainda não foi criado)."""
+    return _pool.stats() if _pool is not None else {}
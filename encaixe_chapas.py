@@ -0,0 +1,521 @@
+# encaixe_chapas.py
+"""
+Motor de encaixe 2D (peças retangulares em chapas) da aba "Corte de Chapa"
+do AproveitamentoApp.
+
+Algoritmos (`ESTRATEGIAS`):
+    maxrects_bssf  MaxRects, melhor lado curto: guarda todos os retângulos livres
+                   maximais (sobrepostos) e escolhe o que deixa a menor sobra no
+                   lado mais curto.
+    maxrects_baf   MaxRects, melhor área: o retângulo livre de menor área que comporta a peça.
+    maxrects_bl    MaxRects, mais abaixo e à esquerda.
+    skyline        Linha de horizonte (perfil de alturas) com mapa de desperdício:
+                   os vãos que ficam sob as peças viram retângulos livres e são
+                   usados antes de subir o perfil.
+    guilhotina     Cada colocação divide o retângulo livre com um corte de ponta a
+                   ponta; o plano sempre pode ser executado na serra.
+    serra          Guilhotina com o kerf exato (o espaço é a espessura do disco e
+                   só é descontado onde há corte) e a árvore de cortes de cada
+                   chapa em `chapa['cortes']`, na ordem de execução. Entre planos
+                   com as mesmas chapas fica o de menos cortes.
+    auto           Roda todos (menos 'serra') e fica com o de melhor aproveitamento.
+
+Cada algoritmo é rodado com várias ordenações das peças (`ORDENACOES`) e
+fica o melhor resultado: menos chapas e, no empate, a última chapa mais
+compacta (sobra maior e reaproveitável).
+
+O espaço entre peças é somado à peça e à chapa (uma peça de w ocupa w + espaço
+numa chapa de W + espaço), como no encaixe por prateleiras que este módulo
+substitui. O resultado tem a mesma estrutura de `chapas_geradas`:
+    [{'pecas_colocadas': [{'id', 'x', 'y', 'largura', 'altura'}], 'shelves': []}]
+No modo 'serra' cada chapa tem também 'cortes': [{'ordem', 'fase', 'orientacao'
+('H' ou 'V'), 'x1', 'y1', 'x2', 'y2', 'kerf'}]. A fase 1 são os cortes de ponta a
+ponta da chapa (refilo/rip); cada troca de direção numa faixa abre a fase seguinte
+(transversais, depois os de acabamento).
+
+Para trabalhos grandes, `busca_paralela` parte desse resultado e roda, até
+o fim do tempo dado, lotes de tentativas aleatórias (ordem das peças com
+ruído, orientação inicial e, no 'auto', algoritmo sorteados) num ProcessPoolExecutor
+com todos os núcleos, avisando a cada melhora.
+
+Uso:
+    chapas, nao_couberam, estrategia = encaixar(pecas, 3000, 1200, espaco=5, estrategia='auto')
+    chapas, nao_couberam, estrategia = busca_paralela(pecas, 3000, 1200, 5, limite_tempo=20,
+                                                      ao_melhorar=mostrar_parcial)
+"""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+ESTRATEGIAS = OrderedDict([
+    ('auto', "Automático (melhor aproveitamento)"),
+    ('maxrects_bssf', "MaxRects - melhor lado curto"),
+    ('maxrects_baf', "MaxRects - melhor área"),
+    ('maxrects_bl', "MaxRects - inferior esquerdo"),
+    ('skyline', "Skyline com mapa de desperdício"),
+    ('guilhotina', "Guilhotina (serra)"),
+    ('serra', "Guilhotina com kerf e sequência de cortes"),
+])
+
+# Regras de divisão do modo 'serra': faixas horizontais primeiro, verticais
+# primeiro ou corte que deixa a sobra menor no eixo menor
+REGRAS_SERRA = ('faixas_h', 'faixas_v', 'menor_sobra')
+
+ORDENACOES = OrderedDict([
+    ('area', lambda p: (-p['largura'] * p['altura'], -max(p['largura'], p['altura']))),
+    ('lado', lambda p: (-max(p['largura'], p['altura']), -min(p['largura'], p['altura']))),
+    ('perimetro', lambda p: (-(p['largura'] + p['altura']), -max(p['largura'], p['altura']))),
+    ('altura', lambda p: (-p['altura'], -p['largura'])),
+    ('largura', lambda p: (-p['largura'], -p['altura'])),
+])
+
+
+def _orientacoes(w, h, rotacao):
+    return ((w, h, False), (h, w, True)) if rotacao and w != h else ((w, h, False),)
+
+
+class _MaxRects:
+    """Chapa com a lista de retângulos livres maximais (x, y, w, h)."""
+
+    def __init__(self, largura, altura, heuristica):
+        self.livres = [(0, 0, largura, altura)]
+        self.heuristica = heuristica
+
+    def _nota(self, livre, w, h):
+        x, y, lw, lh = livre
+        sobra_w, sobra_h = lw - w, lh - h
+        if self.heuristica == 'baf':
+            return (lw * lh - w * h, min(sobra_w, sobra_h))
+        if self.heuristica == 'bl':
+            return (y + h, x)
+        return (min(sobra_w, sobra_h), max(sobra_w, sobra_h))  # bssf
+
+    def encontrar(self, w, h, rotacao):
+        """(nota, x, y, w, h) da melhor posição para a peça, ou None."""
+        melhor = None
+        for livre in self.livres:
+            for pw, ph, _ in _orientacoes(w, h, rotacao):
+                if pw <= livre[2] and ph <= livre[3]:
+                    nota = self._nota(livre, pw, ph)
+                    if melhor is None or nota < melhor[0]:
+                        melhor = (nota, livre[0], livre[1], pw, ph)
+        return melhor
+
+    def colocar(self, posicao):
+        _, x, y, w, h = posicao
+        novos = []
+        for livre in self.livres:
+            lx, ly, lw, lh = livre
+            if x >= lx + lw or x + w <= lx or y >= ly + lh or y + h <= ly:
+                novos.append(livre)
+                continue
+            # Partes do retângulo livre que sobram em volta da peça
+            if x > lx:
+                novos.append((lx, ly, x - lx, lh))
+            if x + w < lx + lw:
+                novos.append((x + w, ly, lx + lw - x - w, lh))
+            if y > ly:
+                novos.append((lx, ly, lw, y - ly))
+            if y + h < ly + lh:
+                novos.append((lx, y + h, lw, ly + lh - y - h))
+        self.livres = _maximais(novos)
+
+    def maior_lado_livre(self):
+        return max((min(l[2], l[3]) for l in self.livres), default=0)
+
+
+def _maximais(retangulos):
+    """Remove os retângulos contidos em outro (e as cópias repetidas)."""
+    retangulos = sorted(set(retangulos), key=lambda r: -r[2] * r[3])
+    saida = []
+    for r in retangulos:
+        if not any(o[0] <= r[0] and o[1] <= r[1] and r[0] + r[2] <= o[0] + o[2] and r[1] + r[3] <= o[1] + o[3]
+                   for o in saida):
+            saida.append(r)
+    return saida
+
+
+class _Guilhotina:
+    """
+    Chapa com retângulos livres disjuntos; cada colocação divide o retângulo
+    escolhido em dois com um corte de ponta a ponta (sobra menor no eixo menor).
+    """
+
+    def __init__(self, largura, altura, heuristica='baf'):
+        self.livres = [(0, 0, largura, altura)] if largura > 0 and altura > 0 else []
+        self.heuristica = heuristica
+
+    def encontrar(self, w, h, rotacao):
+        melhor = None
+        for indice, (x, y, lw, lh) in enumerate(self.livres):
+            for pw, ph, _ in _orientacoes(w, h, rotacao):
+                if pw <= lw and ph <= lh:
+                    if self.heuristica == 'bssf':
+                        nota = (min(lw - pw, lh - ph), max(lw - pw, lh - ph))
+                    else:
+                        nota = (lw * lh - pw * ph, min(lw - pw, lh - ph))
+                    if melhor is None or nota < melhor[0]:
+                        melhor = (nota, x, y, pw, ph, indice)
+        return melhor
+
+    def colocar(self, posicao):
+        _, x, y, w, h, indice = posicao
+        lx, ly, lw, lh = self.livres.pop(indice)
+        sobra_w, sobra_h = lw - w, lh - h
+        if sobra_w < sobra_h:
+            # Corte horizontal na altura da peça: a faixa de baixo fica com a largura toda
+            direita, baixo = (x + w, ly, sobra_w, h), (lx, y + h, lw, sobra_h)
+        else:
+            # Corte vertical na largura da peça: a faixa da direita fica com a altura toda
+            direita, baixo = (x + w, ly, sobra_w, lh), (lx, y + h, w, sobra_h)
+        self.livres.extend(r for r in (direita, baixo) if r[2] > 0 and r[3] > 0)
+
+    def maior_lado_livre(self):
+        return max((min(l[2], l[3]) for l in self.livres), default=0)
+
+
+class _Skyline:
+    """Perfil de alturas [x, y, largura] + mapa de desperdício (guilhotina) para os vãos."""
+
+    def __init__(self, largura, altura):
+        self.largura, self.altura = largura, altura
+        self.linha = [[0, 0, largura]]
+        self.desperdicio = _Guilhotina(0, 0)
+
+    def _apoio(self, i, w):
+        """Altura em que uma peça de largura `w` apoiada a partir do segmento `i` fica."""
+        x = self.linha[i][0]
+        if x + w > self.largura:
+            return None
+        y, restante, j = 0, w, i
+        while restante > 0:
+            y = max(y, self.linha[j][1])
+            restante -= self.linha[j][2]
+            j += 1
+        return y
+
+    def encontrar(self, w, h, rotacao):
+        vao = self.desperdicio.encontrar(w, h, rotacao)
+        if vao is not None:
+            return ((-1,), 'vao', vao)
+        melhor = None
+        for i in range(len(self.linha)):
+            for pw, ph, _ in _orientacoes(w, h, rotacao):
+                y = self._apoio(i, pw)
+                if y is None or y + ph > self.altura:
+                    continue
+                nota = (self._perda(i, pw, y), y + ph)
+                if melhor is None or nota < melhor[0]:
+                    melhor = (nota, 'linha', (i, self.linha[i][0], y, pw, ph))
+        return melhor
+
+    def _perda(self, i, w, y):
+        """Área que fica presa sob a peça."""
+        perda, restante, j = 0, w, i
+        while restante > 0:
+            largura = min(restante, self.linha[j][2])
+            perda += (y - self.linha[j][1]) * largura
+            restante -= largura
+            j += 1
+        return perda
+
+    def colocar(self, posicao):
+        _, origem, dados = posicao
+        if origem == 'vao':
+            self.desperdicio.colocar(dados)
+            return
+        i, x, y, w, h = dados
+        # Os vãos sob a peça vão para o mapa de desperdício
+        restante, j = w, i
+        while restante > 0:
+            sx, sy, sw = self.linha[j]
+            largura = min(restante, sw)
+            if y > sy:
+                self.desperdicio.livres.append((sx, sy, largura, y - sy))
+            restante -= largura
+            j += 1
+        # Novo segmento; os cobertos somem e o último parcialmente coberto é encurtado
+        fim = x + w
+        novos = self.linha[:i] + [[x, y + h, w]]
+        for sx, sy, sw in self.linha[i:]:
+            if sx + sw <= fim:
+                continue
+            if sx < fim:
+                sw, sx = sx + sw - fim, fim
+            novos.append([sx, sy, sw])
+        # Junta segmentos vizinhos da mesma altura
+        self.linha = []
+        for segmento in novos:
+            if self.linha and self.linha[-1][1] == segmento[1]:
+                self.linha[-1][2] += segmento[2]
+            else:
+                self.linha.append(segmento)
+
+    def maior_lado_livre(self):
+        topo = min(s[1] for s in self.linha)
+        return max(min(self.largura, self.altura - topo), self.desperdicio.maior_lado_livre())
+
+
+class _Serra:
+    """
+    Guilhotina com kerf exato e árvore de cortes. Cada nó é um retângulo da
+    chapa; um nó cortado tem 'corte' ('H'/'V'), 'posicao' e os dois filhos
+    (o segundo começa depois do kerf e some se o disco consumir o resto).
+    """
+
+    def __init__(self, largura, altura, kerf, regra):
+        self.kerf, self.regra = kerf, regra
+        self.raiz = {'x': 0, 'y': 0, 'largura': largura, 'altura': altura}
+        self.livres = [self.raiz]
+
+    def encontrar(self, w, h, rotacao):
+        melhor = None
+        for indice, no in enumerate(self.livres):
+            for pw, ph, _ in _orientacoes(w, h, rotacao):
+                if pw <= no['largura'] and ph <= no['altura']:
+                    # Menor sobra de área; no empate, a que pede menos cortes
+                    cortes = (pw < no['largura']) + (ph < no['altura'])
+                    nota = (no['largura'] * no['altura'] - pw * ph, cortes)
+                    if melhor is None or nota < melhor[0]:
+                        melhor = (nota, no['x'], no['y'], pw, ph, indice)
+        return melhor
+
+    def colocar(self, posicao):
+        _, _, _, w, h, indice = posicao
+        no = self.livres.pop(indice)
+        if self.regra == 'faixas_h':
+            horizontal_primeiro = True
+        elif self.regra == 'faixas_v':
+            horizontal_primeiro = False
+        else:
+            horizontal_primeiro = no['largura'] - w < no['altura'] - h
+        if horizontal_primeiro:
+            faixa, resto = self._cortar(no, 'H', h)
+            _, lado = self._cortar(faixa, 'V', w)
+        else:
+            faixa, resto = self._cortar(no, 'V', w)
+            _, lado = self._cortar(faixa, 'H', h)
+        self.livres.extend(n for n in (resto, lado) if n is not None)
+
+    def _cortar(self, no, orientacao, medida):
+        """Corta `no` a `medida` da origem; retorna (parte da peça, resto livre ou None)."""
+        eixo, tamanho = ('y', 'altura') if orientacao == 'H' else ('x', 'largura')
+        if medida >= no[tamanho]:
+            return no, None  # A peça ocupa a medida toda: não há corte
+        no['corte'], no['posicao'] = orientacao, no[eixo] + medida
+        primeiro = dict(no, **{tamanho: medida})
+        restante = no[tamanho] - medida - self.kerf
+        segundo = dict(no, **{eixo: no[eixo] + medida + self.kerf, tamanho: restante}) if restante > 0 else None
+        for filho in (primeiro, segundo):
+            if filho is not None:
+                filho.pop('corte', None)
+                filho.pop('posicao', None)
+        no['filhos'] = [f for f in (primeiro, segundo) if f is not None]
+        return primeiro, segundo
+
+    def maior_lado_livre(self):
+        return max((min(n['largura'], n['altura']) for n in self.livres), default=0)
+
+    def cortes(self):
+        """Cortes da árvore na ordem de execução: por fase, depois dos mais externos aos internos."""
+        cortes = []
+        pilha = [(self.raiz, 0, None, 0)]
+        while pilha:
+            no, profundidade, orientacao_pai, fase_pai = pilha.pop()
+            if 'corte' not in no:
+                continue
+            fase = fase_pai if no['corte'] == orientacao_pai else fase_pai + 1
+            if no['corte'] == 'H':
+                linha = (no['x'], no['posicao'], no['x'] + no['largura'], no['posicao'])
+            else:
+                linha = (no['posicao'], no['y'], no['posicao'], no['y'] + no['altura'])
+            cortes.append((fase, profundidade, no['posicao'], no['corte'], linha))
+            for filho in no['filhos']:
+                pilha.append((filho, profundidade + 1, no['corte'], fase))
+        cortes.sort(key=lambda c: c[:3])
+        return [{'ordem': n, 'fase': fase, 'orientacao': orientacao,
+                 'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2, 'kerf': self.kerf}
+                for n, (fase, _, _, orientacao, (x1, y1, x2, y2)) in enumerate(cortes, start=1)]
+
+
+_CRIAR = {
+    'maxrects_bssf': lambda w, h: _MaxRects(w, h, 'bssf'),
+    'maxrects_baf': lambda w, h: _MaxRects(w, h, 'baf'),
+    'maxrects_bl': lambda w, h: _MaxRects(w, h, 'bl'),
+    'skyline': _Skyline,
+    'guilhotina': _Guilhotina,
+}
+
+
+def _empacotar(pecas, chapa_w, chapa_h, espaco, estrategia, rotacao, regra='menor_sobra'):
+    """Encaixe first-fit nas chapas abertas; retorna (chapas, peças que não couberam)."""
+    if estrategia == 'serra':
+        # Kerf exato: nada é somado às peças, a própria serra desconta o disco em cada corte
+        kerf, espaco = espaco, 0
+        criar = lambda w, h: _Serra(w, h, kerf, regra)
+    else:
+        criar = _CRIAR[estrategia]
+    # Menor lado ainda por encaixar a partir de cada posição: chapas que não comportam mais nada são fechadas
+    menor_restante = [0] * (len(pecas) + 1)
+    menor_restante[-1] = float('inf')
+    for i in range(len(pecas) - 1, -1, -1):
+        menor_restante[i] = min(menor_restante[i + 1], min(pecas[i]['largura'], pecas[i]['altura']) + espaco)
+
+    chapas, abertas, nao_couberam = [], [], []
+    for i, peca in enumerate(pecas):
+        w, h = peca['largura'] + espaco, peca['altura'] + espaco
+        destino = posicao = None
+        for chapa in abertas:
+            posicao = chapa[0].encontrar(w, h, rotacao)
+            if posicao is not None:
+                destino = chapa
+                break
+        if destino is None:
+            nova = criar(chapa_w + espaco, chapa_h + espaco)
+            posicao = nova.encontrar(w, h, rotacao)
+            if posicao is None:
+                nao_couberam.append(peca)
+                continue
+            destino = (nova, {'pecas_colocadas': [], 'shelves': []})
+            if estrategia == 'serra':
+                destino[1]['_serra'] = nova
+            chapas.append(destino[1])
+            abertas.append(destino)
+        destino[0].colocar(posicao)
+        x, y, pw, ph = _coordenadas(posicao)
+        destino[1]['pecas_colocadas'].append({'id': peca['id'], 'x': x, 'y': y,
+                                              'largura': pw - espaco, 'altura': ph - espaco})
+        if destino[0].maior_lado_livre() < menor_restante[i + 1]:
+            abertas.remove(destino)
+    if estrategia == 'serra':
+        for chapa in chapas:
+            chapa['cortes'] = chapa.pop('_serra').cortes()
+    return chapas, nao_couberam
+
+
+def _coordenadas(posicao):
+    """(x, y, w, h) de uma posição devolvida por `encontrar`."""
+    if isinstance(posicao[1], str):  # skyline: (nota, origem, dados); os dados trazem x, y, w, h a partir do 2º campo
+        return posicao[2][1:5]
+    return posicao[1:5]
+
+
+def _custo(chapas):
+    """
+    Menos chapas; no empate, menos cortes (só no modo 'serra') e a última chapa
+    mais compacta (maior sobra aproveitável).
+    """
+    if not chapas:
+        return (0, 0, 0)
+    ultima = chapas[-1]['pecas_colocadas']
+    envolvente = (max(p['x'] + p['largura'] for p in ultima) * max(p['y'] + p['altura'] for p in ultima))
+    return (len(chapas), sum(len(c.get('cortes', ())) for c in chapas), envolvente)
+
+
+def encaixar(pecas, chapa_w, chapa_h, espaco=0, estrategia='auto', rotacao=True):
+    """
+    Encaixa as `pecas` ([{'id', 'largura', 'altura'}], uma entrada por unidade)
+    em chapas de `chapa_w` x `chapa_h`.
+    Retorna (chapas, peças que não cabem numa chapa vazia, estratégia usada).
+    """
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError(f"Estratégia de encaixe desconhecida: {estrategia}")
+    candidatas = list(_CRIAR) if estrategia == 'auto' else [estrategia]
+    regras = REGRAS_SERRA if estrategia == 'serra' else ('menor_sobra',)
+    melhor = None
+    for nome in candidatas:
+        for regra in regras:
+            for ordem in ORDENACOES.values():
+                chapas, nao_couberam = _empacotar(sorted(pecas, key=ordem), chapa_w, chapa_h, espaco, nome,
+                                                  rotacao, regra)
+                custo = _custo(chapas)
+                if melhor is None or custo < melhor[0]:
+                    melhor = (custo, chapas, nao_couberam, nome)
+    _, chapas, nao_couberam, nome = melhor
+    return chapas, nao_couberam, nome
+
+
+def aproveitamento(chapas, chapa_w, chapa_h):
+    """Área das peças / área das chapas usadas, em %."""
+    if not chapas:
+        return 0
+    area = sum(p['largura'] * p['altura'] for chapa in chapas for p in chapa['pecas_colocadas'])
+    return area / (chapa_w * chapa_h * len(chapas)) * 100
+
+
+DURACAO_LOTE = 0.5  # s de cada lote de tentativas num processo
+
+
+def _tentativa(pecas, chapa_w, chapa_h, espaco, estrategia, rng):
+    """Um encaixe com algoritmo, ordenação (com ruído) e orientação inicial sorteados."""
+    ordem = rng.choice(list(ORDENACOES.values()))
+    ruido = rng.uniform(0.0, 0.3)
+    pecas = [dict(p, largura=p['altura'], altura=p['largura']) if rng.random() < 0.5 else p for p in pecas]
+    # Ordenação base + troca aleatória de vizinhos próximos (peças de tamanho parecido)
+    chaves = sorted(range(len(pecas)), key=lambda i: ordem(pecas[i]))
+    posicao = {i: n + rng.gauss(0, 1) * ruido * len(pecas) ** 0.5 for n, i in enumerate(chaves)}
+    embaralhadas = [pecas[i] for i in sorted(posicao, key=posicao.get)]
+    if estrategia == 'auto':
+        estrategia = rng.choice(list(_CRIAR))
+    chapas, nao_couberam = _empacotar(embaralhadas, chapa_w, chapa_h, espaco, estrategia, True,
+                                      rng.choice(REGRAS_SERRA))
+    return chapas, nao_couberam, estrategia
+
+
+def _lote(pecas, chapa_w, chapa_h, espaco, estrategia, semente, duracao):
+    """Tentativas até `duracao` segundos; retorna a melhor (custo, chapas, não couberam, estratégia)."""
+    rng = random.Random(semente)
+    fim = time.monotonic() + duracao
+    melhor = None
+    while True:
+        chapas, nao_couberam, usada = _tentativa(pecas, chapa_w, chapa_h, espaco, estrategia, rng)
+        custo = _custo(chapas)
+        if melhor is None or custo < melhor[0]:
+            melhor = (custo, chapas, nao_couberam, usada)
+        if time.monotonic() >= fim:
+            return melhor
+
+
+def busca_paralela(pecas, chapa_w, chapa_h, espaco=0, limite_tempo=20.0, ao_melhorar=None,
+                   processos=None, parar=None, semente=None, estrategia='auto'):
+    """
+    Multi-start em paralelo: começa pelo `encaixar(..., estrategia)` e roda lotes de
+    tentativas aleatórias em `processos` processos (padrão: todos os núcleos)
+    até `limite_tempo` segundos ou até `parar` (threading.Event) ser acionado.
+    `ao_melhorar(chapas, nao_couberam, estrategia)` é chamado (nesta thread) a
+    cada melhora. Retorna o melhor (chapas, nao_couberam, estrategia).
+    """
+    fim = time.monotonic() + limite_tempo
+    parar = parar or threading.Event()
+    chapas, nao_couberam, usada = encaixar(pecas, chapa_w, chapa_h, espaco, estrategia)
+    melhor = (_custo(chapas), chapas, nao_couberam, usada)
+    if ao_melhorar:
+        ao_melhorar(chapas, nao_couberam, usada)
+
+    processos = processos or os.cpu_count() or 1
+    sementes = random.Random(semente)
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        def enviar():
+            duracao = min(DURACAO_LOTE, max(0.05, fim - time.monotonic()))
+            return executor.submit(_lote, pecas, chapa_w, chapa_h, espaco, estrategia,
+                                   sementes.getrandbits(32), duracao)
+
+        pendentes = {enviar() for _ in range(processos)}
+        while pendentes:
+            prontos, pendentes = wait(pendentes, timeout=0.2, return_when=FIRST_COMPLETED)
+            for futuro in prontos:
+                resultado = futuro.result()
+                if resultado[0] < melhor[0]:
+                    melhor = resultado
+                    if ao_melhorar:
+                        ao_melhorar(*melhor[1:])
+                if time.monotonic() < fim and not parar.is_set():
+                    pendentes.add(enviar())
+            if parar.is_set():
+                for futuro in pendentes:
+                    futuro.cancel()
+                break
+    return melhor[1:]
@@ -1,7 +1,9 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 import pymysql
-from config import DB_HOST, DB_USER, DB_PASS, DB_NAME
+from db_pool import get_connection
+from tk_worker import CanalDeCarga, executar_em_segundo_plano
+from ref_cache import cached
 from datetime import datetime
 from select2_tkinter import Select2Tkinter
 
@@ -14,6 +16,7 @@ class EstoqueApp:
 
         self.all_itens_data = [] # Para popular o combobox de adição
         self.stock_data = [] # Para a lista principal
+        self._carga_estoque = CanalDeCarga(self.main_frame) # Busca da lista principal (só a mais recente vale)
 
         self.create_widgets()
         self.load_all_itens() # Carrega itens para o modal
@@ -22,11 +25,7 @@ class EstoqueApp:
     def _execute_query(self, query, params=None, fetch=None):
         conn = None
         try:
-            conn = pymysql.connect(
-                host=DB_HOST, user=DB_USER, password=DB_PASS,
-                database=DB_NAME, charset='utf8mb4',
-                cursorclass=pymysql.cursors.DictCursor
-            )
+            conn = get_connection()
             with conn.cursor() as cursor:
                 cursor.execute(query, params or ())
                 if fetch == 'one':
@@ -43,6 +42,15 @@ class EstoqueApp:
         finally:
             if conn: conn.close()
 
+    def _fetch_all(self, query, params=None):
+        """Executa um SELECT e retorna as linhas. Não usa messagebox: roda no executor de segundo plano."""
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, params or ())
+            return cursor.fetchall()
+
+    def _on_load_error(self, error):
+        messagebox.showerror("Erro de Banco de Dados", f"Erro: {error}")
+
     def create_widgets(self):
         # --- Frame de Filtros e Ações ---
         top_frame = ttk.LabelFrame(self.main_frame, text="Ações e Filtros", padding=10)
@@ -92,7 +100,12 @@ class EstoqueApp:
 
     def load_all_itens(self):
         """Carrega todos os itens para o modal de adição."""
-        self.all_itens_data = self._execute_query("SELECT id, codigo, descricao FROM itens ORDER BY descricao ASC", fetch='all') or []
+        def store(rows):
+            self.all_itens_data = rows or []
+        def fetch():
+            return cached(('itens',), ('itens',), lambda: self._fetch_all(
+                "SELECT id, codigo, descricao FROM itens ORDER BY descricao ASC"))
+        executar_em_segundo_plano(self.main_frame, fetch, ao_concluir=store, ao_falhar=self._on_load_error)
 
     def load_stock_data(self):
         """Carrega os dados do estoque do banco de dados, aplicando o filtro de busca."""
@@ -117,7 +130,12 @@ class EstoqueApp:
             """
             params = None
 
-        self.stock_data = self._execute_query(sql, params, fetch='all') or []
+        # Cada tecla digitada cancela a busca anterior; só o último resultado preenche a tabela
+        self._carga_estoque.executar(self._fetch_all, sql, params,
+                                     ao_concluir=self._on_stock_loaded, ao_falhar=self._on_load_error)
+
+    def _on_stock_loaded(self, rows):
+        self.stock_data = rows or []
         self.populate_treeview()
 
     def populate_treeview(self):
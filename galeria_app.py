@@ -4,7 +4,7 @@ import os
 import json
 from PIL import Image, ImageTk
 import shutil
-import threading
+from tk_worker import CanalDeCarga
 
 UPLOADS_DIR = "uploads"
 
@@ -20,6 +20,7 @@ class GaleriaApp:
             os.makedirs(UPLOADS_DIR)
 
         self.image_references = [] # Para manter as referências das imagens
+        self._carga_galeria = CanalDeCarga(self.frame) # Recarregar cancela a leitura anterior
 
         self.create_widgets()
         self.start_loading_gallery()
@@ -80,7 +81,8 @@ class GaleriaApp:
         self.progress_bar.start()
 
         # Inicia o carregamento em uma thread para não travar a UI
-        threading.Thread(target=self.load_gallery, daemon=True).start()
+        self._carga_galeria.executar(self.load_gallery, ao_concluir=self.update_gallery_ui,
+                                     ao_falhar=self._on_load_error)
 
     def load_gallery(self):
         """Carrega os dados das imagens e agenda a atualização da UI."""
@@ -97,8 +99,13 @@ class GaleriaApp:
                         images_by_pedido[pedido] = []
                     images_by_pedido[pedido].append({'path': os.path.join(UPLOADS_DIR, img_name), 'info': info})
 
-        # Agenda a atualização da interface gráfica na thread principal
-        self.frame.after(0, self.update_gallery_ui, images_by_pedido)
+        # O executor entrega o resultado a update_gallery_ui na thread principal
+        return images_by_pedido
+
+    def _on_load_error(self, error):
+        self.progress_bar.stop()
+        self.loading_label.configure(text=f"Erro ao carregar galeria: {error}")
+        self.progress_bar.destroy()
 
     def update_gallery_ui(self, images_by_pedido):
         """Atualiza a interface com os cards da galeria (executado na thread principal)."""
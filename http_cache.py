@@ -0,0 +1,89 @@
+# http_cache.py
+"""
+Respostas condicionais (ETag + 304) para as APIs somente leitura.
+
+Antes de executar a rota, uma consulta barata calcula a "versão" das tabelas
+que ela lê: `COUNT(*)` e `MAX(atualizado_em)` de cada uma. A coluna
+`atualizado_em` (migrações 3 e 6, `TIMESTAMP(6) ... ON UPDATE`) muda em
+qualquer gravação, venha de onde vier (web, telas Tk, sistema PHP), e a
+contagem cobre as exclusões; é o mesmo critério da sincronização incremental
+de `obras_cache.py`. Se o navegador já tem essa versão (`If-None-Match`), a
+resposta é um 304 sem corpo e a consulta pesada nem é executada.
+
+As respostas 200 saem com `Cache-Control: private, no-cache`: o navegador
+guarda o JSON, mas revalida a cada carregamento (o `fetch()` das páginas
+manda o `If-None-Match` sozinho, sem mudanças no JavaScript).
+
+Uso:
+    @app.route('/api/itens')
+    @login_required
+    @conditional_response('itens')
+    def get_itens(): ...
+
+Sem `Last-Modified`: o `If-Modified-Since` tem resolução de 1 s e deixaria
+passar gravações no mesmo segundo. Se a consulta de versão falhar (ex.:
+migração 6 ainda não aplicada), a rota responde normalmente, sem cabeçalhos
+de cache.
+"""
+import hashlib
+import logging
+from functools import wraps
+
+from flask import make_response, request
+
+import config
+from models import get_raw_connection
+
+logger = logging.getLogger(__name__)
+
+
+def table_versions(cursor, tables):
+    """Retorna {tabela: (linhas, maior atualizado_em)} das tabelas informadas."""
+    # MAX usa o índice de atualizado_em; COUNT(*) percorre o menor índice da tabela
+    versoes = ' UNION ALL '.join(
+        f"SELECT '{tabela}' AS tabela, COUNT(*) AS linhas, MAX(atualizado_em) AS atualizado FROM `{tabela}`"
+        for tabela in tables)
+    cursor.execute(versoes)
+    return {row['tabela']: (row['linhas'], row['atualizado']) for row in cursor.fetchall()}
+
+
+def _version(tables):
+    """ETag atual das tabelas, considerando também a URL (filtros)."""
+    with get_raw_connection() as connection, connection.cursor() as cursor:
+        versoes = table_versions(cursor, tables)
+
+    assinatura = request.full_path + '|' + '|'.join(
+        f"{tabela}:{linhas}:{atualizado.isoformat() if atualizado else ''}"
+        for tabela, (linhas, atualizado) in sorted(versoes.items()))
+    return hashlib.sha1(assinatura.encode('utf-8')).hexdigest()
+
+
+def _cache_headers(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept')  # ?stream / Accept: application/x-ndjson mudam o corpo
+    return response
+
+
+def conditional_response(*tables):
+    """Decorator: responde 304 quando as `tables` não mudaram desde a versão que o cliente tem."""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not config.HTTP_CACHE_ENABLED or request.method != 'GET':
+                return f(*args, **kwargs)
+            try:
+                etag = _version(tables)
+            except Exception as e:
+                logger.warning("Falha ao calcular a versão de %s: %s", request.path, e)
+                return f(*args, **kwargs)
+
+            if request.if_none_match.contains(etag):
+                return _cache_headers(make_response('', 304), etag)
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                _cache_headers(response, etag)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,171 @@
+# log_setup.py
+"""
+Logging assíncrono para o app.py e o web_app.py.
+
+As rotas só colocam o registro numa fila em memória (`QueueHandler`); uma
+thread (`QueueListener`) escreve no stdout e no arquivo `config.LOG_FILE`.
+Assim nenhuma requisição espera por disco.
+
+- O arquivo é gravado em lotes (`config.LOG_BUFFER_CAPACITY` registros ou a
+  cada `config.LOG_FLUSH_INTERVAL` segundos; erros são gravados na hora).
+- Rotação por tamanho (`LOG_MAX_BYTES` x `LOG_BACKUP_COUNT`) ou por tempo
+  (`LOG_ROTATE_WHEN`, ex.: 'midnight'), para o arquivo não crescer sem limite.
+  Os handlers de rotação do `logging` não suportam vários processos no mesmo
+  arquivo (um renomeia o arquivo que o outro ainda grava), então cada processo
+  grava e roda o seu (`error.<pid>.log`). Com `LOG_MAX_BYTES=0` e sem
+  `LOG_ROTATE_WHEN`, todos acrescentam ao mesmo `config.LOG_FILE`
+  (`WatchedFileHandler`), e a rotação fica por conta de fora (logrotate).
+- Registros DEBUG são amostrados (`LOG_DEBUG_SAMPLE_RATE`, de 0 a 1).
+- Com a fila cheia (`LOG_QUEUE_SIZE`) o registro é descartado e contado,
+  em vez de bloquear a requisição.
+
+Uso (uma vez, no início do módulo da aplicação):
+    from log_setup import setup_logging
+    setup_logging()
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+import config
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+
+class DebugSampler(logging.Filter):
+    """Deixa passar só uma fração `rate` dos registros DEBUG (os demais níveis passam sempre)."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = max(0.0, min(1.0, float(rate)))
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1.0 or random.random() < self.rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta (e conta) registros quando a fila está cheia."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BufferedHandler(logging.handlers.MemoryHandler):
+    """MemoryHandler que também descarrega o buffer quando o registro mais antigo passa de `interval` segundos."""
+
+    def __init__(self, capacity, interval, target, flush_level=logging.ERROR):
+        super().__init__(capacity, flushLevel=flush_level, target=target, flushOnClose=True)
+        self.interval = interval
+        self._primeiro = None
+
+    def shouldFlush(self, record):
+        if self._primeiro is None:
+            self._primeiro = time.monotonic()
+        return (super().shouldFlush(record)
+                or time.monotonic() - self._primeiro >= self.interval)
+
+    def flush(self):
+        # Chamado pela thread da fila e pela de descarga periódica
+        self.acquire()
+        try:
+            super().flush()
+            self._primeiro = None
+        finally:
+            self.release()
+
+
+def arquivo_do_processo(path, pid=None):
+    """`error.log` -> `error.<pid>.log`: um arquivo por processo quando a rotação é interna."""
+    base, ext = os.path.splitext(path)
+    return f"{base}.{os.getpid() if pid is None else pid}{ext}"
+
+
+def file_handler(path):
+    """Handler de arquivo seguro com vários processos gravando (workers do gunicorn, telas Tk)."""
+    if config.LOG_ROTATE_WHEN:
+        return logging.handlers.TimedRotatingFileHandler(
+            arquivo_do_processo(path), when=config.LOG_ROTATE_WHEN, backupCount=config.LOG_BACKUP_COUNT,
+            encoding='utf-8')
+    if config.LOG_MAX_BYTES > 0:
+        return logging.handlers.RotatingFileHandler(
+            arquivo_do_processo(path), maxBytes=config.LOG_MAX_BYTES, backupCount=config.LOG_BACKUP_COUNT,
+            encoding='utf-8')
+    # Rotação externa: reabre o arquivo quando o logrotate o move
+    return logging.handlers.WatchedFileHandler(path, encoding='utf-8')
+
+
+_listener = None
+_queue_handler = None
+_lock = threading.Lock()
+
+
+def setup_logging(level=None, log_file=None):
+    """Instala a fila de logging no logger raiz (idempotente por processo)."""
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is not None:
+            return _listener
+        level = getattr(logging, (level or config.LOG_LEVEL).upper(), logging.DEBUG)
+        log_file = log_file or config.LOG_FILE
+
+        console = logging.StreamHandler(sys.stdout)
+        console.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers = [console]
+        try:
+            arquivo = BufferedHandler(config.LOG_BUFFER_CAPACITY, config.LOG_FLUSH_INTERVAL,
+                                      file_handler(log_file))
+            arquivo.target.setFormatter(logging.Formatter(LOG_FORMAT))
+            handlers.append(arquivo)
+        except OSError as e:
+            # Sem permissão de escrita (ex.: disco somente leitura): segue só com o stdout
+            print(f"Não foi possível abrir {log_file}: {e}", file=sys.stderr)
+            arquivo = None
+
+        log_queue = queue.Queue(config.LOG_QUEUE_SIZE)
+        _queue_handler = DroppingQueueHandler(log_queue)
+        _queue_handler.addFilter(DebugSampler(config.LOG_DEBUG_SAMPLE_RATE))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+        root.setLevel(level)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+
+        if arquivo is not None:
+            # Garante que um lote parado no buffer chegue ao disco mesmo sem novos registros
+            def descarregar_periodicamente():
+                while True:
+                    time.sleep(config.LOG_FLUSH_INTERVAL)
+                    arquivo.flush()
+            threading.Thread(target=descarregar_periodicamente, name='log-flush', daemon=True).start()
+
+        def parar():
+            _listener.stop()
+            for handler in handlers:
+                handler.close()
+        atexit.register(parar)
+        return _listener
+
+
+def logging_stats():
+    """Registros descartados por fila cheia e tamanho atual da fila."""
+    if _queue_handler is None:
+        return {}
+    return {'dropped': _queue_handler.dropped, 'queued': _queue_handler.queue.qsize(),
+            'pid': os.getpid()}
@@ -1,11 +1,11 @@
 import customtkinter as ctk
 from tkinter import messagebox
-import pymysql
 from werkzeug.security import check_password_hash
 import datetime
-from config import DB_HOST, DB_USER, DB_PASS, DB_NAME
+from db_pool import get_connection
 from main_app import MainApp  # Importa a MainApp do novo arquivo
 import configparser
+import multiprocessing
 import os
 import sys
 import base64
@@ -82,14 +82,7 @@ class LoginApp:
     def get_db_connection(self):
         """Estabelece conexão com o banco de dados"""
         try:
-            connection = pymysql.connect(
-                host=DB_HOST,
-                user=DB_USER,
-                password=DB_PASS,
-                database=DB_NAME,
-                charset='utf8mb4',
-                cursorclass=pymysql.cursors.DictCursor
-            )
+            connection = get_connection()
             return connection
         except Exception as e:
             messagebox.showerror("Erro", f"Erro ao conectar com o banco: {str(e)}")
@@ -194,5 +187,6 @@ class LoginApp:
         self.root.mainloop()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # Processos da busca paralela do encaixe (aproveitamento_app) no executável
     app = LoginApp()
     app.run()
\ No newline at end of file
@@ -1,10 +1,9 @@
 import customtkinter as ctk
 from tkinter import messagebox, ttk
-import pymysql
 from passlib.context import CryptContext # Importa o passlib
-from config import DB_HOST, DB_USER, DB_PASS, DB_NAME
+from db_pool import get_connection
 from itertools import cycle
-import threading
+from tk_worker import executar_em_segundo_plano
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
@@ -194,67 +193,53 @@ class MainApp:
             self.show_content(item)
             
     def fetch_slide_data(self):
-        """Busca dados para o slide show em uma thread separada"""
+        """Busca dados para o slide show no executor de segundo plano"""
         def fetch_data():
-            try:
-                connection = pymysql.connect(
-                    host=DB_HOST,
-                    user=DB_USER,
-                    password=DB_PASS,
-                    database=DB_NAME,
-                    charset='utf8mb4',
-                    cursorclass=pymysql.cursors.DictCursor
-                )
-                
-                with connection.cursor() as cursor:
-                    sql = """
-                        SELECT 
-                            p.idpedido,
-                            p.numero_pedido AS pedido,
-                            ac.cliente AS nome_cliente,
-                            ac.endereco,
-                            ci.id_item AS id_vinculo,
-                            ci.status_producao,
-                            pai.descricao AS equipamento_pai,
-                            filho.descricao AS conjunto
-                        FROM cliente_item ci
-                        JOIN pedido p ON ci.idpedido = p.idpedido
-                        JOIN add_cliente ac ON p.idcliente = ac.idcliente
-                        JOIN itens pai ON ci.item_raiz_id = pai.id
-                        JOIN itens filho ON ci.id_item_fk = filho.id
-                        ORDER BY p.idpedido DESC
-                    """
-                    cursor.execute(sql)
-                    self.slide_data = cursor.fetchall()
-                    
-                    # Contar status para o gráfico de pizza
-                    self.status_counts = {}
-                    for item in self.slide_data:
-                        status = item['status_producao']
-                        self.status_counts[status] = self.status_counts.get(status, 0) + 1
-                    
-                    # Agrupar em grupos de 3
-                    grouped_data = []
-                    for i in range(0, len(self.slide_data), 3):
-                        grouped_data.append(self.slide_data[i:i+3])
-                    
-                    self.slide_cycle = cycle(grouped_data)
-                    
-                    # Iniciar o slide show e atualizar gráfico
-                    if self.is_running:
-                        self.root.after(0, self.start_slide_transition)
-                        self.root.after(0, self.update_pie_chart)
-                    
-            except Exception as e:
-                print(f"Erro ao buscar dados do slide: {str(e)}")
-            finally:
-                if connection:
-                    connection.close()
-        
-        # Executar em thread separada para não travar a interface
-        thread = threading.Thread(target=fetch_data)
-        thread.daemon = True
-        thread.start()
+            with get_connection() as connection, connection.cursor() as cursor:
+                sql = """
+                    SELECT 
+                        p.idpedido,
+                        p.numero_pedido AS pedido,
+                        ac.cliente AS nome_cliente,
+                        ac.endereco,
+                        ci.id_item AS id_vinculo,
+                        ci.status_producao,
+                        pai.descricao AS equipamento_pai,
+                        filho.descricao AS conjunto
+                    FROM cliente_item ci
+                    JOIN pedido p ON ci.idpedido = p.idpedido
+                    JOIN add_cliente ac ON p.idcliente = ac.idcliente
+                    JOIN itens pai ON ci.item_raiz_id = pai.id
+                    JOIN itens filho ON ci.id_item_fk = filho.id
+                    ORDER BY p.idpedido DESC
+                """
+                cursor.execute(sql)
+                return cursor.fetchall()
+
+        def apply_data(rows):
+            self.slide_data = rows
+
+            # Contar status para o gráfico de pizza
+            self.status_counts = {}
+            for item in self.slide_data:
+                status = item['status_producao']
+                self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+            # Agrupar em grupos de 3
+            grouped_data = []
+            for i in range(0, len(self.slide_data), 3):
+                grouped_data.append(self.slide_data[i:i+3])
+
+            self.slide_cycle = cycle(grouped_data)
+
+            # Iniciar o slide show e atualizar gráfico
+            if self.is_running:
+                self.start_slide_transition()
+                self.update_pie_chart()
+
+        # Executar no executor compartilhado para não travar a interface
+        executar_em_segundo_plano(self.root, fetch_data, ao_concluir=apply_data,
+                                  ao_falhar=lambda e: print(f"Erro ao buscar dados do slide: {str(e)}"))
     
     def get_status_color(self, status):
         """Retorna a cor com base no status de produção"""
@@ -555,14 +540,7 @@ class MainApp:
         
         # Atualiza status para offline no banco
         try:
-            connection = pymysql.connect(
-                host=DB_HOST,
-                user=DB_USER,
-                password=DB_PASS,
-                database=DB_NAME,
-                charset='utf8mb4',
-                cursorclass=pymysql.cursors.DictCursor
-            )
+            connection = get_connection()
             
             with connection.cursor() as cursor:
                 update_sql = "UPDATE usuarios SET status = 'offline' WHERE id = %s"
@@ -2,7 +2,8 @@ import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, font
 import customtkinter as ctk
 import pymysql
-from config import DB_HOST, DB_USER, DB_PASS, DB_NAME
+from db_pool import get_connection
+from text_truncate import truncar_texto
 
 class MaterialApp:
     def __init__(self, parent, user):
@@ -56,11 +57,7 @@ class MaterialApp:
         """
         conn = None
         try:
-            conn = pymysql.connect(
-                host=DB_HOST, user=DB_USER, password=DB_PASS,
-                database=DB_NAME, charset='utf8mb4',
-                cursorclass=pymysql.cursors.DictCursor
-            )
+            conn = get_connection()
             with conn.cursor() as cursor:
                 cursor.execute(query, params or ())
                 if fetch == 'one':
@@ -222,16 +219,8 @@ class MaterialApp:
 
     def _truncate_text(self, text, max_width, font_obj):
         """Trunca o texto com '...' se exceder a largura máxima da coluna."""
-        if not isinstance(text, str):
-            return text
-        
-        text_width = font_obj.measure(text)
-        if text_width > max_width:
-            while font_obj.measure(text + '...') > max_width and len(text) > 0:
-                text = text[:-1]
-            return text + '...'
-        return text
-        
+        return truncar_texto(text, max_width, font_obj)
+
     def on_chapa_selected(self, selected_desc):
         """Chamado quando um tipo de chapa é selecionado no combobox."""
         
@@ -1,9 +1,21 @@
 # menu_content.py
 from flask import session, url_for, render_template
 from models import get_session, User
+from ref_cache import cached
 
 db = get_session()
 
+def _dados_usuario(user_id):
+    """
+    (username, foto_perfil) do usuário, guardados no ref_cache (evita uma consulta por página).
+    O app.py chama invalidate('usuarios') ao criar usuários; nome e foto não são alterados
+    por este sistema, e mudanças feitas por fora aparecem quando a entrada expira (TTL).
+    """
+    def carregar():
+        usuario = db.query(User).filter_by(id=user_id).first()
+        return (usuario.username, usuario.foto_perfil) if usuario else None
+    return cached(('usuario_menu', user_id), ('usuarios',), carregar)
+
 def is_admin():
     """Verifica se o usuário logado é admin."""
     return session.get('role') == 'admin'
@@ -12,13 +24,13 @@ def get_user_html():
     """Retorna o HTML da foto/nome do usuário logado."""
     if session.get('user_id'):
         user_id = session['user_id']
-        usuario = db.query(User).filter_by(id=user_id).first()
-        if usuario and getattr(usuario, 'foto_perfil', None):
-            foto = url_for('static', filename=f'uploads/perfil/{usuario.foto_perfil}')
-            return f'<img src="{foto}" alt="Perfil" class="profile-pic-small me-2"> {usuario.username}'
+        usuario = _dados_usuario(user_id)
+        if usuario and usuario[1]:
+            foto = url_for('static', filename=f'uploads/perfil/{usuario[1]}')
+            return f'<img src="{foto}" alt="Perfil" class="profile-pic-small me-2"> {usuario[0]}'
         else:
             # quando não há foto, usuario pode ser None — proteja:
-            name = usuario.username if usuario else 'Usuário'
+            name = usuario[0] if usuario else 'Usuário'
             return f'<i class="fas fa-user-circle me-2"></i> {name}'
     return '<i class="fas fa-user-circle me-2"></i> Usuário'
 
@@ -0,0 +1,345 @@
+# migrations.py
+"""
+Migrações versionadas do esquema MySQL.
+
+Cada migração tem um número de versão, uma descrição e uma lista de
+operações (tabelas, índices, colunas, cópias de dados). As versões já aplicadas ficam na tabela
+`schema_migrations`; `upgrade()` aplica apenas as pendentes, em ordem, sob um
+`GET_LOCK` para que dois processos (ex.: workers do gunicorn com
+`DB_AUTO_MIGRATE=1`) não migrem ao mesmo tempo.
+
+O DDL do MySQL não é transacional: uma migração interrompida no meio pode
+deixar parte das operações aplicada. Por isso cada operação verifica o
+`information_schema` antes de executar (índice com as mesmas colunas já
+existe, coluna já existe; os comandos de dados são idempotentes) e rodar
+`upgrade` de novo completa o que faltou.
+
+Uso:
+    python migrations.py status            # versões aplicadas e pendentes
+    python migrations.py upgrade [--ate N] # aplica as pendentes (até a versão N)
+    python migrations.py sql               # imprime o DDL pendente (para um DBA aplicar)
+
+Novas migrações entram no fim de `MIGRATIONS`, com a próxima versão;
+nunca altere uma migração já publicada.
+"""
+import argparse
+import logging
+import sys
+import time
+from collections import namedtuple
+
+import config
+from db_pool import get_connection
+from status_tr import BACKFILL_VINCULOS_TR, STATUS_TR_REGRA_DDL, SEED_STATUS_TR_REGRA
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = 'js_system_migrations'
+LOCK_TIMEOUT = 60  # s esperando outro processo terminar de migrar
+
+
+class Indice:
+    """CREATE INDEX, pulado se a tabela já tem um índice começando pelas mesmas colunas."""
+
+    def __init__(self, tabela, nome, *colunas):
+        self.tabela = tabela
+        self.nome = nome
+        self.colunas = colunas
+
+    def sql(self):
+        colunas = ', '.join(f"`{c}`" for c in self.colunas)
+        return f"CREATE INDEX `{self.nome}` ON `{self.tabela}` ({colunas})"
+
+    def existe(self, cursor):
+        cursor.execute("""
+            SELECT INDEX_NAME AS nome, COLUMN_NAME AS coluna
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+            ORDER BY INDEX_NAME, SEQ_IN_INDEX
+        """, (self.tabela,))
+        indices = {}
+        for row in cursor.fetchall():
+            indices.setdefault(row['nome'], []).append(row['coluna'])
+        # Ex.: o índice criado junto com uma FOREIGN KEY já atende a mesma consulta
+        return self.nome in indices or any(
+            tuple(colunas[:len(self.colunas)]) == self.colunas for colunas in indices.values())
+
+    def __str__(self):
+        return f"índice {self.nome} em {self.tabela} ({', '.join(self.colunas)})"
+
+
+class Coluna:
+    """ALTER TABLE ... ADD COLUMN, pulado se a coluna já existe."""
+
+    def __init__(self, tabela, nome, definicao):
+        self.tabela = tabela
+        self.nome = nome
+        self.definicao = definicao
+
+    def sql(self):
+        return f"ALTER TABLE `{self.tabela}` ADD COLUMN `{self.nome}` {self.definicao}"
+
+    def existe(self, cursor):
+        cursor.execute("""
+            SELECT 1 FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """, (self.tabela, self.nome))
+        return cursor.fetchone() is not None
+
+    def __str__(self):
+        return f"coluna {self.tabela}.{self.nome}"
+
+
+class RemoverColuna(Coluna):
+    """ALTER TABLE ... DROP COLUMN (os índices só dela saem junto), pulado se a coluna não existe."""
+
+    def sql(self):
+        return f"ALTER TABLE `{self.tabela}` DROP COLUMN `{self.nome}`"
+
+    def existe(self, cursor):
+        return not super().existe(cursor)
+
+    def __str__(self):
+        return f"remoção da coluna {self.tabela}.{self.nome}"
+
+
+class Tabela:
+    """CREATE TABLE, pulado se a tabela já existe."""
+
+    def __init__(self, nome, definicao):
+        self.nome = nome
+        self.definicao = definicao
+
+    def sql(self):
+        return f"CREATE TABLE `{self.nome}` ({self.definicao})"
+
+    def existe(self, cursor):
+        cursor.execute("""
+            SELECT 1 FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (self.nome,))
+        return cursor.fetchone() is not None
+
+    def __str__(self):
+        return f"tabela {self.nome}"
+
+
+class Comando:
+    """Comando de dados sempre executado; o próprio SQL deve ser idempotente."""
+
+    def __init__(self, descricao, sql):
+        self.descricao = descricao
+        self._sql = sql
+
+    def sql(self):
+        return self._sql.strip()
+
+    def existe(self, cursor):
+        return False
+
+    def __str__(self):
+        return self.descricao
+
+
+Migration = namedtuple('Migration', 'versao descricao operacoes')
+
+ATUALIZADO_EM = "TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)"
+
+MIGRATIONS = [
+    Migration(1, "Índices das junções e filtros mais usados", [
+        Indice('cliente_item', 'idx_cliente_item_idpedido', 'idpedido'),
+        Indice('cliente_item', 'idx_cliente_item_item_raiz', 'item_raiz_id'),
+        Indice('cliente_item', 'idx_cliente_item_composicao', 'id_composicao'),
+        # (pai, filho): composição de um item e checagem de vínculo duplicado
+        Indice('item_composicao', 'idx_item_composicao_pai_filho', 'id_item_pai', 'id_item_filho'),
+        Indice('item_composicao', 'idx_item_composicao_filho', 'id_item_filho'),
+        Indice('pedido', 'idx_pedido_idcliente', 'idcliente'),
+        # Cobre o SUM(quantidade) por produto sem ler a linha
+        Indice('estoque', 'idx_estoque_produto_quantidade', 'id_produto', 'quantidade'),
+        # Listas de chapas/retalhos/unitários/serras, já na ordem da tela
+        Indice('materiais', 'idx_materiais_tipo_descricao', 'tipo_material', 'descricao_material'),
+    ]),
+    # Criava pedido.ano_insercao e idx_pedido_ano_insercao, que nenhuma consulta usa (o filtro
+    # por ano da tela de Obras é feito em memória). Vazia para bancos novos; a 7 remove dos demais.
+    Migration(2, "Coluna gerada pedido.ano_insercao para filtrar por ano com índice", []),
+    Migration(3, "Colunas atualizado_em para a sincronização incremental da tela de Obras", [
+        Coluna('pedido', 'atualizado_em',
+               "TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+        Indice('pedido', 'idx_pedido_atualizado_em', 'atualizado_em'),
+        Coluna('cliente_item', 'atualizado_em',
+               "TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+        Indice('cliente_item', 'idx_cliente_item_atualizado_em', 'atualizado_em'),
+    ]),
+    Migration(4, "Tabela pedidos_tr_vinculo (TR x cliente_item) no lugar de pedidos_tr.vinculos_item", [
+        Tabela('pedidos_tr_vinculo', """
+            idpedidos_tr INT NOT NULL,
+            id_item INT NOT NULL,
+            PRIMARY KEY (idpedidos_tr, id_item),
+            KEY idx_pedidos_tr_vinculo_item (id_item)
+        """),
+        Comando("cópia dos vínculos de pedidos_tr.vinculos_item", BACKFILL_VINCULOS_TR),
+    ]),
+    Migration(5, "Tabela status_tr_regra com as prioridades do status automático das TRs", [
+        Tabela('status_tr_regra', STATUS_TR_REGRA_DDL),
+        Comando("regras de status_tr.REGRAS_STATUS_TR", SEED_STATUS_TR_REGRA),
+    ]),
+    Migration(6, "Colunas atualizado_em (microssegundos) para o ETag das APIs (http_cache.py)", [
+        # Mesma resolução nas colunas da migração 3: duas gravações no mesmo segundo mudam o ETag
+        Comando("pedido.atualizado_em em microssegundos",
+                f"ALTER TABLE `pedido` MODIFY `atualizado_em` {ATUALIZADO_EM}"),
+        Comando("cliente_item.atualizado_em em microssegundos",
+                f"ALTER TABLE `cliente_item` MODIFY `atualizado_em` {ATUALIZADO_EM}"),
+        Coluna('add_cliente', 'atualizado_em', ATUALIZADO_EM),
+        Indice('add_cliente', 'idx_add_cliente_atualizado_em', 'atualizado_em'),
+        Coluna('itens', 'atualizado_em', ATUALIZADO_EM),
+        Indice('itens', 'idx_itens_atualizado_em', 'atualizado_em'),
+        Coluna('item_composicao', 'atualizado_em', ATUALIZADO_EM),
+        Indice('item_composicao', 'idx_item_composicao_atualizado_em', 'atualizado_em'),
+        Coluna('pedidos_tr', 'atualizado_em', ATUALIZADO_EM),
+        Indice('pedidos_tr', 'idx_pedidos_tr_atualizado_em', 'atualizado_em'),
+    ]),
+    Migration(7, "Remove pedido.ano_insercao e seu índice (migração 2), sem uso nas consultas", [
+        RemoverColuna('pedido', 'ano_insercao', None),
+    ]),
+]
+
+
+def _criar_tabela_de_controle(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            versao INT NOT NULL PRIMARY KEY,
+            descricao VARCHAR(255) NOT NULL,
+            aplicada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            duracao_ms INT NOT NULL DEFAULT 0
+        )
+    """)
+
+
+def applied_versions(cursor):
+    """Versões já registradas em `schema_migrations`."""
+    _criar_tabela_de_controle(cursor)
+    cursor.execute("SELECT versao FROM schema_migrations")
+    return {row['versao'] for row in cursor.fetchall()}
+
+
+def pending(cursor, ate=None):
+    """Migrações ainda não aplicadas (até a versão `ate`, se informada)."""
+    aplicadas = applied_versions(cursor)
+    return [m for m in MIGRATIONS
+            if m.versao not in aplicadas and (ate is None or m.versao <= ate)]
+
+
+def _aplicar(cursor, migracao):
+    inicio = time.perf_counter()
+    for operacao in migracao.operacoes:
+        if operacao.existe(cursor):
+            logger.info("Migração %s: %s já existe", migracao.versao, operacao)
+            continue
+        logger.info("Migração %s: aplicando %s", migracao.versao, operacao)
+        cursor.execute(operacao.sql())
+    duracao_ms = int((time.perf_counter() - inicio) * 1000)
+    cursor.execute("INSERT INTO schema_migrations (versao, descricao, duracao_ms) VALUES (%s, %s, %s)",
+                   (migracao.versao, migracao.descricao, duracao_ms))
+    return duracao_ms
+
+
+def upgrade(connection=None, ate=None):
+    """
+    Aplica as migrações pendentes e retorna a lista de versões aplicadas.
+    Sem `connection`, usa uma conexão do `db_pool` (devolvida ao final).
+    """
+    propria = connection is None
+    if propria:
+        connection = get_connection()
+    aplicadas = []
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK(%s, %s) AS ok", (LOCK_NAME, LOCK_TIMEOUT))
+            if not cursor.fetchone()['ok']:
+                raise RuntimeError("Outro processo está aplicando as migrações; tente novamente.")
+            try:
+                for migracao in pending(cursor, ate):
+                    duracao_ms = _aplicar(cursor, migracao)
+                    connection.commit()
+                    aplicadas.append(migracao.versao)
+                    logger.info("Migração %s aplicada em %d ms: %s",
+                                migracao.versao, duracao_ms, migracao.descricao)
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+                cursor.fetchall()
+    finally:
+        if propria:
+            connection.close()
+    return aplicadas
+
+
+def status(connection=None):
+    """Lista (versão, descrição, aplicada) de todas as migrações conhecidas."""
+    propria = connection is None
+    if propria:
+        connection = get_connection()
+    try:
+        with connection.cursor() as cursor:
+            aplicadas = applied_versions(cursor)
+        connection.commit()
+    finally:
+        if propria:
+            connection.close()
+    return [(m.versao, m.descricao, m.versao in aplicadas) for m in MIGRATIONS]
+
+
+def pending_sql(connection=None, ate=None):
+    """DDL das operações pendentes que ainda não existem no banco."""
+    propria = connection is None
+    if propria:
+        connection = get_connection()
+    linhas = []
+    try:
+        with connection.cursor() as cursor:
+            for migracao in pending(cursor, ate):
+                linhas.append(f"-- {migracao.versao}: {migracao.descricao}")
+                linhas.extend(op.sql() + ';' for op in migracao.operacoes if not op.existe(cursor))
+                linhas.append("INSERT INTO schema_migrations (versao, descricao) VALUES "
+                              f"({migracao.versao}, '{migracao.descricao}');")
+        connection.commit()
+    finally:
+        if propria:
+            connection.close()
+    return linhas
+
+
+def upgrade_on_startup(connection_factory=None):
+    """Aplica as pendentes ao subir o app se `config.DB_AUTO_MIGRATE` (falhas só vão para o log)."""
+    if not config.DB_AUTO_MIGRATE:
+        return []
+    try:
+        if connection_factory is None:
+            return upgrade()
+        with connection_factory() as connection:
+            return upgrade(connection)
+    except Exception as e:
+        logger.error("Falha ao aplicar as migrações na inicialização: %s", e)
+        return []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrações do esquema do banco.")
+    parser.add_argument('comando', choices=['status', 'upgrade', 'sql'], nargs='?', default='status')
+    parser.add_argument('--ate', type=int, help="aplica só até esta versão")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.comando == 'upgrade':
+        aplicadas = upgrade(ate=args.ate)
+        print(f"Migrações aplicadas: {', '.join(map(str, aplicadas))}" if aplicadas
+              else "Nenhuma migração pendente.")
+    elif args.comando == 'sql':
+        print('\n'.join(pending_sql(ate=args.ate)) or "-- Nenhuma migração pendente.")
+    else:
+        for versao, descricao, aplicada in status():
+            print(f"{versao:>4}  {'aplicada' if aplicada else 'PENDENTE':<9} {descricao}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
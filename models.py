@@ -1,10 +1,18 @@
 # models.py
+import os
+import time
 import hashlib
+import threading
 from datetime import datetime, timezone
+import pymysql
 from sqlalchemy import create_engine, Column, Integer, String, Enum, DateTime, TIMESTAMP, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, scoped_session
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+import config
 from config import DB_URL
+from request_metrics import InstrumentedCursor, instrument_engine
 
 Base = declarative_base()
 
@@ -39,16 +47,115 @@ class RememberToken(Base):
 
 # --- Centralização da Configuração do Banco de Dados ---
 
+class MetricsQueuePool(QueuePool):
+    """QueuePool que mede quanto tempo cada checkout esperou por uma conexão."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.metrics = {
+            'checkouts': 0,
+            'connects': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    def _create_connection(self):
+        with self._metrics_lock:
+            self.metrics['connects'] += 1
+        return super()._create_connection()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._metrics_lock:
+                self.metrics['timeouts'] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._metrics_lock:
+                self.metrics['checkouts'] += 1
+                self.metrics['wait_time_total'] += elapsed
+                self.metrics['wait_time_max'] = max(self.metrics['wait_time_max'], elapsed)
+
+
 _engine = None
 
 def get_engine():
-    """Retorna uma única instância do engine SQLAlchemy."""
+    """Retorna uma única instância do engine SQLAlchemy (compartilhada por app.py e web_app.py)."""
     global _engine
     if _engine is None:
-        _engine = create_engine(DB_URL)
+        _engine = create_engine(
+            DB_URL,
+            poolclass=MetricsQueuePool,
+            pool_size=config.DB_ENGINE_POOL_SIZE,
+            max_overflow=config.DB_ENGINE_MAX_OVERFLOW,
+            pool_timeout=config.DB_ENGINE_POOL_TIMEOUT,
+            pool_recycle=config.DB_ENGINE_POOL_RECYCLE,
+            pool_pre_ping=config.DB_ENGINE_POOL_PRE_PING,
+        )
+        # Tempo/consultas/linhas de cada requisição (Server-Timing, /metrics/requests)
+        instrument_engine(_engine)
     return _engine
 
 def get_session():
     """Retorna uma nova sessão do banco de dados."""
     engine = get_engine()
-    return scoped_session(sessionmaker(bind=engine))
\ No newline at end of file
+    return scoped_session(sessionmaker(bind=engine))
+
+
+class RawConnection:
+    """
+    Conexão pymysql emprestada do pool do engine.
+
+    Os cursores são `DictCursor` por padrão (como as rotas do web_app esperam),
+    medidos por `request_metrics.InstrumentedCursor`, e `close()` / saída do
+    `with` devolvem a conexão ao pool do SQLAlchemy.
+    """
+
+    def __init__(self, fairy):
+        self._fairy = fairy
+
+    def cursor(self, cursorclass=pymysql.cursors.DictCursor):
+        return InstrumentedCursor(self._fairy.cursor(cursorclass))
+
+    def close(self):
+        if self._fairy is not None:
+            fairy, self._fairy = self._fairy, None
+            fairy.close()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._fairy, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def get_raw_connection():
+    """Empresta uma conexão DBAPI (pymysql) do engine compartilhado."""
+    return RawConnection(get_engine().raw_connection())
+
+def get_engine_metrics():
+    """Retorna o estado do pool do engine deste processo (worker do gunicorn)."""
+    pool = get_engine().pool
+    data = {
+        'pid': os.getpid(),
+        'pool_size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': pool.overflow(),
+        'max_overflow': config.DB_ENGINE_MAX_OVERFLOW,
+        'status': pool.status(),
+    }
+    metrics = getattr(pool, 'metrics', None)
+    if metrics is not None:
+        data.update(metrics)
+        data['wait_time_avg'] = (metrics['wait_time_total'] / metrics['checkouts']) if metrics['checkouts'] else 0.0
+    return data
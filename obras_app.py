@@ -1,15 +1,23 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, font
 import customtkinter as ctk
-import pymysql
 from tkcalendar import DateEntry
-from config import DB_HOST, DB_USER, DB_PASS, DB_NAME
+from db_pool import get_connection
+from text_truncate import truncar_texto
+from config import OBRAS_LAZY_ITENS
 import os
 import tempfile
 import platform
 import json
+import time
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
 from etiqueta_printer import EtiquetaPrinter # <-- ADICIONADO
+from obras_cache import ObrasCache, pedido_display
+from tk_worker import CanalDeCarga, executar_em_segundo_plano
+from status_tr import atualizar_status_tr_dos_itens
+from ref_cache import invalidate
 
 # Import para geração de PDF
 try:
@@ -38,6 +46,111 @@ if platform.system() == "Windows":
     except ImportError:
         messagebox.showwarning("Dependência Opcional Faltando", "A biblioteca 'pywin32' não está instalada.\nExecute: pip install pywin32\nA seleção de impressora não funcionará diretamente.")
 
+RENDER_LOTE = 200 # Nós inseridos na árvore de itens por ciclo do after()
+MARCADOR_FILHOS = "|__pendente" # Sufixo do filho provisório de nós ainda não expandidos
+COLUNAS_OBS = ((7, "Obs Programação"), (8, "Obs Produção"), (9, "Obs Qualidade")) # índice em values -> coluna
+
+
+def _formatar_data(valor):
+    return valor.strftime('%d/%m/%y %H:%M') if valor else 'N/A'
+
+
+def montar_arvore_itens(pedido_id, itens):
+    """
+    Monta os nós da árvore de itens de um pedido sem tocar no Tk (pode rodar em thread).
+
+    Retorna (nos, filhos): nos[iid] = (texto completo, valores, tags, é_folha) e
+    filhos[iid_pai] = lista de iids na ordem de exibição ('' é a raiz).
+    As observações ficam com o texto completo; o truncamento é feito na inserção.
+    """
+    nos = {}
+    filhos = {'': []}
+    parent_map = {}
+
+    def make_iid(path_part, id_vinculo=None):
+        safe_path = path_part.replace('>', '-').replace(' ', '_').replace('/', '_')
+        return f"p{pedido_id}|{safe_path}" + (f"|{id_vinculo}" if id_vinculo else "")
+
+    for item in sorted(itens, key=lambda x: x.get('caminho', '') or ''):
+        caminho = (item.get('caminho') or '').strip()
+
+        # fallback: monte a partir das descrições se caminho estiver vazio
+        if not caminho:
+            if item.get('nome_equipamento'):
+                caminho = item.get('nome_equipamento')
+                if item.get('conjunto'):
+                    caminho = f"{caminho} > {item.get('conjunto')}"
+            elif item.get('conjunto'):
+                caminho = item.get('conjunto')
+
+        path_parts = [p.strip() for p in caminho.split('>') if p.strip()] if caminho else []
+        if not path_parts:
+            path_parts = [item.get('conjunto') or item.get('nome_equipamento') or "Item"]
+
+        equipamento_descr = item.get('nome_equipamento') or path_parts[0]
+        conjunto_descr = item.get('conjunto') or path_parts[-1]
+        equipamento_code = str(item.get('codigo_equipamento') or '')
+        conjunto_code = str(item.get('codigo_conjunto') or '')
+
+        for level in range(1, len(path_parts) + 1):
+            sub_path = ' > '.join(path_parts[:level])
+            if sub_path in parent_map:
+                continue
+
+            parent_sub_path = ' > '.join(path_parts[:level - 1]) if level > 1 else ""
+            parent_iid = parent_map.get(parent_sub_path, "")
+
+            is_leaf = (level == len(path_parts))
+            iid = make_iid(sub_path, item.get('id_vinculo') if is_leaf else None)
+            if iid in nos:
+                iid = f"{iid}__{len(parent_map)}" # Evita IIDs duplicados
+
+            if is_leaf:
+                # Datas só são formatadas para as folhas; os nós pais não as exibem
+                data_prog_fim = item.get('data_prog_fim')
+                if data_prog_fim and hasattr(data_prog_fim, 'year') and data_prog_fim.year > 1:
+                    programacao_display = data_prog_fim.strftime('%d/%m/%y %H:%M')
+                elif item.get('data_programacao'):
+                    programacao_display = 'Em Programação'
+                else:
+                    programacao_display = 'N/A'
+
+                quantidade = item.get('quantidade_prod', 'x')
+                full_text = f"({quantidade}x) {conjunto_code} - {conjunto_descr}" if conjunto_code else f"({quantidade}x) {conjunto_descr}"
+                valores = (
+                    item.get('quantidade_prod', ''), # Qtd
+                    item.get('lote', ''),
+                    _formatar_data(item.get('data_engenharia')),
+                    programacao_display,
+                    _formatar_data(item.get('data_pcp')),
+                    _formatar_data(item.get('data_producao')),
+                    _formatar_data(item.get('data_qualidade')),
+                    item.get('obs_programacao') or '',
+                    item.get('obs_producao') or '',
+                    item.get('obs_detalhes') or '',
+                    "✏️  📷"
+                )
+                tags = ('preencher-datas',)
+                if item.get('data_qualidade'): tags = ('linha-qualidade',)
+                elif item.get('data_producao'): tags = ('linha-producao',)
+                elif item.get('data_pcp'): tags = ('linha-pcp',)
+                elif item.get('data_programacao'): tags = ('linha-programacao',)
+                elif item.get('data_engenharia'): tags = ('linha-engenharia',)
+            else:
+                if level == 1:
+                    full_text = f"{equipamento_code} - {equipamento_descr}" if equipamento_code else f"{equipamento_descr}"
+                else:
+                    full_text = path_parts[level - 1]
+                # Nós pais têm os botões de impressão e preenchimento de datas na coluna "Ações"
+                valores = ('', '', '', '', '', '', '', '', '', '', "🖨️  📅")
+                tags = ('equipamento-titulo', 'imprimir-etiqueta', 'preencher-datas')
+
+            nos[iid] = (full_text, valores, tags, is_leaf)
+            filhos.setdefault(parent_iid, []).append(iid)
+            parent_map[sub_path] = iid
+
+    return nos, filhos
+
 
 class ObrasApp:
     def __init__(self, parent, user):
@@ -51,11 +164,24 @@ class ObrasApp:
         self.obras_data = []
         self.all_pedidos_for_modal = [] # Lista completa de pedidos para o modal
         self.produtos_por_pedido = {}
+        self.cache = ObrasCache(lazy_itens=OBRAS_LAZY_ITENS) # Pedidos/itens em memória, sincronizados por delta
+        self._prefetch_em_andamento = set() # Pedidos cujos itens estão sendo buscados em segundo plano
+        self._carga_obras = CanalDeCarga(self.main_frame) # Sincronização do cache (só a mais recente vale)
+        self._carga_itens = CanalDeCarga(self.main_frame) # Itens do pedido selecionado
+        self._ids_filtrados = [] # idpedido na ordem exibida
+        self._posicao_pedido = {} # idpedido -> posição em _ids_filtrados
         self.anos_disponiveis = []
         self.permissoes_edicao = [] # Para simular as permissões do PHP
         self.etiqueta_config = self.carregar_config_etiqueta()
         self.create_widgets()
         self.full_text_map = {} # Armazena o texto completo dos itens da árvore
+        self.displayed_text_map = {} # Texto (truncado) exibido em cada nó criado na árvore
+        self._nos_arvore = {} # iid -> (texto, valores, tags, folha) do pedido exibido
+        self._filhos_arvore = {} # iid pai -> iids filhos
+        self._filhos_pendentes = set() # Nós cujos filhos ainda não foram criados na árvore
+        self._render_fila = deque()
+        self._render_geracao = 0 # Invalida renderizações de pedidos selecionados antes
+        self._resize_job = None
         self.main_frame.bind("<Configure>", self.on_tree_resize)
         self.carregar_obras()
         
@@ -113,6 +239,7 @@ class ObrasApp:
         search_entry.bind('<KeyRelease>', self.filtrar_obras)
         
         ctk.CTkButton(filter_frame, text="Limpar Filtros", command=self.limpar_filtros).pack(side=tk.LEFT)
+        ctk.CTkButton(filter_frame, text="Atualizar", command=self.atualizar_obras).pack(side=tk.LEFT, padx=(5, 0))
         
         # Frame para as tabelas (pedidos e itens)
         tables_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
@@ -210,154 +337,125 @@ class ObrasApp:
         style.map("Treeview.Heading", background=[('active', '#333333')])
         style.map("Treeview", background=[('selected', '#003366')])
 
+        # Estilos: negrito para o pai e cores para estados
+        self.itens_tree.tag_configure('equipamento-titulo', font=('TkDefaultFont', 10, 'bold'))
+        self.itens_tree.tag_configure('linha-qualidade', background='#d4edda', foreground='black') # Verde
+        self.itens_tree.tag_configure('linha-producao', background='#FFDDC1', foreground='black')  # Laranja
+        self.itens_tree.tag_configure('linha-pcp', background='#FFF3CD', foreground='black')      # Amarelo
+        self.itens_tree.tag_configure('linha-programacao', background='#CCE5FF', foreground='black')# Azul
+        self.itens_tree.tag_configure('linha-engenharia', background='#F5C6CB', foreground='black') # Vermelho
+
+        # Tempo de renderização do último pedido exibido
+        self.render_info_var = tk.StringVar()
+        ctk.CTkLabel(tables_frame, textvariable=self.render_info_var, font=('Arial', 9)).pack(side=tk.BOTTOM, anchor=tk.E, before=self.itens_tree)
+
+        self.itens_tree.bind('<<TreeviewOpen>>', self.on_tree_open)
         self.itens_tree.bind('<Double-1>', self.abrir_modal_edicao_item)
         self.itens_tree.bind('<Button-1>', self.on_tree_click) # Adiciona o bind para o clique do mouse
 
-    def carregar_obras(self, ano=None, termo_busca=None):
-        connection = None
-        try:
-            connection = pymysql.connect(
-                host=DB_HOST,
-                user=DB_USER,
-                password=DB_PASS,
-                database=DB_NAME,
-                charset='utf8mb4',
-                cursorclass=pymysql.cursors.DictCursor
-            )
+    def carregar_obras(self, ano=None, termo_busca=None, completo=False):
+        """
+        Sincroniza o cache com o banco (só as linhas alteradas) e reaplica os filtros.
+        As consultas rodam no executor compartilhado; o cache é atualizado na thread da interface.
+        """
+        # Define as permissões de edição com base no cargo do usuário
+        if self.user['role'] in ('admin', 'editor'):
+            self.permissoes_edicao = ['data_pcp', 'data_producao', 'data_qualidade', 'obs_producao']
+        else:
+            self.permissoes_edicao = []
+
+        estado = self.cache.estado_sync()
+
+        def coletar():
+            with self._cursor() as cursor:
+                return self.cache.coletar(cursor, estado, completo=completo)
+
+        self._carga_obras.executar(
+            coletar,
+            ao_concluir=lambda coleta: self._aplicar_sync(coleta, ano, termo_busca),
+            ao_falhar=lambda e: messagebox.showerror("Erro", f"Erro ao carregar obras: {str(e)}"))
+
+    def _aplicar_sync(self, coleta, ano, termo_busca):
+        self.cache.aplicar(coleta)
+
+        # Anos disponíveis e lista completa para o modal vêm do cache, sem novas consultas
+        self.anos_disponiveis = self.cache.anos()
+        self.ano_combo.configure(values=["Todos os Anos"] + self.anos_disponiveis)
+        if ano not in self.anos_disponiveis:
+            ano = "Todos os Anos"
+        self.ano_combo.set(ano)
+        self.all_pedidos_for_modal = [pedido_display(p) for p in self.cache.todos_os_pedidos()]
+        self.produtos_por_pedido = self.cache.itens_por_pedido
+
+        self.aplicar_filtros(ano, termo_busca)
+
+    def aplicar_filtros(self, ano=None, termo_busca=None):
+        """Filtra os pedidos em memória e atualiza a seleção."""
+        # Salva a seleção atual para tentar restaurá-la depois
+        pedido_selecionado_anteriormente = self.pedido_select_var.get()
+
+        self.obras_data = self.cache.filtrar(ano, termo_busca)
+        self.pedido_display_list = [pedido_display(pedido) for pedido in self.obras_data]
+        self._ids_filtrados = [pedido['idpedido'] for pedido in self.obras_data]
+        self._posicao_pedido = {idpedido: pos for pos, idpedido in enumerate(self._ids_filtrados)}
+
+        # Tenta restaurar a seleção anterior ou seleciona o primeiro item
+        if pedido_selecionado_anteriormente in self.pedido_display_list:
+            self.pedido_select_var.set(pedido_selecionado_anteriormente)
+        elif self.pedido_display_list:
+            self.pedido_select_var.set(self.pedido_display_list[0])
+        else:
+            self.pedido_select_var.set('')
 
-            # Define as permissões de edição com base no cargo do usuário
-            if self.user['role'] in ('admin', 'editor'):
-                self.permissoes_edicao = ['data_pcp', 'data_producao', 'data_qualidade', 'obs_producao']
-            else:
-                self.permissoes_edicao = []
-            
-            with connection.cursor() as cursor:
-                # Carregar anos disponíveis para o filtro
-                cursor.execute("SELECT DISTINCT YEAR(data_insercao) AS ano FROM pedido WHERE data_insercao IS NOT NULL ORDER BY ano DESC")
-                self.anos_disponiveis = [str(row['ano']) for row in cursor.fetchall()] if cursor.rowcount > 0 else []
-                self.ano_combo.configure(values=["Todos os Anos"] + self.anos_disponiveis)
-                self.ano_combo.set("Todos os Anos")
-
-                # Carrega a lista completa de pedidos para o modal de seleção, uma única vez.
-                if not self.all_pedidos_for_modal:
-                    cursor.execute("""
-                        SELECT p.numero_pedido, ac.cliente, ac.endereco 
-                        FROM pedido p JOIN add_cliente ac ON p.idcliente = ac.idcliente 
-                        ORDER BY p.idpedido DESC
-                    """)
-                    self.all_pedidos_for_modal = [f"{p['numero_pedido']} - {p['cliente']} ({p['endereco']})" for p in cursor.fetchall()]
-
-                # Salva a seleção atual para tentar restaurá-la depois
-                pedido_selecionado_anteriormente = self.pedido_select_var.get()
-                
-                # Consulta para pedidos
-                pedidos_sql = """
-                    SELECT 
-                        p.idpedido, p.idcliente, p.numero_pedido, p.data_entrega, p.data_insercao,
-                        ac.cliente, ac.endereco
-                    FROM pedido p
-                    JOIN add_cliente ac ON p.idcliente = ac.idcliente
-                """
-                conditions = []
-                params = []
-
-                if ano and ano != "Todos os Anos":
-                    conditions.append("YEAR(p.data_insercao) = %s")
-                    params.append(int(ano))
-                
-                if termo_busca:
-                    conditions.append("(p.numero_pedido LIKE %s OR ac.cliente LIKE %s OR ac.endereco LIKE %s)")
-                    params.extend([f"%{termo_busca}%", f"%{termo_busca}%", f"%{termo_busca}%"])
+        self.on_pedido_select() # Carrega os itens do pedido selecionado (ou limpa se nenhum)
 
-                if conditions:
-                    pedidos_sql += " WHERE " + " AND ".join(conditions)
-                
-                pedidos_sql += " ORDER BY p.idpedido DESC"
-                
-                cursor.execute(pedidos_sql, params)
-                self.obras_data = cursor.fetchall()
-                
-                # Preencher o combobox de pedidos
-                self.pedido_display_list = []
-                for pedido in self.obras_data:
-                    display_text = f"{pedido['numero_pedido']} - {pedido['cliente']} ({pedido['endereco']})"
-                    self.pedido_display_list.append(display_text)
-
-                # Tenta restaurar a seleção anterior ou seleciona o primeiro item
-                if pedido_selecionado_anteriormente in self.pedido_display_list:
-                    self.pedido_select_var.set(pedido_selecionado_anteriormente)
-                elif self.pedido_display_list:
-                    self.pedido_select_var.set(self.pedido_display_list[0])
-                else:
-                    self.pedido_select_var.set('')
-                
-                self.on_pedido_select() # Carrega os itens do pedido selecionado (ou limpa se nenhum)
+    @contextmanager
+    def _cursor(self):
+        """Cursor de uma conexão do pool, devolvida ao final do bloco."""
+        with get_connection() as connection, connection.cursor() as cursor:
+            yield cursor
 
-                # Carregar todos os itens para todos os pedidos filtrados
-                if self.obras_data:
-                    pedido_ids = [p['idpedido'] for p in self.obras_data]
-                    
-                    itens_sql = f"""
-                        SELECT 
-                            ci.id_item AS id_vinculo,
-                            ci.idpedido,
-                            ci.quantidade_prod,
-                            ci.lote,
-                            ci.data_engenharia,
-                            ci.data_programacao,
-                            ci.data_pcp,
-                            ci.data_producao,
-                            ci.data_qualidade,
-                            ci.caminho,
-                            ci.tag,
-                            ci.data_prog_fim,
-                            ci.obs_detalhes,
-                            ci.obs_programacao,
-                            ci.obs_producao,
-
-                            -- Equipamento (item raiz)
-                            pi.id AS equipamento_id,
-                            pi.codigo AS codigo_equipamento,
-                            pi.descricao AS nome_equipamento,
-
-                            -- Conjunto (item filho)
-                            si.id AS conjunto_id,
-                            si.codigo AS codigo_conjunto,
-                            si.descricao AS conjunto
-
-                        FROM cliente_item ci
-                        JOIN item_composicao ic ON ci.id_composicao = ic.id
-                        JOIN itens pi ON ci.item_raiz_id = pi.id        -- Equipamento pai
-                        JOIN itens si ON ic.id_item_filho = si.id       -- Conjunto (filho)
-                        WHERE ci.idpedido IN ({','.join(['%s']*len(pedido_ids))})
-                        ORDER BY ci.idpedido, pi.descricao, ci.data_engenharia
-                    """
-                    cursor.execute(itens_sql, pedido_ids)
-                    itens_raw = cursor.fetchall()
-                    
-                    self.produtos_por_pedido = {}
-                    for item in itens_raw:
-                        self.produtos_por_pedido.setdefault(item['idpedido'], []).append(item)
-                else:
-                    self.produtos_por_pedido = {}
-                    # Limpar a treeview de itens se nenhum pedido for encontrado
-                    for item in self.itens_tree.get_children():
-                        self.itens_tree.delete(item)
-            
-            # Garante que os dados do primeiro pedido sejam exibidos na carga inicial
-            self.on_pedido_select()
+    def _prefetch_vizinhos(self, pedido_id, alcance=2):
+        """Busca em segundo plano os itens dos pedidos vizinhos na lista exibida."""
+        if not self.cache.lazy_itens:
+            return
+        ids = self._ids_filtrados
+        pos = self._posicao_pedido.get(pedido_id)
+        if pos is None:
+            return
+        vizinhos = [ids[i] for i in range(max(0, pos - alcance), min(len(ids), pos + alcance + 1))
+                    if ids[i] != pedido_id]
+        pendentes = [i for i in vizinhos if not self.cache.tem_itens(i) and i not in self._prefetch_em_andamento]
+        if not pendentes:
+            return
+        self._prefetch_em_andamento.update(pendentes)
 
+        def buscar():
+            resultados = {}
+            try:
+                with self._cursor() as cursor:
+                    for idpedido in pendentes:
+                        resultados[idpedido] = self.cache.buscar_itens(cursor, idpedido)
+            except Exception as e:
+                print(f"Erro no prefetch de itens: {e}")
+            return resultados
 
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao carregar obras: {str(e)}")
-        finally:
-            if connection:
-                connection.close()
+        def armazenar(resultados):
+            for idpedido in pendentes:
+                self._prefetch_em_andamento.discard(idpedido)
+                if idpedido in resultados:
+                    self.cache.armazenar_itens(idpedido, resultados[idpedido])
+
+        executar_em_segundo_plano(self.main_frame, buscar, ao_concluir=armazenar)
 
     def filtrar_obras(self, event=None):
         ano = self.ano_var.get()
         termo = self.search_var.get().strip()
-        self.carregar_obras(ano=ano, termo_busca=termo)
+        self.aplicar_filtros(ano=ano, termo_busca=termo)
+
+    def atualizar_obras(self):
+        """Busca no banco as alterações desde a última carga mantendo os filtros atuais."""
+        self.carregar_obras(self.ano_var.get(), self.search_var.get().strip())
 
     def abrir_modal_selecao_pedido(self):
         """Abre uma janela modal para selecionar um pedido de uma lista pesquisável."""
@@ -421,7 +519,7 @@ class ObrasApp:
     def limpar_filtros(self):
         self.ano_var.set("Todos os Anos")
         self.search_var.set("")
-        self.carregar_obras()
+        self.aplicar_filtros()
 
     def on_pedido_select(self, event=None):
         selected_text = self.pedido_select_var.get()
@@ -432,13 +530,8 @@ class ObrasApp:
             self.cliente_header_frame.pack_forget() # Esconde o cabeçalho
             return
 
-        # Encontrar o pedido correspondente nos dados carregados
-        selected_pedido = None
-        for pedido in self.obras_data:
-            display_text = f"{pedido['numero_pedido']} - {pedido['cliente']} ({pedido['endereco']})"
-            if display_text == selected_text:
-                selected_pedido = pedido
-                break
+        # Encontrar o pedido correspondente nos dados carregados (índice texto -> pedido)
+        selected_pedido = self.cache.pedido_por_display(selected_text)
         
         if selected_pedido:
             # Preenche o cabeçalho com os dados do cliente/pedido
@@ -461,142 +554,131 @@ class ObrasApp:
             self.cliente_header_frame.pack_forget()
 
     def exibir_itens_do_pedido(self, pedido_id):
-        # Limpar a treeview de itens
-        for iid in self.itens_tree.get_children():
-            self.itens_tree.delete(iid)
-        self.full_text_map.clear()
-
-        itens_do_pedido = sorted(self.produtos_por_pedido.get(pedido_id, []), key=lambda x: x.get('caminho', '') or '')
+        """
+        Exibe os itens do pedido na árvore.
 
-        parent_map = {}
+        A montagem dos nós (caminhos, datas formatadas) roda no executor compartilhado; a
+        inserção na Treeview é feita em lotes via after() e os filhos de cada nó
+        só são criados quando ele é expandido.
+        """
+        self._render_geracao += 1
+        geracao = self._render_geracao
+        inicio = time.perf_counter()
 
-        # Font para cálculo da largura do texto
+        # Limpar a treeview de itens
+        self.itens_tree.delete(*self.itens_tree.get_children())
+        self.full_text_map.clear()
+        self.displayed_text_map.clear()
+        self._nos_arvore = {}
+        self._filhos_arvore = {}
+        self._filhos_pendentes = set()
+        self.render_info_var.set("Carregando itens...")
+
+        # Itens já em memória são usados direto; senão a thread os busca no banco
+        em_memoria = self.cache.tem_itens(pedido_id)
+        itens = list(self.cache.itens_do_pedido(self._cursor, pedido_id)) if em_memoria else None
+
+        def montar():
+            rows = itens
+            if rows is None:
+                with self._cursor() as cursor:
+                    rows = self.cache.buscar_itens(cursor, pedido_id)
+            return rows, montar_arvore_itens(pedido_id, rows)
+
+        def aplicar(resultado):
+            if geracao != self._render_geracao:
+                return # Outro pedido foi selecionado enquanto a montagem rodava
+            rows, modelo = resultado
+            if not em_memoria:
+                self.cache.armazenar_itens(pedido_id, rows)
+            self._iniciar_render(geracao, modelo, len(rows), inicio)
+
+        def falhar(erro):
+            if geracao == self._render_geracao:
+                self.render_info_var.set("")
+                messagebox.showerror("Erro", f"Erro ao carregar itens do pedido: {str(erro)}")
+
+        # Selecionar outro pedido cancela a montagem anterior
+        self._carga_itens.executar(montar, ao_concluir=aplicar, ao_falhar=falhar)
+        self._prefetch_vizinhos(pedido_id)
+
+    def _iniciar_render(self, geracao, modelo, total_itens, inicio):
+        self._nos_arvore, self._filhos_arvore = modelo
+        self._render_fila = deque(self._filhos_arvore.get('', []))
+        self._render_stats = {'itens': total_itens, 'inicio': inicio, 'primeira_tela': None}
+        self._inserir_lote(geracao)
+
+    def _inserir_lote(self, geracao):
+        """Insere o próximo lote de nós da raiz e agenda o seguinte."""
+        if geracao != self._render_geracao or not self.itens_tree.winfo_exists():
+            return
+        larguras = self._larguras_colunas()
+        fonte = font.nametofont("TkDefaultFont")
+        for _ in range(min(RENDER_LOTE, len(self._render_fila))):
+            self._inserir_no('', self._render_fila.popleft(), larguras, fonte)
+
+        stats = self._render_stats
+        agora = (time.perf_counter() - stats['inicio']) * 1000
+        if stats['primeira_tela'] is None:
+            stats['primeira_tela'] = agora
+        if self._render_fila:
+            self.main_frame.after(1, lambda: self._inserir_lote(geracao))
+            return
+        self.render_info_var.set(
+            f"{stats['itens']} itens · {len(self._nos_arvore)} nós · "
+            f"1ª tela em {stats['primeira_tela']:.0f} ms · total {agora:.0f} ms")
+
+    def _larguras_colunas(self):
+        return {col: self.itens_tree.column(col, 'width') for col in ('#0',) + tuple(c for _, c in COLUNAS_OBS)}
+
+    def _inserir_no(self, parent_iid, iid, larguras, fonte):
+        texto, valores, tags, folha = self._nos_arvore[iid]
+        self.full_text_map[iid] = texto
+        texto_arvore = self._truncate_text(texto, larguras['#0'], fonte, margin=35)
+        if folha:
+            valores = list(valores)
+            for indice, coluna in COLUNAS_OBS:
+                valores[indice] = self._truncate_text(valores[indice], larguras[coluna], fonte)
+        self.itens_tree.insert(parent_iid, "end", iid=iid, text=texto_arvore, values=valores, tags=tags)
+        self.displayed_text_map[iid] = texto_arvore
+        if self._filhos_arvore.get(iid):
+            # Filho provisório só para exibir o indicador de expansão
+            self.itens_tree.insert(iid, "end", iid=f"{iid}{MARCADOR_FILHOS}")
+            self._filhos_pendentes.add(iid)
+
+    def _materializar_filhos(self, iid):
+        """Cria na árvore os filhos diretos de um nó ainda não expandido."""
+        if iid not in self._filhos_pendentes:
+            return
+        self._filhos_pendentes.discard(iid)
+        self.itens_tree.delete(f"{iid}{MARCADOR_FILHOS}")
+        larguras = self._larguras_colunas()
+        fonte = font.nametofont("TkDefaultFont")
+        for filho in self._filhos_arvore.get(iid, []):
+            self._inserir_no(iid, filho, larguras, fonte)
+
+    def on_tree_open(self, event=None):
+        self._materializar_filhos(self.itens_tree.focus())
+
+    def on_tree_resize(self, event=None):
+        """Retrunca os textos da árvore após o redimensionamento (com pequeno atraso para agrupar eventos)."""
+        if self._resize_job is not None:
+            self.main_frame.after_cancel(self._resize_job)
+        self._resize_job = self.main_frame.after(100, self.update_all_tree_text)
+
+    def update_all_tree_text(self):
+        """Atualiza o texto truncado dos nós já criados na árvore."""
+        self._resize_job = None
+        if not self.itens_tree.winfo_exists():
+            return
+        col_width = self.itens_tree.column('#0', 'width')
         default_font = font.nametofont("TkDefaultFont")
-
-        def make_iid(pedido_id, path_part, id_vinculo=None):
-            safe_path = path_part.replace('>', '-').replace(' ', '_').replace('/', '_')
-            return f"p{pedido_id}|{safe_path}" + (f"|{id_vinculo}" if id_vinculo else "")
-
-        for item in itens_do_pedido:
-            caminho = (item.get('caminho') or '').strip()
-
-            # fallback: monte a partir das descrições se caminho estiver vazio
-            if not caminho:
-                if item.get('nome_equipamento'):
-                    caminho = item.get('nome_equipamento')
-                    if item.get('conjunto'):
-                        caminho = f"{caminho} > {item.get('conjunto')}"
-                elif item.get('conjunto'):
-                    caminho = item.get('conjunto')
-
-            path_parts = [p.strip() for p in caminho.split('>') if p.strip()] if caminho else []
-            if not path_parts:
-                path_parts = [item.get('conjunto') or item.get('nome_equipamento') or "Item"]
-
-            # campos descritivos / códigos (vêm do SELECT que sugeri)
-            equipamento_descr = item.get('nome_equipamento') or (path_parts[0] if len(path_parts) >= 1 else '')
-            conjunto_descr = item.get('conjunto') or (path_parts[-1] if len(path_parts) >= 1 else '')
-
-            equipamento_code = str(item.get('codigo_equipamento') or '')
-            conjunto_code = str(item.get('codigo_conjunto') or '')
-
-            for level in range(1, len(path_parts) + 1):
-                sub_path = ' > '.join(path_parts[:level])
-                if sub_path in parent_map:
-                    continue
-
-                parent_sub_path = ' > '.join(path_parts[:level - 1]) if level > 1 else ""
-                parent_iid = parent_map.get(parent_sub_path, "")
-
-                is_leaf = (level == len(path_parts))
-                iid = make_iid(pedido_id, sub_path, item.get('id_vinculo') if is_leaf else None)
-
-                # Formatar datas
-                data_prog_fim = item.get('data_prog_fim')
-                if data_prog_fim and hasattr(data_prog_fim, 'year') and data_prog_fim.year > 1:
-                    programacao_display = data_prog_fim.strftime('%d/%m/%y %H:%M')
-                elif item.get('data_programacao'):
-                    programacao_display = 'Em Programação'
-                else:
-                    programacao_display = 'N/A'
-
-                datas = {
-                    'engenharia': item['data_engenharia'].strftime('%d/%m/%y %H:%M') if item.get('data_engenharia') else 'N/A',
-                    'programacao': programacao_display,
-                    'pcp': item['data_pcp'].strftime('%d/%m/%y %H:%M') if item.get('data_pcp') else 'N/A',
-                    'producao': item['data_producao'].strftime('%d/%m/%y %H:%M') if item.get('data_producao') else 'N/A',
-                    'qualidade': item['data_qualidade'].strftime('%d/%m/%y %H:%M') if item.get('data_qualidade') else 'N/A',
-                }
-
-                if is_leaf:
-                    # Para itens "folha", o texto na árvore será a quantidade e a descrição
-                    full_text = f"({item.get('quantidade_prod', 'x')}x) {conjunto_code} - {conjunto_descr}" if conjunto_code else f"({item.get('quantidade_prod', 'x')}x) {conjunto_descr}"
-                    self.full_text_map[iid] = full_text
-                    texto_arvore = self._truncate_text(full_text, self.itens_tree.column('#0', 'width'), default_font, margin=35)
-
-                    obs_programacao_trunc = self._truncate_text(item.get('obs_programacao', ''), self.itens_tree.column('Obs Programação', 'width'), default_font)
-                    obs_detalhes_trunc = self._truncate_text(item.get('obs_detalhes', ''), self.itens_tree.column('Obs Qualidade', 'width'), default_font)
-                    obs_producao_trunc = self._truncate_text(item.get('obs_producao', ''), self.itens_tree.column('Obs Produção', 'width'), default_font)
-
-                    valores = (
-                        item.get('quantidade_prod', ''), # Qtd
-                        item.get('lote', ''),
-                        datas['engenharia'],
-                        datas['programacao'],
-                        datas['pcp'],
-                        datas['producao'],
-                        datas['qualidade'],
-                        obs_programacao_trunc,
-                        obs_producao_trunc,
-                        obs_detalhes_trunc,
-                        "✏️  📷" # Adicionado ícone de câmera
-                    )
-                else:
-                    # Para nós pais/intermediários, o texto na árvore é o nome da estrutura
-                    current_part_name = path_parts[level - 1]
-                    if level == 1:
-                        full_text = f"{equipamento_code} - {equipamento_descr}" if equipamento_code else f"{equipamento_descr}"
-                        self.full_text_map[iid] = full_text
-                        texto_arvore = self._truncate_text(full_text, self.itens_tree.column('#0', 'width'), default_font, margin=35)
-                    else:
-                        self.full_text_map[iid] = current_part_name
-                        texto_arvore = self._truncate_text(current_part_name, self.itens_tree.column('#0', 'width'), default_font, margin=35)
-
-                    # Nós pais agora têm o botão de impressão na coluna "Ações"
-                    valores = ('', '', '', '', '', '', '', '', '', '', "🖨️  📅")
-
-                # tags
-                tags = ('preencher-datas',) # Adiciona tag para identificar o botão de preencher datas
-
-                if is_leaf:
-                    if item.get('data_qualidade'): tags = ('linha-qualidade',)
-                    elif item.get('data_producao'): tags = ('linha-producao',)
-                    elif item.get('data_pcp'): tags = ('linha-pcp',)
-                    elif item.get('data_programacao'): tags = ('linha-programacao',)
-                    elif item.get('data_engenharia'): tags = ('linha-engenharia',)
-                else:
-                    tags = ('equipamento-titulo', 'imprimir-etiqueta', 'preencher-datas') # Adiciona tag para identificar o botão
-
-                try:
-                    self.itens_tree.insert(parent_iid, "end", iid=iid, text=texto_arvore, values=valores, tags=tags)
-                except tk.TclError:
-                    alt_iid = f"{iid}__{len(parent_map)}" # Evita IIDs duplicados
-                    self.itens_tree.insert(parent_iid, "end", iid=alt_iid, text=texto_arvore, values=valores, tags=tags)
-                    iid = alt_iid
-
-                parent_map[sub_path] = iid
-
-        # Estilos: negrito para o pai e cores para estados
-        try:
-            self.itens_tree.tag_configure('equipamento-titulo', font=('TkDefaultFont', 10, 'bold'))
-        except Exception:
-            pass
-
-        self.itens_tree.tag_configure('linha-qualidade', background='#d4edda', foreground='black') # Verde
-        self.itens_tree.tag_configure('linha-producao', background='#FFDDC1', foreground='black')  # Laranja
-        self.itens_tree.tag_configure('linha-pcp', background='#FFF3CD', foreground='black')      # Amarelo
-        self.itens_tree.tag_configure('linha-programacao', background='#CCE5FF', foreground='black')# Azul
-        self.itens_tree.tag_configure('linha-engenharia', background='#F5C6CB', foreground='black') # Vermelho
+        for iid, full_text in self.full_text_map.items():
+            texto = self._truncate_text(full_text, col_width, default_font, margin=35)
+            # Só chama o Tk para os nós cujo texto exibido mudou
+            if self.displayed_text_map.get(iid) != texto and self.itens_tree.exists(iid):
+                self.itens_tree.item(iid, text=texto)
+                self.displayed_text_map[iid] = texto
 
     def on_tree_click(self, event):
         """Verifica se o clique foi no ícone de impressão."""
@@ -648,19 +730,20 @@ class ObrasApp:
 
         # 1. Obter informações do pedido
         selected_text = self.pedido_select_var.get()
-        pedido_info = next((p for p in self.obras_data if f"{p['numero_pedido']} - {p['cliente']} ({p['endereco']})" == selected_text), None)
+        pedido_info = self.cache.pedido_por_display(selected_text)
         if not pedido_info:
             messagebox.showerror("Erro", "Não foi possível encontrar os dados do pedido selecionado.")
             return
 
         # 2. Encontrar os itens filhos do equipamento clicado
         itens_para_imprimir = []
+        self._materializar_filhos(equipamento_iid)
         for child_iid in self.itens_tree.get_children(equipamento_iid):
             # Apenas processa filhos diretos que são folhas (têm um id_vinculo)
             if 'imprimir-etiqueta' not in self.itens_tree.item(child_iid, 'tags'):
                 try:
                     id_vinculo = int(child_iid.split('|')[-1])
-                    item_data = next((item for item in self.produtos_por_pedido.get(pedido_info['idpedido'], []) if item['id_vinculo'] == id_vinculo), None)
+                    item_data = self.cache.item_por_vinculo(id_vinculo)
                     if item_data:
                         itens_para_imprimir.append(item_data)
                 except (ValueError, IndexError):
@@ -677,18 +760,19 @@ class ObrasApp:
         """Abre um modal de pré-visualização para a etiqueta antes de imprimir."""
         # 1. Obter informações do pedido
         selected_text = self.pedido_select_var.get()
-        pedido_info = next((p for p in self.obras_data if f"{p['numero_pedido']} - {p['cliente']} ({p['endereco']})" == selected_text), None)
+        pedido_info = self.cache.pedido_por_display(selected_text)
         if not pedido_info:
             messagebox.showerror("Erro", "Não foi possível encontrar os dados do pedido selecionado.")
             return
 
         # 2. Encontrar os itens filhos do equipamento clicado
         itens_para_imprimir = []
+        self._materializar_filhos(equipamento_iid)
         for child_iid in self.itens_tree.get_children(equipamento_iid):
             if 'imprimir-etiqueta' not in self.itens_tree.item(child_iid, 'tags'):
                 try:
                     id_vinculo = int(child_iid.split('|')[-1])
-                    item_data = next((item for item in self.produtos_por_pedido.get(pedido_info['idpedido'], []) if item['id_vinculo'] == id_vinculo), None)
+                    item_data = self.cache.item_por_vinculo(id_vinculo)
                     if item_data:
                         itens_para_imprimir.append(item_data)
                 except (ValueError, IndexError):
@@ -971,25 +1055,9 @@ class ObrasApp:
         # Botão para abrir as configurações
         ctk.CTkButton(button_frame, text="Configurar Layout", command=lambda: abrir_config_modal(update_preview)).pack(side="right", padx=20)
 
-    def _truncate_text(self, text, max_width, font_obj):
-        """Trunca o texto com '...' se exceder a largura máxima da coluna."""
-        if not isinstance(text, str):
-            return text
-        
-        text_width = font_obj.measure(text)
-        
-        # Se o texto não couber, trunca
-        if text_width > max_width - margin:
-            temp_text = text
-            # Reduz o texto até que ele (com '...') caiba na largura
-            while font_obj.measure(temp_text + '...') > max_width - margin and len(temp_text) > 0:
-                text = text[:-1]
-            final_text = text + '...'
-        else:
-            final_text = text
-        
-        # Substitui espaços por 'non-breaking spaces' para forçar uma única linha no Treeview
-        return final_text.replace(' ', '\u00A0')
+    def _truncate_text(self, text, max_width, font_obj, margin=20):
+        """Trunca o texto com '...' se exceder a largura máxima e substitui espaços para evitar quebra de linha."""
+        return truncar_texto(text, max_width, font_obj, margin=margin, sem_quebra=True)
 
     def abrir_modal_edicao_item(self, event):
         selected_item_id = self.itens_tree.focus()
@@ -1012,14 +1080,7 @@ class ObrasApp:
             return
 
         # Encontrar o item completo nos dados carregados
-        item_para_editar = None
-        for pedido_id, itens in self.produtos_por_pedido.items():
-            for item in itens:
-                if item['id_vinculo'] == id_vinculo:
-                    item_para_editar = item
-                    break
-            if item_para_editar:
-                break
+        item_para_editar = self.cache.item_por_vinculo(id_vinculo)
 
         if not item_para_editar:
             messagebox.showerror("Erro", "Item não encontrado para edição.")
@@ -1170,7 +1231,7 @@ class ObrasApp:
             image_list = item_data.get('files', [])
 
             # Coleta os metadados para salvar no JSON
-            pedido_info = next((p for p in self.obras_data if p['idpedido'] == item_para_editar['idpedido']), {})
+            pedido_info = self.cache.pedido_por_id(item_para_editar['idpedido']) or {}
             item_data['info'] = {
                 "pedido": pedido_info.get('numero_pedido', ''),
                 "cliente": pedido_info.get('cliente', ''),
@@ -1213,17 +1274,11 @@ class ObrasApp:
         def salvar_edicao():
             connection = None
             try:
-                connection = pymysql.connect(
-                    host=DB_HOST,
-                    user=DB_USER,
-                    password=DB_PASS,
-                    database=DB_NAME,
-                    charset='utf8mb4',
-                    cursorclass=pymysql.cursors.DictCursor
-                )
+                connection = get_connection()
                 with connection.cursor() as cursor:
                     update_fields = []
                     update_params = []
+                    campos_alterados = {}
                     
                     for label_text, field_name, field_type in fields:
                         if field_name in entries or field_type == datetime: # Apenas processa campos editáveis
@@ -1252,15 +1307,19 @@ class ObrasApp:
                             if new_value != item_para_editar.get(field_name):
                                 update_fields.append(f"{field_name} = %s")
                                 update_params.append(new_value)
+                                campos_alterados[field_name] = new_value
                     
                     if update_fields:
                         sql = f"UPDATE cliente_item SET {', '.join(update_fields)} WHERE id_item = %s"
                         update_params.append(id_vinculo)
                         cursor.execute(sql, update_params)
+                        atualizar_status_tr_dos_itens(cursor, [id_vinculo]) # TRs deste item
                         connection.commit()
+                        invalidate('cliente_item')
+                        self.cache.atualizar_item(id_vinculo, campos_alterados) # Mantém o índice em dia
                         messagebox.showinfo("Sucesso", "Item atualizado com sucesso!")
                         modal.destroy()
-                        self.carregar_obras(self.ano_var.get(), self.search_var.get()) # Recarrega para refletir as mudanças
+                        self.atualizar_obras() # Busca só as alterações para refletir as mudanças
                     else:
                         messagebox.showinfo("Info", "Nenhuma alteração detectada.", parent=modal)
                         modal.destroy()
@@ -1290,7 +1349,7 @@ class ObrasApp:
             return
 
         # Encontrar o pedido e seus itens
-        selected_pedido = next((p for p in self.obras_data if f"{p['numero_pedido']} - {p['cliente']} ({p['endereco']})" == selected_text), None)
+        selected_pedido = self.cache.pedido_por_display(selected_text)
         if not selected_pedido:
             messagebox.showerror("Erro", "Pedido selecionado não encontrado nos dados.")
             return
@@ -1442,7 +1501,7 @@ class ObrasApp:
         
         # 1. Obter informações do pedido
         selected_text = self.pedido_select_var.get()
-        pedido_info = next((p for p in self.obras_data if f"{p['numero_pedido']} - {p['cliente']} ({p['endereco']})" == selected_text), None)
+        pedido_info = self.cache.pedido_por_display(selected_text)
         if not pedido_info:
             messagebox.showerror("Erro", "Não foi possível encontrar os dados do pedido selecionado.")
             return
@@ -1450,6 +1509,7 @@ class ObrasApp:
         # 2. Encontrar todos os itens "folha" (com id_vinculo) do equipamento clicado, incluindo subconjuntos
         def get_all_leaf_children(parent_iid):
             """Função recursiva para encontrar todos os nós 'folha' (itens finais) sob um nó pai."""
+            self._materializar_filhos(parent_iid)
             children = self.itens_tree.get_children(parent_iid)
             # Se o nó não tem filhos, ele é uma folha.
             if not children:
@@ -1467,7 +1527,7 @@ class ObrasApp:
         for child_iid in all_child_iids:
             try:
                 id_vinculo = int(child_iid.split('|')[-1])
-                item_data = next((item for item in self.produtos_por_pedido.get(pedido_info['idpedido'], []) if item['id_vinculo'] == id_vinculo), None)
+                item_data = self.cache.item_por_vinculo(id_vinculo)
                 if item_data:
                     itens_filho_para_atualizar.append(item_data)
             except (ValueError, IndexError):
@@ -1524,7 +1584,7 @@ class ObrasApp:
             # Executar a atualização no banco de dados
             connection = None
             try:
-                connection = pymysql.connect(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME)
+                connection = get_connection()
                 with connection.cursor() as cursor:
                     # Cria uma string de placeholders (%s, %s, ...)
                     placeholders = ', '.join(['%s'] * len(ids_para_atualizar))
@@ -1534,12 +1594,18 @@ class ObrasApp:
                     params = [data_atual] + ids_para_atualizar
                     
                     cursor.execute(sql, params)
+                    atualizados = cursor.rowcount
+                    atualizar_status_tr_dos_itens(cursor, ids_para_atualizar) # TRs desses itens
                     connection.commit()
+                    invalidate('cliente_item')
+
+                for id_item in ids_para_atualizar:
+                    self.cache.atualizar_item(id_item, {campo_data: data_atual})
 
-                messagebox.showinfo("Sucesso", f"{cursor.rowcount} item(ns) atualizado(s) com sucesso!", parent=modal)
+                messagebox.showinfo("Sucesso", f"{atualizados} item(ns) atualizado(s) com sucesso!", parent=modal)
                 modal.destroy()
-                # Recarrega os dados para refletir as mudanças na tela
-                self.filtrar_obras()
+                # Busca as alterações para refletir as mudanças na tela
+                self.atualizar_obras()
 
             except Exception as e:
                 messagebox.showerror("Erro de Banco de Dados", f"Falha ao atualizar os itens:\n{e}", parent=modal)
@@ -0,0 +1,441 @@
+# obras_cache.py
+"""
+Cache em memória dos pedidos e itens exibidos pela tela de Obras.
+
+A primeira carga baixa tudo; as seguintes buscam apenas as linhas de `pedido`
+e `cliente_item` alteradas desde a última sincronização (marca d'água na
+coluna `SYNC_COLUMN`). Os filtros de ano e busca são aplicados em memória.
+As linhas em cache também trazem dados de `REFERENCIAS` (nome do cliente,
+códigos e descrições dos itens); se alguma delas muda, a sincronização
+seguinte refaz a carga completa.
+`coletar` faz as consultas sem alterar o cache (pode rodar numa thread) e
+`aplicar` atualiza o cache na thread da interface; `sync` faz as duas coisas.
+
+No modo `lazy_itens`, `sync()` traz apenas os pedidos; os itens de cada pedido
+são buscados quando ele é selecionado (`itens_do_pedido`) e mantidos num LRU
+dos pedidos vistos por último, que a sincronização incremental mantém em dia.
+
+Se as tabelas ainda não tiverem a coluna de sincronização, cada `sync()` faz
+a carga completa (comportamento antigo). As migrações 3 e 6 de `migrations.py`
+criam as colunas `atualizado_em` e seus índices:
+
+    python migrations.py upgrade
+"""
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+SYNC_COLUMN = 'atualizado_em'
+LRU_PEDIDOS = 50  # pedidos com itens mantidos em memória no modo lazy
+# Tabelas cujos dados vêm nos JOINs: alterá-las exige recarregar tudo
+REFERENCIAS = ('add_cliente', 'itens', 'item_composicao')
+
+# LEFT JOIN para que o cache conheça todos os ids (detecção de exclusões);
+# as linhas sem cliente/composição são descartadas como no INNER JOIN original.
+PEDIDOS_SQL = """
+    SELECT
+        p.idpedido, p.idcliente, p.numero_pedido, p.data_entrega, p.data_insercao,
+        ac.cliente, ac.endereco, ac.idcliente AS cliente_encontrado{sync}
+    FROM pedido p
+    LEFT JOIN add_cliente ac ON p.idcliente = ac.idcliente
+"""
+
+ITENS_SQL = """
+    SELECT
+        ci.id_item AS id_vinculo,
+        ci.idpedido,
+        ci.quantidade_prod,
+        ci.lote,
+        ci.data_engenharia,
+        ci.data_programacao,
+        ci.data_pcp,
+        ci.data_producao,
+        ci.data_qualidade,
+        ci.caminho,
+        ci.tag,
+        ci.data_prog_fim,
+        ci.obs_detalhes,
+        ci.obs_programacao,
+        ci.obs_producao,
+
+        -- Equipamento (item raiz)
+        pi.id AS equipamento_id,
+        pi.codigo AS codigo_equipamento,
+        pi.descricao AS nome_equipamento,
+
+        -- Conjunto (item filho)
+        si.id AS conjunto_id,
+        si.codigo AS codigo_conjunto,
+        si.descricao AS conjunto{sync}
+
+    FROM cliente_item ci
+    LEFT JOIN item_composicao ic ON ci.id_composicao = ic.id
+    LEFT JOIN itens pi ON ci.item_raiz_id = pi.id        -- Equipamento pai
+    LEFT JOIN itens si ON ic.id_item_filho = si.id       -- Conjunto (filho)
+"""
+
+
+def pedido_display(pedido):
+    """Texto usado para exibir/selecionar um pedido na tela de Obras."""
+    return f"{pedido['numero_pedido']} - {pedido['cliente']} ({pedido['endereco']})"
+
+
+def _maior(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
+
+
+def _item_sort_key(item):
+    # Mesma ordem do SQL original: equipamento e data de engenharia
+    return (item.get('nome_equipamento') or '', item.get('data_engenharia') or datetime.min)
+
+
+class ObrasCache:
+    """Mantém pedidos e itens da tela de Obras sincronizados com o banco."""
+
+    def __init__(self, sync_column=SYNC_COLUMN, lazy_itens=False, lru_pedidos=LRU_PEDIDOS):
+        self.sync_column = sync_column
+        self.lazy_itens = lazy_itens
+        self.lru_pedidos = lru_pedidos
+        self.pedidos = {}                   # idpedido -> pedido
+        self.itens = {}                     # id_vinculo -> item
+        self._indice_display = {}           # texto exibido -> idpedido
+        self.itens_por_pedido = OrderedDict()  # idpedido -> [itens] (ordem de uso no modo lazy)
+        self._ids_conhecidos = {'pedido': set(), 'cliente_item': set()}
+        self._marca_dagua = {'pedido': None, 'cliente_item': None, 'referencias': None}
+        self.incremental = None     # None = ainda não verificado
+        self.ultima_sync = {}
+
+    # --- Sincronização ---
+
+    def _verificar_incremental(self, cursor):
+        necessarias = {'pedido', 'cliente_item', *REFERENCIAS}
+        placeholders = ','.join(['%s'] * len(necessarias))
+        cursor.execute(
+            f"""
+            SELECT TABLE_NAME FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND COLUMN_NAME = %s
+              AND TABLE_NAME IN ({placeholders})
+            """,
+            (self.sync_column, *sorted(necessarias))
+        )
+        tabelas = {row['TABLE_NAME'] for row in cursor.fetchall()}
+        return tabelas == necessarias
+
+    def _marcas_referencias(self, cursor):
+        """(contagem, maior `sync_column`) de cada tabela de `REFERENCIAS`, numa consulta só."""
+        colunas = ', '.join(
+            f"(SELECT COUNT(*) FROM {tabela}) AS n_{tabela}, "
+            f"(SELECT MAX({self.sync_column}) FROM {tabela}) AS max_{tabela}"
+            for tabela in REFERENCIAS
+        )
+        cursor.execute(f"SELECT {colunas}")
+        row = cursor.fetchone()
+        return tuple((row[f'n_{tabela}'], row[f'max_{tabela}']) for tabela in REFERENCIAS)
+
+    def sync(self, cursor, completo=False):
+        """
+        Sincroniza o cache com o banco usando o cursor (DictCursor) informado.
+        Retorna o conjunto de idpedido cujos dados ou itens mudaram.
+        """
+        return self.aplicar(self.coletar(cursor, self.estado_sync(), completo))
+
+    def estado_sync(self):
+        """Cópia do estado usado por `coletar` (chamar na thread da interface)."""
+        return {
+            'incremental': self.incremental,
+            'marca_dagua': dict(self._marca_dagua),
+            'ids_conhecidos': {tabela: set(ids) for tabela, ids in self._ids_conhecidos.items()},
+            'pedidos_lru': list(self.itens_por_pedido) if self.lazy_itens else [],
+        }
+
+    def coletar(self, cursor, estado, completo=False):
+        """
+        Executa as consultas da sincronização sem alterar o cache, podendo
+        rodar em outra thread. O resultado é aplicado com `aplicar`.
+        """
+        inicio = time.perf_counter()
+        incremental = estado['incremental']
+        if incremental is None:
+            incremental = self._verificar_incremental(cursor)
+
+        anterior = estado['marca_dagua']
+        delta = incremental and not completo and anterior['pedido'] is not None
+        referencias = self._marcas_referencias(cursor) if incremental else None
+        if referencias != anterior['referencias']:
+            # Cliente renomeado, item redescrito etc.: as linhas em cache ficaram velhas
+            delta = False
+        marcas = dict(anterior) if delta else {'pedido': None, 'cliente_item': None}
+        marcas['referencias'] = referencias
+        coleta = {
+            'inicio': inicio, 'delta': delta, 'incremental': incremental, 'marca_dagua': marcas,
+            'pedidos': [], 'pedidos_existentes': None,
+            'itens': [], 'itens_existentes': None,
+            'pedidos_lru': [], 'itens_lru_existentes': None,
+        }
+
+        rows, marca = self._buscar(cursor, PEDIDOS_SQL, 'p', incremental,
+                                   desde=anterior['pedido'] if delta else None)
+        coleta['pedidos'] = rows
+        marcas['pedido'] = _maior(marcas['pedido'], marca)
+        if delta:
+            conhecidos = estado['ids_conhecidos']['pedido'] | {row['idpedido'] for row in rows}
+            coleta['pedidos_existentes'] = self._ids_existentes(cursor, 'pedido', 'idpedido', len(conhecidos))
+
+        if self.lazy_itens:
+            self._coletar_itens_lazy(cursor, estado, coleta)
+        else:
+            rows, marca = self._buscar(cursor, ITENS_SQL, 'ci', incremental,
+                                       desde=anterior['cliente_item'] if delta else None)
+            coleta['itens'] = rows
+            marcas['cliente_item'] = _maior(marcas['cliente_item'], marca)
+            if delta:
+                conhecidos = estado['ids_conhecidos']['cliente_item'] | {row['id_vinculo'] for row in rows}
+                coleta['itens_existentes'] = self._ids_existentes(cursor, 'cliente_item', 'id_item', len(conhecidos))
+        return coleta
+
+    def _coletar_itens_lazy(self, cursor, estado, coleta):
+        """No modo lazy só os pedidos já vistos (no LRU) têm seus itens atualizados."""
+        marcas = coleta['marca_dagua']
+        if not coleta['delta']:
+            if coleta['incremental']:
+                # A marca d'água parte do estado atual; os itens são buscados sob demanda
+                cursor.execute(f"SELECT MAX({self.sync_column}) AS marca FROM cliente_item")
+                marcas['cliente_item'] = cursor.fetchone()['marca']
+            return
+
+        ids_pedidos = estado['pedidos_lru']
+        if not ids_pedidos:
+            return
+        placeholders = ','.join(['%s'] * len(ids_pedidos))
+        rows, marca = self._buscar(cursor, ITENS_SQL, 'ci', coleta['incremental'],
+                                   desde=estado['marca_dagua']['cliente_item'],
+                                   where=f"ci.idpedido IN ({placeholders})", params=ids_pedidos)
+        coleta['itens'] = rows
+        marcas['cliente_item'] = _maior(marcas['cliente_item'], marca)
+
+        # Exclusões nos pedidos em cache: ids existentes para comparar com os conhecidos
+        cursor.execute(f"SELECT id_item FROM cliente_item WHERE idpedido IN ({placeholders})", ids_pedidos)
+        coleta['pedidos_lru'] = ids_pedidos
+        coleta['itens_lru_existentes'] = {row['id_item'] for row in cursor.fetchall()}
+
+    def _ids_existentes(self, cursor, tabela, coluna_id, n_conhecidos):
+        """Exclusões não alteram a marca d'água: compara a contagem e, se divergir, busca os ids."""
+        cursor.execute(f"SELECT COUNT(*) AS n FROM {tabela}")
+        if cursor.fetchone()['n'] == n_conhecidos:
+            return None
+        cursor.execute(f"SELECT {coluna_id} AS id FROM {tabela}")
+        return {row['id'] for row in cursor.fetchall()}
+
+    def aplicar(self, coleta):
+        """
+        Aplica ao cache o resultado de `coletar` (na thread da interface).
+        Retorna o conjunto de idpedido cujos dados ou itens mudaram.
+        """
+        self.incremental = coleta['incremental']
+        if not coleta['delta']:
+            self._limpar()
+
+        alterados = set()
+        for pedido in coleta['pedidos']:
+            idpedido = pedido['idpedido']
+            self._ids_conhecidos['pedido'].add(idpedido)
+            self._remover_pedido(idpedido)
+            if pedido.pop('cliente_encontrado') is not None:
+                self.pedidos[idpedido] = pedido
+                self._indexar_pedido(pedido)
+            alterados.add(idpedido)
+        if coleta['pedidos_existentes'] is not None:
+            self._remover_excluidos('pedido', coleta['pedidos_existentes'], alterados)
+
+        self._aplicar_itens(coleta['itens'], alterados)
+        if coleta['itens_existentes'] is not None:
+            self._remover_excluidos('cliente_item', coleta['itens_existentes'], alterados)
+        if coleta['itens_lru_existentes'] is not None:
+            existentes = coleta['itens_lru_existentes']
+            for idpedido in coleta['pedidos_lru']:
+                for item in list(self.itens_por_pedido.get(idpedido, [])):
+                    if item['id_vinculo'] not in existentes:
+                        self._remover_item(item['id_vinculo'], alterados)
+
+        for idpedido in alterados:
+            itens = self.itens_por_pedido.get(idpedido)
+            if itens:
+                itens.sort(key=_item_sort_key)
+
+        self._marca_dagua = coleta['marca_dagua']
+        self.ultima_sync = {
+            'modo': 'incremental' if coleta['delta'] else 'completo',
+            'pedidos': len(coleta['pedidos']),
+            'itens': len(coleta['itens']),
+            'tempo': time.perf_counter() - coleta['inicio'],
+        }
+        return alterados
+
+    def _limpar(self):
+        self.pedidos.clear()
+        self._indice_display.clear()
+        self.itens.clear()
+        self.itens_por_pedido.clear()
+        for ids in self._ids_conhecidos.values():
+            ids.clear()
+        self._marca_dagua = {'pedido': None, 'cliente_item': None, 'referencias': None}
+
+    def _buscar(self, cursor, sql, alias, incremental, desde=None, where=None, params=()):
+        """Executa a consulta e retorna (linhas, maior valor da coluna de sincronização)."""
+        sync = f", {alias}.{self.sync_column} AS _sync" if incremental else ""
+        sql = sql.format(sync=sync)
+        condicoes = []
+        params = list(params)
+        if desde is not None:
+            # ">=" porque TIMESTAMP tem resolução de segundos; linhas repetidas são sobrescritas
+            condicoes.append(f"{alias}.{self.sync_column} >= %s")
+            params.insert(0, desde)
+        if where:
+            condicoes.append(where)
+        if condicoes:
+            sql += " WHERE " + " AND ".join(condicoes)
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        maior = None
+        for row in rows:
+            maior = _maior(maior, row.pop('_sync', None))
+        return rows, maior
+
+    def _aplicar_itens(self, rows, alterados):
+        for item in rows:
+            self._ids_conhecidos['cliente_item'].add(item['id_vinculo'])
+            self._remover_item(item['id_vinculo'], alterados)
+            if item['equipamento_id'] is not None and item['conjunto_id'] is not None:
+                self.itens[item['id_vinculo']] = item
+                self.itens_por_pedido.setdefault(item['idpedido'], []).append(item)
+            alterados.add(item['idpedido'])
+
+    def _remover_item(self, id_vinculo, alterados):
+        antigo = self.itens.pop(id_vinculo, None)
+        if antigo is not None:
+            lista = self.itens_por_pedido.get(antigo['idpedido'], [])
+            lista[:] = [i for i in lista if i['id_vinculo'] != id_vinculo]
+            alterados.add(antigo['idpedido'])
+
+    def _remover_excluidos(self, tabela, existentes, alterados):
+        for removido in self._ids_conhecidos[tabela] - existentes:
+            if tabela == 'pedido':
+                self._remover_pedido(removido)
+                for item in self.itens_por_pedido.pop(removido, []):
+                    self.itens.pop(item['id_vinculo'], None)
+                alterados.add(removido)
+            else:
+                self._remover_item(removido, alterados)
+        self._ids_conhecidos[tabela] = existentes
+
+    # --- Índices ---
+
+    def _indexar_pedido(self, pedido):
+        texto = pedido_display(pedido)
+        atual = self._indice_display.get(texto)
+        # Textos repetidos: vale o pedido mais recente, como na busca linear antiga
+        if atual is None or pedido['idpedido'] > atual:
+            self._indice_display[texto] = pedido['idpedido']
+
+    def _remover_pedido(self, idpedido):
+        antigo = self.pedidos.pop(idpedido, None)
+        if antigo is None:
+            return
+        texto = pedido_display(antigo)
+        if self._indice_display.get(texto) == idpedido:
+            del self._indice_display[texto]
+            # Raro: outro pedido com o mesmo texto assume a entrada
+            for pedido in self.pedidos.values():
+                if pedido_display(pedido) == texto:
+                    self._indexar_pedido(pedido)
+
+    def pedido_por_display(self, texto):
+        """Pedido correspondente ao texto exibido na seleção (ou None)."""
+        idpedido = self._indice_display.get(texto)
+        return self.pedidos.get(idpedido) if idpedido is not None else None
+
+    def pedido_por_id(self, idpedido):
+        return self.pedidos.get(idpedido)
+
+    def item_por_vinculo(self, id_vinculo):
+        """Item (cliente_item) pelo id_vinculo, se estiver em memória."""
+        return self.itens.get(id_vinculo)
+
+    def atualizar_item(self, id_vinculo, campos):
+        """Aplica localmente uma edição já gravada no banco, mantendo os índices válidos."""
+        item = self.itens.get(id_vinculo)
+        if item is not None:
+            item.update(campos)
+        return item
+
+    # --- Itens sob demanda (modo lazy) ---
+
+    def tem_itens(self, idpedido):
+        """Indica se os itens do pedido já estão em memória."""
+        return not self.lazy_itens or idpedido in self.itens_por_pedido
+
+    def buscar_itens(self, cursor, idpedido):
+        """Busca no banco os itens de um pedido sem alterar o cache (seguro em outra thread)."""
+        rows, _ = self._buscar(cursor, ITENS_SQL, 'ci', self.incremental,
+                               where="ci.idpedido = %s", params=[idpedido])
+        return rows
+
+    def armazenar_itens(self, idpedido, rows):
+        """Guarda no LRU os itens buscados por `buscar_itens`."""
+        if idpedido in self.itens_por_pedido:
+            self.itens_por_pedido.move_to_end(idpedido)
+            return
+        self.itens_por_pedido[idpedido] = []
+        self._aplicar_itens(rows, set())
+        self.itens_por_pedido[idpedido].sort(key=_item_sort_key)
+        while len(self.itens_por_pedido) > self.lru_pedidos:
+            _, descartados = self.itens_por_pedido.popitem(last=False)
+            for item in descartados:
+                self.itens.pop(item['id_vinculo'], None)
+
+    def itens_do_pedido(self, cursor_factory, idpedido):
+        """
+        Itens do pedido, buscando-os no banco se ainda não estiverem em memória.
+        `cursor_factory` só é chamado quando a busca é necessária.
+        """
+        if self.tem_itens(idpedido):
+            if self.lazy_itens:
+                self.itens_por_pedido.move_to_end(idpedido)
+            return self.itens_por_pedido.get(idpedido, [])
+        with cursor_factory() as cursor:
+            rows = self.buscar_itens(cursor, idpedido)
+        self.armazenar_itens(idpedido, rows)
+        return self.itens_por_pedido.get(idpedido, [])
+
+    # --- Consultas em memória ---
+
+    def anos(self):
+        """Anos de inserção disponíveis, do mais recente para o mais antigo."""
+        anos = {p['data_insercao'].year for p in self.pedidos.values()
+                if p.get('data_insercao') and hasattr(p['data_insercao'], 'year')}
+        return [str(ano) for ano in sorted(anos, reverse=True)]
+
+    def filtrar(self, ano=None, termo_busca=None):
+        """Pedidos que atendem aos filtros, ordenados por idpedido decrescente."""
+        ano = int(ano) if ano and ano != "Todos os Anos" else None
+        termo = termo_busca.lower() if termo_busca else None
+        resultado = []
+        for idpedido in sorted(self.pedidos, reverse=True):
+            pedido = self.pedidos[idpedido]
+            if ano is not None:
+                data = pedido.get('data_insercao')
+                if not data or getattr(data, 'year', None) != ano:
+                    continue
+            if termo and not any(termo in str(pedido.get(campo) or '').lower()
+                                 for campo in ('numero_pedido', 'cliente', 'endereco')):
+                continue
+            resultado.append(pedido)
+        return resultado
+
+    def todos_os_pedidos(self):
+        """Todos os pedidos em cache, ordenados por idpedido decrescente."""
+        return [self.pedidos[i] for i in sorted(self.pedidos, reverse=True)]
@@ -3,6 +3,7 @@ from tkinter import ttk, messagebox, filedialog
 import customtkinter as ctk
 from tkcalendar import DateEntry
 from database import get_db_connection # Assumindo que você criou database.py
+from ref_cache import cached, invalidate
 from datetime import datetime
 import os
 try:
@@ -172,23 +173,26 @@ class PedidosApp:
                 "📄" if pedido['pdf'] else "-",  # Ícone para PDF se existir
             ), tags=(pedido['idpedido'], tag))
 
+    def _fetch_clientes(self):
+        with get_db_connection() as connection, connection.cursor() as cursor:
+            cursor.execute("SELECT idcliente, cliente, endereco FROM add_cliente ORDER BY cliente, endereco")
+            return cursor.fetchall()
+
     def carregar_clientes(self):
         try:
-            with get_db_connection() as connection, connection.cursor() as cursor:
-                cursor.execute("SELECT idcliente, cliente, endereco FROM add_cliente ORDER BY cliente, endereco")
-                rows = cursor.fetchall()
-                
-                # Agrupar por nome do cliente
-                self.clientes_grouped = {}
-                for row in rows:
-                    nome = row['cliente']
-                    if nome not in self.clientes_grouped:
-                        self.clientes_grouped[nome] = []
-                    self.clientes_grouped[nome].append({
-                        'id': row['idcliente'],
-                        'endereco': row['endereco']
-                    })
-                
+            rows = cached(('clientes_enderecos',), ('add_cliente',), self._fetch_clientes)
+
+            # Agrupar por nome do cliente
+            self.clientes_grouped = {}
+            for row in rows:
+                nome = row['cliente']
+                if nome not in self.clientes_grouped:
+                    self.clientes_grouped[nome] = []
+                self.clientes_grouped[nome].append({
+                    'id': row['idcliente'],
+                    'endereco': row['endereco']
+                })
+
         except Exception as e:
             messagebox.showerror("Erro", f"Erro ao carregar clientes: {str(e)}")
     
@@ -512,6 +516,7 @@ class PedidosApp:
                         cursor.execute("UPDATE pedido SET pdf = %s WHERE idpedido = %s", (destino, pedido_id))
                     
                     connection.commit()
+                    invalidate('pedido')
                     messagebox.showinfo("Sucesso", "Pedido criado com sucesso")
                     modal.destroy()
                     self.carregar_pedidos()
@@ -576,6 +581,7 @@ class PedidosApp:
                         sql_insert = "INSERT INTO add_cliente (cliente, endereco) VALUES (%s, %s)"
                         cursor.execute(sql_insert, (nome, endereco))
                         connection.commit()
+                        invalidate('add_cliente')
 
                 messagebox.showinfo("Sucesso", "Cliente adicionado com sucesso!", parent=modal)
                 self.carregar_clientes()  # Recarrega a lista de clientes na classe principal
@@ -787,6 +793,7 @@ class PedidosApp:
                     cursor.execute(sql, (cliente_id, num, data_db, pedido_id))
                     
                     connection.commit()
+                    invalidate('pedido')
                     messagebox.showinfo("Sucesso", "Pedido atualizado com sucesso")
                     modal.destroy()
                     self.carregar_pedidos()
@@ -809,6 +816,7 @@ class PedidosApp:
                             # Excluir pedido
                             cursor.execute("DELETE FROM pedido WHERE idpedido = %s", (pedido_id,))
                             connection.commit()
+                            invalidate('pedido')
                             
                             messagebox.showinfo("Sucesso", "Pedido excluído com sucesso")
                             modal.destroy()
@@ -1,8 +1,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import customtkinter as ctk
-import pymysql
-from config import DB_HOST, DB_USER, DB_PASS, DB_NAME
+from db_pool import get_connection
+from tk_worker import CanalDeCarga
+from status_tr import atualizar_status_tr_dos_itens
+from ref_cache import invalidate
 from datetime import datetime
 from etiqueta_printer import EtiquetaPrinter
 
@@ -14,6 +16,7 @@ class ProgramacaoApp:
         self.frame.pack(fill=tk.BOTH, expand=True)
         self.all_data = []
         self._after_id = None
+        self._carga_dados = CanalDeCarga(self.frame) # Recargas seguidas: só a última atualiza a tela
         self.active_status_filter = None # Para controlar o filtro de status ativo
         self.card_widgets = [] # Armazena apenas os 4 widgets de card reutilizáveis
         
@@ -103,40 +106,43 @@ class ProgramacaoApp:
                 card_widget.grid(row=row, column=col, pady=5, padx=5, sticky="nsew")
 
     def load_data(self):
-        try:
-            connection = pymysql.connect(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME, charset='utf8mb4', cursorclass=pymysql.cursors.DictCursor)
-            with connection.cursor() as cursor:
-                sql = """SELECT c.idcliente, c.cliente, ped.numero_pedido AS pedido, c.endereco,
-                           parent.codigo AS codigo_equipamento, parent.descricao AS equipamento_pai, 
-                           child.codigo AS codigo_conjunto, child.descricao AS conjunto, child.id AS idproduto, 
-                           ci.id_item AS id_vinculo, ci.data_engenharia, ci.data_prog_fim, ci.data_programacao,
-                           ci.quantidade_prod, ci.link_pastas, ci.tag, ci.obs_programacao, ci.lote, ci.prioridade,
-                           COALESCE(SUM(es.quantidade), 0) AS estoque_total
-                       FROM cliente_item ci
-                       JOIN pedido ped ON ci.idpedido = ped.idpedido
-                       JOIN add_cliente c ON ped.idcliente = c.idcliente
-                       JOIN item_composicao ic ON ci.id_composicao = ic.id
-                       JOIN itens parent ON ic.id_item_pai = parent.id
-                       JOIN itens child ON ic.id_item_filho = child.id
-                       LEFT JOIN estoque es ON child.id = es.id_produto
-                       GROUP BY ci.id_item
-                       ORDER BY ci.prioridade DESC, ci.data_engenharia DESC, ci.data_prog_fim DESC"""
-                cursor.execute(sql)
-                self.all_data = cursor.fetchall()
-                self.update_status_counts()
-                self.active_status_filter = None # Reseta o filtro de status ao recarregar todos os dados
-                
-                self.populate_client_order_filter()
-                
-                # Otimização: Cria os 4 widgets de card reutilizáveis uma única vez
-                self.create_reusable_cards()
-                
-                self.filter_data_immediate() # Aplica os filtros
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao carregar dados: {e}")
-        finally:
-            if 'connection' in locals() and connection.open:
-                connection.close()
+        """Busca os itens no executor de segundo plano; a tela é atualizada quando a consulta termina."""
+        self._carga_dados.executar(self._fetch_data,
+                                   ao_concluir=self._on_data_loaded,
+                                   ao_falhar=lambda e: messagebox.showerror("Erro", f"Erro ao carregar dados: {e}"))
+
+    def _fetch_data(self):
+        """Executa a consulta principal (fora da thread da interface)."""
+        sql = """SELECT c.idcliente, c.cliente, ped.numero_pedido AS pedido, c.endereco,
+                   parent.codigo AS codigo_equipamento, parent.descricao AS equipamento_pai, 
+                   child.codigo AS codigo_conjunto, child.descricao AS conjunto, child.id AS idproduto, 
+                   ci.id_item AS id_vinculo, ci.data_engenharia, ci.data_prog_fim, ci.data_programacao,
+                   ci.quantidade_prod, ci.link_pastas, ci.tag, ci.obs_programacao, ci.lote, ci.prioridade,
+                   COALESCE(SUM(es.quantidade), 0) AS estoque_total
+               FROM cliente_item ci
+               JOIN pedido ped ON ci.idpedido = ped.idpedido
+               JOIN add_cliente c ON ped.idcliente = c.idcliente
+               JOIN item_composicao ic ON ci.id_composicao = ic.id
+               JOIN itens parent ON ic.id_item_pai = parent.id
+               JOIN itens child ON ic.id_item_filho = child.id
+               LEFT JOIN estoque es ON child.id = es.id_produto
+               GROUP BY ci.id_item
+               ORDER BY ci.prioridade DESC, ci.data_engenharia DESC, ci.data_prog_fim DESC"""
+        with get_connection() as connection, connection.cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.fetchall()
+
+    def _on_data_loaded(self, rows):
+        self.all_data = rows
+        self.update_status_counts()
+        self.active_status_filter = None # Reseta o filtro de status ao recarregar todos os dados
+        
+        self.populate_client_order_filter()
+        
+        # Otimização: Cria os 4 widgets de card reutilizáveis uma única vez
+        self.create_reusable_cards()
+        
+        self.filter_data_immediate() # Aplica os filtros
 
     def filter_data_debounced(self, event=None):
         """Debounces the filter data call to avoid excessive updates."""
@@ -469,13 +475,14 @@ class ProgramacaoApp:
 
         connection = None
         try:
-            connection = pymysql.connect(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME, charset='utf8mb4', cursorclass=pymysql.cursors.DictCursor)
+            connection = get_connection()
             with connection.cursor() as cursor:
                 # Constrói a query final
                 sql = f"UPDATE cliente_item SET {', '.join(update_fields)} WHERE id_item = %s"
                 params.append(id_vinculo)
                 cursor.execute(sql, params)
             connection.commit()
+            invalidate('cliente_item')
             
             messagebox.showinfo("Sucesso", "Dados salvos com sucesso!")
             
@@ -490,12 +497,14 @@ class ProgramacaoApp:
 
     def finalize_item(self, id_vinculo):
         try:
-            connection = pymysql.connect(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME, charset='utf8mb4', cursorclass=pymysql.cursors.DictCursor)
+            connection = get_connection()
             with connection.cursor() as cursor:
                 now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 sql = "UPDATE cliente_item SET data_prog_fim = %s WHERE id_item = %s"
                 cursor.execute(sql, (now, id_vinculo))
+                atualizar_status_tr_dos_itens(cursor, [id_vinculo]) # TRs deste item
             connection.commit()
+            invalidate('cliente_item')
             messagebox.showinfo("Sucesso", f"Item {id_vinculo} finalizado.")
             
             # Recarrega todos os dados para garantir que a UI e a memória estejam em sincronia
@@ -509,12 +518,14 @@ class ProgramacaoApp:
 
     def start_item(self, id_vinculo):
         try:
-            connection = pymysql.connect(host=DB_HOST, user=DB_USER, password=DB_PASS, database=DB_NAME, charset='utf8mb4', cursorclass=pymysql.cursors.DictCursor)
+            connection = get_connection()
             with connection.cursor() as cursor:
                 now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 sql = "UPDATE cliente_item SET data_programacao = %s WHERE id_item = %s"
                 cursor.execute(sql, (now, id_vinculo))
-            connection.commit()            
+                atualizar_status_tr_dos_itens(cursor, [id_vinculo]) # TRs deste item
+            connection.commit()
+            invalidate('cliente_item')
             messagebox.showinfo("Sucesso", f"Item {id_vinculo} iniciado.")
 
             # Recarrega todos os dados para garantir que a UI e a memória estejam em sincronia
@@ -0,0 +1,345 @@
+# ref_cache.py
+"""
+Cache (TTL + LRU) para os dados de referência e consultas repetidas do painel:
+clientes (`add_cliente`), catálogo de itens (`itens`), composição
+(`item_composicao`), listas do dashboard etc.
+
+Cada consulta fica guardada por `config.REF_CACHE_TTL` segundos (ou o `ttl`
+informado na chamada). Cada entrada é marcada com as tabelas de onde veio;
+quem grava nessas tabelas chama `invalidate(tabela)` logo após o commit e a
+próxima leitura vai ao banco.
+
+Uso:
+    from ref_cache import cached, invalidate
+
+    rows = cached(('itens',), ('itens',), lambda: buscar_itens())
+    ...
+    conn.commit()
+    invalidate('itens')
+
+Backends (`config.REF_CACHE_BACKEND`):
+    memory  LRU no próprio processo (padrão; cada tela Tk / worker tem o seu)
+    sqlite  arquivo SQLite em `config.REF_CACHE_URL`, compartilhado pelos
+            processos da mesma máquina (ex.: todos os workers do gunicorn)
+    redis   servidor Redis (ou compatível) em `config.REF_CACHE_URL`
+
+A invalidação usa versões por tabela: a chave real de uma entrada inclui a
+versão atual de cada tabela de que ela depende, e `invalidate` apenas
+incrementa essas versões. Com um backend compartilhado, um commit feito em um
+worker invalida o cache de todos; as entradas antigas ficam inacessíveis e
+saem pelo TTL/LRU. Uma carga que corre junto com uma invalidação grava na
+versão antiga e nunca é lida.
+
+Os backends compartilhados guardam os valores com pickle: use apenas um
+arquivo/servidor de confiança. Se o backend falhar (Redis fora do ar, arquivo
+travado), a consulta vai direto ao banco e o erro vai para o log.
+Os valores devolvidos são cópias: o chamador pode alterar as linhas à vontade.
+"""
+import copy
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Backend em memória: dicionário LRU com expiração por entrada (thread-safe)."""
+
+    shared = False
+
+    def __init__(self, max_entries=256, ttl=300):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # chave -> (expira_em, valor)
+        self._versoes = {}             # tabela -> versão
+
+    def get(self, key):
+        """Retorna (True, valor) se a chave estiver válida no cache, senão (False, None)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            return False, None
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def versions(self, tables):
+        with self._lock:
+            return tuple(self._versoes.get(t, 0) for t in tables)
+
+    def bump(self, tables):
+        with self._lock:
+            for tabela in tables:
+                self._versoes[tabela] = self._versoes.get(tabela, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self):
+        with self._lock:
+            return {'backend': 'memory', 'entries': len(self._entries), 'max_entries': self.max_entries}
+
+
+class SQLiteCache:
+    """
+    Backend num arquivo SQLite (modo WAL) compartilhado pelos processos da máquina.
+    Uma conexão por thread/processo; as entradas vencidas e o excesso além de
+    `max_entries` são podados a cada `poda_a_cada` gravações.
+    """
+
+    shared = True
+
+    def __init__(self, path, max_entries=256, poda_a_cada=50):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.poda_a_cada = poda_a_cada
+        self._local = threading.local()
+        self._gravacoes = 0
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    chave TEXT PRIMARY KEY, valor BLOB NOT NULL, expira_em REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_expira ON cache (expira_em)")
+            conn.execute("CREATE TABLE IF NOT EXISTS versoes (tabela TEXT PRIMARY KEY, versao INTEGER NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        # Após um fork (workers do gunicorn) a conexão herdada não pode ser reusada
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT valor FROM cache WHERE chave = ? AND expira_em > ?", (key, time.time())).fetchone()
+        if row is None:
+            return False, None
+        return True, pickle.loads(row[0])
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO cache (chave, valor, expira_em) VALUES (?, ?, ?)",
+                     (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time() + ttl))
+        self._gravacoes += 1
+        if self._gravacoes % self.poda_a_cada == 0:
+            self._podar(conn)
+
+    def _podar(self, conn):
+        conn.execute("DELETE FROM cache WHERE expira_em <= ?", (time.time(),))
+        excesso = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+        if excesso > 0:
+            # As que vencem primeiro são as gravadas há mais tempo
+            conn.execute("DELETE FROM cache WHERE chave IN "
+                         "(SELECT chave FROM cache ORDER BY expira_em LIMIT ?)", (excesso,))
+
+    def versions(self, tables):
+        placeholders = ','.join('?' * len(tables))
+        rows = self._conn().execute(
+            f"SELECT tabela, versao FROM versoes WHERE tabela IN ({placeholders})", tuple(tables)).fetchall()
+        atuais = dict(rows)
+        return tuple(atuais.get(t, 0) for t in tables)
+
+    def bump(self, tables):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for tabela in tables:
+                conn.execute("INSERT INTO versoes (tabela, versao) VALUES (?, 1) "
+                             "ON CONFLICT(tabela) DO UPDATE SET versao = versao + 1", (tabela,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache")
+
+    def info(self):
+        entries = self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {'backend': 'sqlite', 'path': self.path, 'entries': entries, 'max_entries': self.max_entries}
+
+
+class RedisCache:
+    """
+    Backend Redis. Aceita a URL (`redis://host:6379/0`) ou um `client` já criado
+    com a mesma interface (get/set/mget/incr), como um servidor local de testes.
+    O limite de memória fica por conta do `maxmemory-policy` do servidor.
+    """
+
+    shared = True
+
+    def __init__(self, url=None, client=None, prefix='js-system:'):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("REF_CACHE_BACKEND=redis requer o pacote 'redis' (pip install redis)")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + 'v:' + key)
+        if raw is None:
+            return False, None
+        return True, pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + 'v:' + key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                        ex=max(1, int(ttl)))
+
+    def versions(self, tables):
+        valores = self.client.mget([self.prefix + 't:' + t for t in tables])
+        return tuple(int(v) if v is not None else 0 for v in valores)
+
+    def bump(self, tables):
+        for tabela in tables:
+            self.client.incr(self.prefix + 't:' + tabela)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + 'v:*'):
+            self.client.delete(key)
+
+    def info(self):
+        return {'backend': 'redis', 'prefix': self.prefix}
+
+
+class Cache:
+    """Fachada usada pelo sistema: chaves versionadas por tabela, cópias e contadores de acerto."""
+
+    def __init__(self, backend, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def _contar(self, campo):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def cached(self, key, tables, loader, ttl=None):
+        try:
+            chave = f"{key!r}@{self.backend.versions(tables)!r}"
+            found, value = self.backend.get(chave)
+        except Exception as e:
+            self._contar('errors')
+            logger.warning("Cache indisponível (%s): %s", type(self.backend).__name__, e)
+            return loader()
+
+        if found:
+            self._contar('hits')
+            return _copia(value)
+
+        self._contar('misses')
+        value = loader()
+        try:
+            self.backend.set(chave, value, self.ttl if ttl is None else ttl)
+        except Exception as e:
+            self._contar('errors')
+            logger.warning("Falha ao gravar no cache: %s", e)
+        return _copia(value)
+
+    def invalidate(self, *tables):
+        try:
+            self.backend.bump(tables)
+            self._contar('invalidations')
+        except Exception as e:
+            self._contar('errors')
+            logger.warning("Falha ao invalidar o cache de %s: %s", tables, e)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            data = {
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'errors': self.errors,
+                'hit_ratio': (self.hits / total) if total else 0.0,
+            }
+        try:
+            data.update(self.backend.info())
+        except Exception as e:
+            data['backend_error'] = str(e)
+        return data
+
+
+def _copia(value):
+    """Cópia das linhas (dicts de valores simples) sem o custo de um deepcopy completo."""
+    if isinstance(value, (list, tuple)) and all(isinstance(row, dict) for row in value):
+        return [dict(row) for row in value]
+    return copy.deepcopy(value)
+
+
+def create_backend(name=None, url=None):
+    """Instancia o backend configurado ('memory', 'sqlite' ou 'redis')."""
+    name = (name or config.REF_CACHE_BACKEND).lower()
+    url = url or config.REF_CACHE_URL
+    if name == 'memory':
+        return TTLCache(config.REF_CACHE_MAX_ENTRIES, config.REF_CACHE_TTL)
+    if name == 'sqlite':
+        return SQLiteCache(url, config.REF_CACHE_MAX_ENTRIES)
+    if name == 'redis':
+        return RedisCache(url)
+    raise ValueError(f"REF_CACHE_BACKEND desconhecido: {name}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Cache global do processo, criado na primeira chamada."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    backend = create_backend()
+                except Exception as e:
+                    logger.warning("Backend de cache '%s' indisponível, usando memória: %s",
+                                   config.REF_CACHE_BACKEND, e)
+                    backend = TTLCache(config.REF_CACHE_MAX_ENTRIES, config.REF_CACHE_TTL)
+                _cache = Cache(backend, config.REF_CACHE_TTL)
+    return _cache
+
+
+def cached(key, tables, loader, ttl=None):
+    """Valor da chave no cache; na falta, executa `loader()` e guarda o resultado."""
+    if not config.REF_CACHE_ENABLED:
+        return loader()
+    return get_cache().cached(key, tables, loader, ttl=ttl)
+
+
+def invalidate(*tables):
+    """Chamar após gravar em qualquer uma das `tables`."""
+    get_cache().invalidate(*tables)
+
+
+def cache_stats():
+    """Contadores do cache deste processo (hits, misses, hit_ratio) e estado do backend."""
+    return get_cache().stats()
@@ -1,7 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import pymysql
-from config import DB_HOST, DB_USER, DB_PASS, DB_NAME
+from db_pool import get_connection
+from tk_worker import CanalDeCarga
 from tkcalendar import DateEntry
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
@@ -18,6 +18,7 @@ class RelatorioApp:
         self.pedidos_data = []
         self.all_pedidos = []
         self.selected_pedido_ids = []
+        self._carga_relatorio = CanalDeCarga(self.frame) # Filtrar de novo cancela a busca anterior
 
         self.create_widgets()
         self.load_pedidos()
@@ -139,11 +140,7 @@ class RelatorioApp:
         confirm_btn.pack(pady=10, padx=10)
 
     def get_db_connection(self):
-        return pymysql.connect(
-            host=DB_HOST, user=DB_USER, password=DB_PASS,
-            database=DB_NAME, charset='utf8mb4',
-            cursorclass=pymysql.cursors.DictCursor
-        )
+        return get_connection()
 
     def filter_data(self):
         """Busca os dados no banco com base nos filtros e atualiza a Treeview."""
@@ -151,41 +148,41 @@ class RelatorioApp:
             messagebox.showwarning("Aviso", "Selecione pelo menos um pedido para filtrar.")
             return
 
-        try:
-            connection = self.get_db_connection()
-            with connection.cursor() as cursor:
-                placeholders = ','.join(['%s'] * len(self.selected_pedido_ids))
-                sql = f"""
-                    SELECT
-                        p.idpedido, p.numero_pedido, c.cliente AS nome_cliente,
-                        c.endereco AS endereco_cliente, p.data_entrega,
-                        ci.id_item AS id_vinculo, ci.obs_producao, ci.data_prog_fim, ci.quantidade_prod, ci.lote,
-                        parent.codigo AS codigo_equipamento,
-                        parent.descricao AS nome_equipamento, 
-                        child.codigo AS codigo_conjunto, child.descricao AS conjunto,
-                        ci.data_engenharia, ci.data_programacao, ci.data_pcp,
-                        ci.data_producao, ci.data_qualidade
-                    FROM pedido p
-                    LEFT JOIN add_cliente c ON p.idcliente = c.idcliente
-                    LEFT JOIN cliente_item ci ON p.idpedido = ci.idpedido
-                    LEFT JOIN item_composicao ic ON ci.id_composicao = ic.id
-                    LEFT JOIN itens parent ON ic.id_item_pai = parent.id
-                    LEFT JOIN itens child ON ic.id_item_filho = child.id
-                    WHERE p.idpedido IN ({placeholders})
-                    ORDER BY p.numero_pedido, c.cliente, parent.descricao, ci.id_item
-                """
-                cursor.execute(sql, self.selected_pedido_ids)
-                results = cursor.fetchall()
-                
-                # Processar dados e agrupar
-                self.pedidos_data = self.process_fetched_data(results)
-                self.update_treeview()
-
-        except Exception as e:
-            messagebox.showerror("Erro de Banco de Dados", f"Erro ao buscar dados: {e}")
-        finally:
-            if connection:
-                connection.close()
+        self._carga_relatorio.executar(self._fetch_data, list(self.selected_pedido_ids),
+                                       ao_concluir=self._on_data_loaded,
+                                       ao_falhar=lambda e: messagebox.showerror("Erro de Banco de Dados", f"Erro ao buscar dados: {e}"))
+
+    def _fetch_data(self, pedido_ids):
+        """Busca e agrupa os itens dos pedidos (fora da thread da interface)."""
+        placeholders = ','.join(['%s'] * len(pedido_ids))
+        sql = f"""
+            SELECT
+                p.idpedido, p.numero_pedido, c.cliente AS nome_cliente,
+                c.endereco AS endereco_cliente, p.data_entrega,
+                ci.id_item AS id_vinculo, ci.obs_producao, ci.data_prog_fim, ci.quantidade_prod, ci.lote,
+                parent.codigo AS codigo_equipamento,
+                parent.descricao AS nome_equipamento, 
+                child.codigo AS codigo_conjunto, child.descricao AS conjunto,
+                ci.data_engenharia, ci.data_programacao, ci.data_pcp,
+                ci.data_producao, ci.data_qualidade
+            FROM pedido p
+            LEFT JOIN add_cliente c ON p.idcliente = c.idcliente
+            LEFT JOIN cliente_item ci ON p.idpedido = ci.idpedido
+            LEFT JOIN item_composicao ic ON ci.id_composicao = ic.id
+            LEFT JOIN itens parent ON ic.id_item_pai = parent.id
+            LEFT JOIN itens child ON ic.id_item_filho = child.id
+            WHERE p.idpedido IN ({placeholders})
+            ORDER BY p.numero_pedido, c.cliente, parent.descricao, ci.id_item
+        """
+        with self.get_db_connection() as connection, connection.cursor() as cursor:
+            cursor.execute(sql, pedido_ids)
+            results = cursor.fetchall()
+        # Processar dados e agrupar
+        return self.process_fetched_data(results)
+
+    def _on_data_loaded(self, pedidos_data):
+        self.pedidos_data = pedidos_data
+        self.update_treeview()
 
     def process_fetched_data(self, results):
         """Agrupa os resultados da query por pedido."""
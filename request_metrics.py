@@ -0,0 +1,202 @@
+# request_metrics.py
+"""
+Medição por requisição para o app.py e o web_app.py.
+
+Para cada requisição são medidos: tempo total, tempo no banco, número de
+consultas, linhas lidas e tempo de renderização de templates. Os valores:
+
+- vão no cabeçalho `Server-Timing` (aba Network/Timing do DevTools):
+      Server-Timing: db;dur=12.4;desc="3 queries, 120 rows", render;dur=3.1, app;dur=5.0, total;dur=20.5
+- ficam numa amostra das últimas `config.METRICS_SAMPLES` requisições por
+  endpoint, de onde `endpoint_stats()` calcula p50/p90/p99 (rota /metrics/requests).
+
+O tempo de banco vem de dois lugares (que também alimentam o `slow_query`):
+- `instrument_engine(engine)`: eventos do SQLAlchemy (consultas do app.py via sessão/engine);
+- `InstrumentedCursor`: envelope dos cursores pymysql emprestados por
+  `models.get_raw_connection` (rotas do web_app.py).
+
+Fora de uma requisição (telas Tk, threads de fundo) nada é contado.
+As estatísticas são por processo (cada worker do gunicorn tem as suas).
+"""
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+
+import config
+from slow_query import TimedCursor, observar
+
+request_logger = logging.getLogger('requests')
+
+
+def _atual():
+    """Métricas da requisição em andamento (None fora de uma requisição)."""
+    if not has_request_context():
+        return None
+    return g.get('_metricas')
+
+
+def registrar_consulta(duracao, linhas=0):
+    """Soma uma consulta à requisição atual."""
+    metricas = _atual()
+    if metricas is not None:
+        metricas['db'] += duracao
+        metricas['queries'] += 1
+        metricas['rows'] += linhas
+
+
+def _registrar_linhas(linhas):
+    metricas = _atual()
+    if metricas is not None:
+        metricas['rows'] += linhas
+
+
+class InstrumentedCursor(TimedCursor):
+    """Cursor medido (ver `slow_query.TimedCursor`) que também soma tempo e linhas à requisição atual."""
+
+    def _ao_executar(self, duracao):
+        registrar_consulta(duracao)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            _registrar_linhas(1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        _registrar_linhas(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        _registrar_linhas(len(rows))
+        return rows
+
+
+def instrument_engine(engine):
+    """Registra os eventos do SQLAlchemy que medem as consultas feitas pelo engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_inicio_consulta', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        duracao = time.perf_counter() - conn.info['_inicio_consulta'].pop()
+        # pymysql bufferiza o resultado: rowcount de um SELECT é o número de linhas lidas
+        linhas = cursor.rowcount if cursor.description is not None and cursor.rowcount > 0 else 0
+        registrar_consulta(duracao, linhas)
+        observar(statement, parameters, duracao, connection=getattr(cursor, 'connection', None),
+                 many=executemany)
+
+
+class EndpointStats:
+    """Amostras recentes (total, db, render, consultas, linhas) por endpoint, com percentis."""
+
+    def __init__(self, max_samples=500):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._amostras = defaultdict(lambda: deque(maxlen=self.max_samples))
+        self._contagem = defaultdict(int)
+
+    def add(self, endpoint, amostra):
+        with self._lock:
+            self._amostras[endpoint].append(amostra)
+            self._contagem[endpoint] += 1
+
+    @staticmethod
+    def _percentil(ordenados, p):
+        if not ordenados:
+            return 0.0
+        indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+        return ordenados[indice]
+
+    def snapshot(self):
+        with self._lock:
+            copia = {ep: list(amostras) for ep, amostras in self._amostras.items()}
+            contagem = dict(self._contagem)
+        resultado = {}
+        for endpoint, amostras in copia.items():
+            totais = sorted(a[0] for a in amostras)
+            n = len(amostras)
+            resultado[endpoint] = {
+                'requests': contagem[endpoint],
+                'samples': n,
+                'p50_ms': round(self._percentil(totais, 50), 2),
+                'p90_ms': round(self._percentil(totais, 90), 2),
+                'p99_ms': round(self._percentil(totais, 99), 2),
+                'max_ms': round(totais[-1], 2),
+                'db_avg_ms': round(sum(a[1] for a in amostras) / n, 2),
+                'render_avg_ms': round(sum(a[2] for a in amostras) / n, 2),
+                'queries_avg': round(sum(a[3] for a in amostras) / n, 2),
+                'rows_avg': round(sum(a[4] for a in amostras) / n, 2),
+            }
+        # Mais lentos (p90) primeiro
+        return dict(sorted(resultado.items(), key=lambda kv: kv[1]['p90_ms'], reverse=True))
+
+    def reset(self):
+        with self._lock:
+            self._amostras.clear()
+            self._contagem.clear()
+
+
+_stats = EndpointStats(config.METRICS_SAMPLES)
+
+
+def endpoint_stats():
+    """Percentis por endpoint das últimas requisições deste processo."""
+    return _stats.snapshot()
+
+
+def _antes_da_requisicao():
+    g._metricas = {'inicio': time.perf_counter(), 'db': 0.0, 'queries': 0, 'rows': 0,
+                   'render': 0.0, '_render_inicio': None}
+
+
+def _antes_do_template(sender, template, context, **extra):
+    metricas = _atual()
+    if metricas is not None:
+        metricas['_render_inicio'] = time.perf_counter()
+
+
+def _template_renderizado(sender, template, context, **extra):
+    metricas = _atual()
+    if metricas is not None and metricas['_render_inicio'] is not None:
+        metricas['render'] += time.perf_counter() - metricas['_render_inicio']
+        metricas['_render_inicio'] = None
+
+
+def _depois_da_requisicao(response):
+    metricas = g.pop('_metricas', None)
+    if metricas is None:
+        return response
+    total = (time.perf_counter() - metricas['inicio']) * 1000
+    db = metricas['db'] * 1000
+    render = metricas['render'] * 1000
+    app_ms = max(0.0, total - db - render)
+
+    response.headers.add('Server-Timing',
+                         f'db;dur={db:.1f};desc="{metricas["queries"]} queries, {metricas["rows"]} rows", '
+                         f'render;dur={render:.1f}, app;dur={app_ms:.1f}, total;dur={total:.1f}')
+
+    endpoint = request.endpoint or 'sem_endpoint'
+    if endpoint != 'static':
+        _stats.add(endpoint, (total, db, render, metricas['queries'], metricas['rows']))
+    request_logger.debug("%s %s %s total=%.1fms db=%.1fms queries=%d rows=%d", request.method,
+                         request.path, response.status_code, total, db, metricas['queries'], metricas['rows'])
+    return response
+
+
+def init_app(app):
+    """Liga a medição às requisições do `app` Flask."""
+    if not config.REQUEST_METRICS_ENABLED:
+        return
+    # Primeiro before_request da lista, para o tempo total incluir os demais (login, logs)
+    app.before_request_funcs.setdefault(None, []).insert(0, _antes_da_requisicao)
+    app.after_request(_depois_da_requisicao)
+    before_render_template.connect(_antes_do_template, app)
+    template_rendered.connect(_template_renderizado, app)
@@ -0,0 +1,326 @@
+# slow_query.py
+"""
+Log de consultas lentas com o plano (EXPLAIN) de cada uma.
+
+Toda consulta do sistema passa por aqui:
+- telas Tk: cursores de `db_pool.get_connection` (`TimedCursor`);
+- web_app.py: cursores de `models.get_raw_connection` (`request_metrics.InstrumentedCursor`);
+- app.py: eventos do engine SQLAlchemy (`request_metrics.instrument_engine`).
+
+Consultas que passam de `config.SLOW_QUERY_MS` são agrupadas pela "impressão
+digital" do SQL (literais e parâmetros trocados por `?`) e registradas com:
+tempo, formato dos parâmetros, local da chamada (arquivo:linha do código do
+sistema) e o EXPLAIN da primeira ocorrência (só SELECT, na mesma conexão).
+Planos com varredura completa (`type=ALL`), filesort ou tabela temporária
+são sinalizados.
+
+Cada ocorrência vira uma linha JSON em `config.SLOW_QUERY_FILE` (com rotação
+interna, um arquivo por processo, ver `log_setup.file_handler`). O relatório
+soma os arquivos de todos os processos (telas, workers):
+
+    python slow_query.py                 # lê config.SLOW_QUERY_FILE
+    python slow_query.py --top 10 outro.jsonl
+
+`slow_query_report()` devolve o mesmo agregado, só do processo atual
+(rota /metrics/slow-queries).
+"""
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+import pymysql
+
+import config
+from log_setup import file_handler
+
+logger = logging.getLogger('slow_query')
+
+# Módulos de infraestrutura ignorados ao procurar o local da chamada
+_INFRA = ('slow_query.py', 'request_metrics.py', 'db_pool.py', 'models.py', 'database.py',
+          'api_stream.py', 'http_cache.py', 'ref_cache.py', 'tk_worker.py')
+_INFRA_DIRS = ('site-packages', 'dist-packages', os.sep + 'lib' + os.sep + 'python')
+
+
+def fingerprint(sql):
+    """SQL normalizado: literais, números e parâmetros viram `?`, listas IN viram `(?+)`."""
+    s = re.sub(r"'(?:[^'\\]|\\.)*'", "?", sql)
+    s = re.sub(r"%\(\w+\)s|%s|:\w+", "?", s)
+    s = re.sub(r"(?<![\w.])-?\d+(?:\.\d+)?\b", "?", s)
+    s = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(?+)", s)
+    s = re.sub(r"/\*.*?\*/", " ", s, flags=re.S)
+    return re.sub(r"\s+", " ", s).strip().rstrip(';')
+
+
+def fingerprint_id(sql_normalizado):
+    return hashlib.sha1(sql_normalizado.encode('utf-8')).hexdigest()[:12]
+
+
+def params_shape(params, many=False):
+    """Formato dos parâmetros (tipos, não valores), ex.: 'str,int' ou 'many[3]:int,int'."""
+    if many:
+        params = list(params or [])
+        return f"many[{len(params)}]:" + (params_shape(params[0]) if params else '')
+    if params is None:
+        return ''
+    if isinstance(params, dict):
+        return ','.join(f"{k}={type(v).__name__}" for k, v in sorted(params.items()))
+    if isinstance(params, (list, tuple)):
+        return ','.join(type(v).__name__ for v in params)
+    return type(params).__name__
+
+
+def call_site():
+    """Primeiro quadro da pilha que pertence ao código do sistema (fora da infraestrutura)."""
+    for frame in reversed(traceback.extract_stack()):
+        nome = os.path.basename(frame.filename)
+        if nome in _INFRA or any(d in frame.filename for d in _INFRA_DIRS):
+            continue
+        return f"{nome}:{frame.lineno} {frame.name}"
+    return '?'
+
+
+def _resumir_plano(linhas):
+    """Resumo de cada linha do EXPLAIN e os alertas (varredura completa, filesort, temporária)."""
+    plano, alertas = [], []
+    for row in linhas:
+        tabela = row.get('table')
+        tipo = row.get('type')
+        extra = row.get('Extra') or ''
+        plano.append({'table': tabela, 'type': tipo, 'key': row.get('key'),
+                      'rows': row.get('rows'), 'filtered': row.get('filtered'), 'extra': extra})
+        if tipo == 'ALL':
+            alertas.append(f"varredura completa em {tabela} (~{row.get('rows')} linhas)")
+        if 'filesort' in extra:
+            alertas.append(f"filesort em {tabela}")
+        if 'temporary' in extra:
+            alertas.append(f"tabela temporária em {tabela}")
+    return plano, alertas
+
+
+def explain(connection, sql, params):
+    """EXPLAIN de um SELECT numa conexão pymysql (None se não for SELECT ou se falhar)."""
+    if not re.match(r"\s*(\(\s*)?(SELECT|WITH)\b", sql, re.I):
+        return None
+    try:
+        with connection.cursor(pymysql.cursors.DictCursor) as cursor:
+            cursor.execute("EXPLAIN " + sql, params)
+            return _resumir_plano(cursor.fetchall())
+    except Exception as e:
+        return [], [f"EXPLAIN falhou: {e}"]
+
+
+class SlowQueryLog:
+    """Agregado das consultas lentas deste processo, por impressão digital."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._consultas = {}
+
+    def add(self, evento):
+        with self._lock:
+            item = self._consultas.get(evento['id'])
+            if item is None:
+                item = self._consultas[evento['id']] = {
+                    'id': evento['id'], 'sql': evento['sql'], 'count': 0, 'total_ms': 0.0,
+                    'max_ms': 0.0, 'call_sites': Counter(), 'params': Counter(),
+                    'plan': None, 'alerts': [],
+                }
+            _somar(item, evento)
+
+    def has_plan(self, fp_id):
+        with self._lock:
+            item = self._consultas.get(fp_id)
+            return item is not None and item['plan'] is not None
+
+    def report(self, top=20):
+        with self._lock:
+            itens = [dict(item, call_sites=dict(item['call_sites']), params=dict(item['params']))
+                     for item in self._consultas.values()]
+        return _ordenar(itens, top)
+
+
+def _somar(item, evento):
+    item['count'] += 1
+    item['total_ms'] += evento['ms']
+    item['max_ms'] = max(item['max_ms'], evento['ms'])
+    item['call_sites'][evento['site']] += 1
+    item['params'][evento['params']] += 1
+    if evento.get('plan') is not None and item['plan'] is None:
+        item['plan'], item['alerts'] = evento['plan'], evento['alerts']
+
+
+def _ordenar(itens, top):
+    for item in itens:
+        item['avg_ms'] = round(item['total_ms'] / item['count'], 1)
+        item['total_ms'] = round(item['total_ms'], 1)
+        item['max_ms'] = round(item['max_ms'], 1)
+    itens.sort(key=lambda i: i['total_ms'], reverse=True)
+    return itens[:top]
+
+
+_log = SlowQueryLog()
+_arquivo = None
+_arquivo_lock = threading.Lock()
+
+
+def _logger_arquivo():
+    """Logger que grava uma linha JSON por ocorrência em `config.SLOW_QUERY_FILE`."""
+    global _arquivo
+    if _arquivo is None:
+        with _arquivo_lock:
+            if _arquivo is None:
+                arquivo = logging.getLogger('slow_query.eventos')
+                arquivo.propagate = False
+                try:
+                    handler = file_handler(config.SLOW_QUERY_FILE)
+                    handler.setFormatter(logging.Formatter('%(message)s'))
+                    arquivo.addHandler(handler)
+                except OSError as e:
+                    logger.warning("Não foi possível abrir %s: %s", config.SLOW_QUERY_FILE, e)
+                arquivo.setLevel(logging.INFO)
+                _arquivo = arquivo
+    return _arquivo
+
+
+def observar(sql, params, duracao, connection=None, many=False, explicavel=True):
+    """Registra a consulta se `duracao` (s) passou do limite. `connection` permite o EXPLAIN."""
+    ms = duracao * 1000
+    if not config.SLOW_QUERY_ENABLED or ms < config.SLOW_QUERY_MS or not isinstance(sql, str):
+        return
+    try:
+        normalizado = fingerprint(sql)
+        fp_id = fingerprint_id(normalizado)
+        evento = {
+            'ts': time.time(), 'pid': os.getpid(), 'id': fp_id, 'ms': round(ms, 1),
+            'sql': normalizado, 'params': params_shape(params, many), 'site': call_site(),
+            'plan': None, 'alerts': [],
+        }
+        # EXPLAIN só na primeira vez que a consulta aparece neste processo
+        if (config.SLOW_QUERY_EXPLAIN and explicavel and not many and connection is not None
+                and not _log.has_plan(fp_id)):
+            resultado = explain(connection, sql, params)
+            if resultado is not None:
+                evento['plan'], evento['alerts'] = resultado
+        _log.add(evento)
+
+        logger.warning("Consulta lenta %.0f ms [%s] em %s: %s%s", ms, fp_id, evento['site'],
+                       normalizado[:300], (" | " + "; ".join(evento['alerts'])) if evento['alerts'] else '')
+        _logger_arquivo().info(json.dumps(evento, ensure_ascii=False, default=str))
+    except Exception as e:
+        # O log de consultas lentas nunca pode derrubar a consulta em si
+        logger.debug("Falha ao registrar consulta lenta: %s", e)
+
+
+class TimedCursor:
+    """Envelope de um cursor pymysql que mede execute/executemany e repassa ao log de consultas lentas."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _ao_executar(self, duracao):
+        """Gancho para subclasses (ex.: métricas por requisição)."""
+
+    def _medir(self, metodo, query, args, many):
+        inicio = time.perf_counter()
+        try:
+            return metodo(query, args)
+        finally:
+            duracao = time.perf_counter() - inicio
+            self._ao_executar(duracao)
+            # Cursores sem buffer ainda estão lendo o resultado: EXPLAIN na mesma conexão não é possível
+            explicavel = not isinstance(self._cursor, pymysql.cursors.SSCursor)
+            observar(query, args, duracao, connection=getattr(self._cursor, 'connection', None),
+                     many=many, explicavel=explicavel)
+
+    def execute(self, query, args=None):
+        return self._medir(self._cursor.execute, query, args, False)
+
+    def executemany(self, query, args):
+        return self._medir(self._cursor.executemany, query, args, True)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+
+def slow_query_report(top=20):
+    """Consultas lentas deste processo, da maior soma de tempo para a menor."""
+    return _log.report(top)
+
+
+def _arquivos(path):
+    """`path`, os arquivos por processo (`base.<pid>.jsonl`) e as rotações de cada um."""
+    base, ext = os.path.splitext(glob.escape(path))
+    padroes = (glob.escape(path), glob.escape(path) + '.*', f"{base}.*{ext}", f"{base}.*{ext}.*")
+    return sorted({arquivo for padrao in padroes for arquivo in glob.glob(padrao)})
+
+
+def report_from_file(path, top=20):
+    """Agrega as linhas JSON gravadas por todos os processos em `path`."""
+    itens = {}
+    for arquivo in _arquivos(path):
+        with open(arquivo, encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    evento = json.loads(linha)
+                except ValueError:
+                    continue
+                item = itens.get(evento['id'])
+                if item is None:
+                    item = itens[evento['id']] = {
+                        'id': evento['id'], 'sql': evento['sql'], 'count': 0, 'total_ms': 0.0,
+                        'max_ms': 0.0, 'call_sites': Counter(), 'params': Counter(),
+                        'plan': None, 'alerts': [],
+                    }
+                _somar(item, evento)
+    return _ordenar(list(itens.values()), top)
+
+
+def format_report(itens):
+    """Relatório em texto, uma seção por consulta."""
+    if not itens:
+        return "Nenhuma consulta lenta registrada."
+    partes = []
+    for n, item in enumerate(itens, 1):
+        partes.append(f"{n}. [{item['id']}] {item['count']}x  total {item['total_ms']:.0f} ms  "
+                      f"média {item['avg_ms']:.0f} ms  máx {item['max_ms']:.0f} ms")
+        partes.append(f"   {item['sql'][:500]}")
+        for site, qtd in Counter(item['call_sites']).most_common(5):
+            partes.append(f"   chamada: {site} ({qtd}x)")
+        for alerta in item['alerts']:
+            partes.append(f"   ALERTA: {alerta}")
+        for passo in item['plan'] or []:
+            partes.append(f"   plano: {passo['table']} type={passo['type']} key={passo['key']} "
+                          f"rows={passo['rows']} {passo['extra']}")
+        partes.append("")
+    return "\n".join(partes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relatório das consultas lentas registradas.")
+    parser.add_argument('arquivo', nargs='?', default=config.SLOW_QUERY_FILE)
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args(argv)
+    print(format_report(report_from_file(args.arquivo, args.top)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,290 @@
+# status_tr.py
+"""
+Status automático das TRs (pedidos_tr) a partir do status de produção dos
+itens vinculados (cliente_item.status_producao).
+
+As regras, por prioridade:
+  1. algum item 'Aguardando Programação'            -> EM PROGRAMAÇÃO
+  2. algum item 'Aguardando PCP'                    -> A INICIAR PRODUÇÃO
+  3. algum item 'Em Produção' / 'Produzindo'        -> PRODUZINDO
+  4. algum 'Produção Finalizada' / 'Esperando Qualidade' -> ESPERANDO QUALIDADE
+  5. algum 'Liberado para Expedição' / 'Pátio'      -> PATIO
+  6. todos os itens 'Entregue'                      -> ENTREGUE
+  7. todos os itens 'Cancelada'                     -> CANCELADA
+  senão a TR fica como está.
+
+`novo_status_tr` aplica as regras em Python. `REGRAS_STATUS_TR` é a mesma
+tabela de regras gravada no banco (`status_tr_regra`, migração 5), de onde
+`atualizar_status_tr` recalcula e grava o status de todas as TRs num único
+UPDATE. `test_status_tr.py` verifica que as duas formas dão o mesmo resultado.
+
+Quem altera ou exclui itens de cliente_item chama
+`atualizar_status_tr_dos_itens(cursor, ids)` antes do commit: só as TRs
+vinculadas a esses itens são recalculadas, e o status fica em dia sem
+esperar a varredura completa da tela da Trilhadeira.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+ACENTOS = {'á': 'a', 'ã': 'a', 'ç': 'c', 'é': 'e', 'ê': 'e', 'í': 'i', 'ó': 'o', 'õ': 'o', 'ú': 'u'}
+
+# (chave normalizada do status do item, status da TR, prioridade, regra)
+# regra 'qualquer': basta um item com o status; 'todos': todos os itens com o status
+REGRAS_STATUS_TR = [
+    ('aguardando-programacao', 'EM PROGRAMAÇÃO', 1, 'qualquer'),
+    ('aguardando-pcp', 'A INICIAR PRODUÇÃO', 2, 'qualquer'),
+    ('em-producao', 'PRODUZINDO', 3, 'qualquer'),
+    ('produzindo', 'PRODUZINDO', 3, 'qualquer'),
+    ('producao-finalizada', 'ESPERANDO QUALIDADE', 4, 'qualquer'),
+    ('esperando-qualidade', 'ESPERANDO QUALIDADE', 4, 'qualquer'),
+    ('liberado-para-expedicao', 'PATIO', 5, 'qualquer'),
+    ('patio', 'PATIO', 5, 'qualquer'),
+    ('entregue', 'ENTREGUE', 6, 'todos'),
+    ('cancelada', 'CANCELADA', 7, 'todos'),
+]
+
+
+def normalize_status_key(s):
+    """'Aguardando Programação' -> 'aguardando-programacao'."""
+    if not s: return ''
+    s = str(s).strip().lower()
+    for old, new in ACENTOS.items():
+        s = s.replace(old, new)
+    s = s.replace(' ', '-')
+    return s
+
+
+def novo_status_tr(status_atual, status_itens):
+    """
+    Status a gravar na TR, ou None se ela deve ficar como está.
+    `status_itens` são os status de produção dos itens vinculados (vazios são ignorados).
+    """
+    status_itens = [s for s in status_itens if s]
+    # Uma TR sem itens com status não tem o seu alterado
+    if not status_itens:
+        return None
+
+    norm_statuses = {normalize_status_key(s) for s in status_itens}
+    novo = status_atual
+
+    # A ordem dos 'if/elif' define a prioridade
+    if 'aguardando-programacao' in norm_statuses:
+        novo = 'EM PROGRAMAÇÃO'
+    elif 'aguardando-pcp' in norm_statuses:
+        novo = 'A INICIAR PRODUÇÃO'
+    elif 'em-producao' in norm_statuses or 'produzindo' in norm_statuses:
+        novo = 'PRODUZINDO'
+    elif 'producao-finalizada' in norm_statuses or 'esperando-qualidade' in norm_statuses:
+        novo = 'ESPERANDO QUALIDADE'
+    elif 'liberado-para-expedicao' in norm_statuses or 'patio' in norm_statuses:
+        novo = 'PATIO'
+    elif norm_statuses == {'entregue'}:
+        novo = 'ENTREGUE'
+    elif norm_statuses == {'cancelada'}:
+        novo = 'CANCELADA'
+
+    if novo and (status_atual is None or novo.strip().upper() != status_atual.strip().upper()):
+        return novo
+    return None
+
+
+# --- Versão em SQL (tabela status_tr_regra) ---
+
+_STRIP = "REGEXP_REPLACE({}, '^[[:space:]]+|[[:space:]]+$', '')"
+
+
+def _binario(expr):
+    # Comparação exata: as collations *_ai_ci igualariam 'pátio' e 'patio'
+    return f"CONVERT({expr} USING utf8mb4) COLLATE utf8mb4_bin"
+
+
+def chave_sql(coluna):
+    """Expressão SQL equivalente a `normalize_status_key(coluna)`."""
+    expr = f"LOWER({_STRIP.format(_binario(coluna))})"
+    for old, new in ACENTOS.items():
+        expr = f"REPLACE({expr}, '{old}', '{new}')"
+    return f"REPLACE({expr}, ' ', '-')"
+
+
+STATUS_TR_REGRA_DDL = """
+    chave VARCHAR(60) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL PRIMARY KEY,
+    status_tr VARCHAR(60) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+    prioridade INT NOT NULL,
+    regra ENUM('qualquer', 'todos') NOT NULL
+"""
+
+SEED_STATUS_TR_REGRA = (
+    "INSERT INTO status_tr_regra (chave, status_tr, prioridade, regra) VALUES\n    "
+    + ",\n    ".join(f"('{chave}', '{status}', {prioridade}, '{regra}')"
+                     for chave, status, prioridade, regra in REGRAS_STATUS_TR)
+    + "\nON DUPLICATE KEY UPDATE status_tr = VALUES(status_tr), prioridade = VALUES(prioridade), "
+      "regra = VALUES(regra)"
+)
+
+# Para cada TR: status distintos (normalizados) dos itens -> regras aplicáveis
+# ('todos' só quando há um único status) -> a de menor prioridade vence.
+# Só as TRs cujo status muda são gravadas.
+def _rollup_sql(filtro=''):
+    return f"""
+    UPDATE pedidos_tr pt
+    JOIN (
+        SELECT s.idpedidos_tr,
+               SUBSTRING(MIN(CONCAT(LPAD(r.prioridade, 4, '0'), r.status_tr)), 5) AS novo_status
+        FROM (
+            SELECT d.idpedidos_tr, d.chave, COUNT(*) OVER (PARTITION BY d.idpedidos_tr) AS n
+            FROM (
+                SELECT DISTINCT v.idpedidos_tr, {chave_sql('ci.status_producao')} AS chave
+                FROM pedidos_tr_vinculo v
+                JOIN cliente_item ci ON ci.id_item = v.id_item
+                WHERE ci.status_producao IS NOT NULL AND CHAR_LENGTH(ci.status_producao) > 0{filtro}
+            ) d
+        ) s
+        JOIN status_tr_regra r ON r.chave = s.chave AND (r.regra = 'qualquer' OR s.n = 1)
+        GROUP BY s.idpedidos_tr
+    ) x ON x.idpedidos_tr = pt.idpedidos_tr
+    SET pt.status = x.novo_status
+    WHERE pt.status IS NULL
+       OR UPPER({_STRIP.format(_binario('pt.status'))}) <> x.novo_status
+"""
+
+
+ROLLUP_SQL = _rollup_sql()
+
+# TRs vinculadas a uma lista de itens (índice idx_pedidos_tr_vinculo_item)
+_TRS_DOS_ITENS = "v.idpedidos_tr IN (SELECT idpedidos_tr FROM pedidos_tr_vinculo WHERE id_item IN ({}))"
+
+
+def atualizar_status_tr(cursor):
+    """Recalcula e grava o status de todas as TRs numa única instrução; retorna as TRs alteradas."""
+    cursor.execute(ROLLUP_SQL)
+    return cursor.rowcount
+
+
+def aplicar_regras(cursor, rows):
+    """
+    Aplica `novo_status_tr` às linhas (idpedidos_tr, current_tr_status, status_producao)
+    e grava as TRs que mudaram; retorna quantas. Usado enquanto a migração 5 não foi aplicada.
+    """
+    por_tr = {}
+    for row in rows:
+        tr = por_tr.setdefault(row['idpedidos_tr'], {'atual': row['current_tr_status'], 'itens': []})
+        tr['itens'].append(row['status_producao'])
+    updates = []
+    for id_tr, tr in por_tr.items():
+        novo = novo_status_tr(tr['atual'], tr['itens'])
+        if novo:
+            updates.append((novo, id_tr))
+    if updates:
+        cursor.executemany("UPDATE pedidos_tr SET status = %s WHERE idpedidos_tr = %s", updates)
+    return len(updates)
+
+
+_tabelas = {}  # tabelas das migrações já encontradas (a ausência é verificada de novo a cada chamada)
+
+
+def _tem_tabela(cursor, nome):
+    if not _tabelas.get(nome):
+        cursor.execute("""
+            SELECT 1 FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (nome,))
+        _tabelas[nome] = cursor.fetchone() is not None
+    return _tabelas[nome]
+
+
+# Pares (TR, item) lidos de `pedidos_tr.vinculos_item` ("12;15;18"), só de itens existentes
+_VINCULOS_DA_COLUNA = """
+    SELECT pt.idpedidos_tr, ci.id_item
+    FROM pedidos_tr pt
+    JOIN JSON_TABLE(
+        CONCAT('["', REPLACE(REPLACE(pt.vinculos_item, ' ', ''), ';', '","'), '"]'),
+        '$[*]' COLUMNS (id VARCHAR(20) PATH '$')
+    ) AS j
+    JOIN cliente_item ci ON ci.id_item = CAST(j.id AS UNSIGNED)
+    WHERE pt.vinculos_item IS NOT NULL AND pt.vinculos_item != ''
+      AND j.id REGEXP '^[0-9]+$'
+"""
+
+# Cópia inicial para `pedidos_tr_vinculo` (migração 4): só as TRs que ainda não têm linhas lá
+BACKFILL_VINCULOS_TR = (
+    "INSERT IGNORE INTO pedidos_tr_vinculo (idpedidos_tr, id_item)" + _VINCULOS_DA_COLUNA +
+    "      AND NOT EXISTS (SELECT 1 FROM pedidos_tr_vinculo v WHERE v.idpedidos_tr = pt.idpedidos_tr)\n"
+)
+
+# TRs cujo vinculos_item não bate com as linhas de pedidos_tr_vinculo (gravadas ou
+# alteradas por quem só conhece a coluna antiga, ex.: o sistema PHP)
+_TRS_DIVERGENTES = f"""
+    SELECT pt.idpedidos_tr
+    FROM pedidos_tr pt
+    LEFT JOIN (
+        SELECT c.idpedidos_tr, GROUP_CONCAT(DISTINCT c.id_item ORDER BY c.id_item) AS ids
+        FROM ({_VINCULOS_DA_COLUNA}) AS c
+        GROUP BY c.idpedidos_tr
+    ) AS col ON col.idpedidos_tr = pt.idpedidos_tr
+    LEFT JOIN (
+        SELECT idpedidos_tr, GROUP_CONCAT(id_item ORDER BY id_item) AS ids
+        FROM pedidos_tr_vinculo
+        GROUP BY idpedidos_tr
+    ) AS tab ON tab.idpedidos_tr = pt.idpedidos_tr
+    WHERE NOT (col.ids <=> tab.ids)
+"""
+
+
+def sincronizar_vinculos_tr(cursor):
+    """
+    Regrava em pedidos_tr_vinculo os vínculos das TRs cuja coluna vinculos_item
+    mudou por fora. Só lê enquanto tudo confere; retorna quantas TRs foram regravadas.
+    """
+    cursor.execute(_TRS_DIVERGENTES)
+    ids_trs = [row['idpedidos_tr'] for row in cursor.fetchall()]
+    if not ids_trs:
+        return 0
+    placeholders = ','.join(['%s'] * len(ids_trs))
+    cursor.execute(f"DELETE FROM pedidos_tr_vinculo WHERE idpedidos_tr IN ({placeholders})", ids_trs)
+    cursor.execute("INSERT IGNORE INTO pedidos_tr_vinculo (idpedidos_tr, id_item)" + _VINCULOS_DA_COLUNA +
+                   f"      AND pt.idpedidos_tr IN ({placeholders})", ids_trs)
+    return len(ids_trs)
+
+
+def atualizar_status_tr_dos_itens(cursor, ids_itens):
+    """
+    Recalcula só as TRs vinculadas aos itens `ids_itens`. Chamar com o cursor da
+    alteração/exclusão dos itens, antes do commit. Retorna as TRs alteradas
+    (0 sem a migração 4; falhas vão para o log e não desfazem a alteração).
+    """
+    ids_itens = list(dict.fromkeys(i for i in ids_itens if i is not None))
+    if not ids_itens:
+        return 0
+    try:
+        if not _tem_tabela(cursor, 'pedidos_tr_vinculo'):
+            return 0
+        filtro = _TRS_DOS_ITENS.format(','.join(['%s'] * len(ids_itens)))
+        if _tem_tabela(cursor, 'status_tr_regra'):
+            cursor.execute(_rollup_sql(' AND ' + filtro), ids_itens)
+            return cursor.rowcount
+        cursor.execute(f"""
+            SELECT pt.idpedidos_tr, pt.status AS current_tr_status, ci.status_producao
+            FROM pedidos_tr_vinculo v
+            JOIN pedidos_tr pt ON pt.idpedidos_tr = v.idpedidos_tr
+            JOIN cliente_item ci ON ci.id_item = v.id_item
+            WHERE {filtro}
+            GROUP BY pt.idpedidos_tr, pt.status, ci.status_producao
+        """, ids_itens)
+        return aplicar_regras(cursor, cursor.fetchall())
+    except Exception as e:
+        logger.warning("Falha ao atualizar o status das TRs dos itens %s: %s", ids_itens, e)
+        return 0
+
+
+def atualizar_status_tr_itens_excluidos(cursor, ids_itens):
+    """Após excluir itens de cliente_item: recalcula as TRs deles e remove os vínculos órfãos."""
+    alteradas = atualizar_status_tr_dos_itens(cursor, ids_itens)
+    ids_itens = [i for i in ids_itens if i is not None]
+    if ids_itens and _tabelas.get('pedidos_tr_vinculo'):
+        try:
+            placeholders = ','.join(['%s'] * len(ids_itens))
+            cursor.execute(f"DELETE FROM pedidos_tr_vinculo WHERE id_item IN ({placeholders})", ids_itens)
+        except Exception as e:
+            logger.warning("Falha ao remover os vínculos de TR dos itens %s: %s", ids_itens, e)
+    return alteradas
@@ -0,0 +1,164 @@
+# test_corte_barras.py
+"""
+Planos de corte de barras (corte_barras.py) em instâncias aleatórias.
+
+    python -m pytest test_corte_barras.py
+
+Em todas as estratégias: nenhuma barra passa do comprimento (com o kerf entre
+as peças) e as peças do plano são exatamente as pedidas. O FFD dá o mesmo
+plano que a varredura linear antiga; `otimo` só vale quando o número de
+barras é de fato o mínimo; `otimizar_estoque` respeita as quantidades do
+estoque e dos retalhos.
+"""
+import random
+from collections import Counter
+
+import pytest
+
+import corte_barras
+from corte_barras import EPS, ESTRATEGIAS, otimizar, otimizar_estoque
+
+
+def _instancias(n, semente, max_tipos=6, max_qtd=6):
+    rng = random.Random(semente)
+    for _ in range(n):
+        barra = rng.choice([6000, 3000, 1000])
+        kerf = rng.choice([0, 3, 5])
+        pecas = [(rng.randint(50, barra), rng.randint(1, max_qtd)) for _ in range(rng.randint(1, max_tipos))]
+        yield barra, pecas, kerf
+
+
+def _pedidas(pecas):
+    pedidas = Counter()
+    for comprimento, quantidade in pecas:
+        pedidas[comprimento] += quantidade
+    return pedidas
+
+
+def _conferir(resultado, pecas, kerf):
+    cortadas = Counter()
+    for barra in resultado['barras']:
+        usado = sum(barra['pecas']) + (len(barra['pecas']) - 1) * kerf
+        assert usado <= barra['comprimento_total'] + EPS, barra
+        assert barra['comprimento_restante'] == pytest.approx(barra['comprimento_total'] - usado)
+        cortadas.update(barra['pecas'])
+    assert cortadas == _pedidas(pecas)
+
+
+def _ffd_linear(comprimento_barra, pecas, kerf):
+    """O algoritmo antigo: cada peça, da maior para a menor, na primeira barra aberta onde cabe."""
+    barras = []  # [sobra, peças]
+    for peca in sorted((c for c, q in pecas for _ in range(q)), reverse=True):
+        for barra in barras:
+            necessario = peca + (kerf if barra[1] else 0)
+            if barra[0] >= necessario:
+                barra[1].append(peca)
+                barra[0] -= necessario
+                break
+        else:
+            barras.append([comprimento_barra - peca, [peca]])
+    return [sorted(pecas_barra, reverse=True) for _, pecas_barra in barras]
+
+
+def _minimo_de_barras(comprimento_barra, pecas, kerf):
+    """Força bruta (instâncias pequenas): menor número de barras."""
+    capacidade = comprimento_barra + kerf
+    tamanhos = sorted((c + kerf for c, q in pecas for _ in range(q)), reverse=True)
+    melhor = [len(tamanhos)]
+
+    def colocar(i, sobras):
+        if len(sobras) >= melhor[0]:
+            return
+        if i == len(tamanhos):
+            melhor[0] = len(sobras)
+            return
+        vistas = set()
+        for j, sobra in enumerate(sobras):
+            if sobra >= tamanhos[i] - EPS and sobra not in vistas:
+                vistas.add(sobra)
+                sobras[j] -= tamanhos[i]
+                colocar(i + 1, sobras)
+                sobras[j] += tamanhos[i]
+        sobras.append(capacidade - tamanhos[i])
+        colocar(i + 1, sobras)
+        sobras.pop()
+
+    colocar(0, [])
+    return melhor[0]
+
+
+@pytest.mark.parametrize('estrategia', list(ESTRATEGIAS))
+def test_barras_no_limite_e_pecas_preservadas(estrategia):
+    for barra, pecas, kerf in _instancias(150, semente=1):
+        _conferir(otimizar(barra, pecas, kerf, estrategia, limite_tempo=1), pecas, kerf)
+
+
+def test_ffd_igual_a_varredura_linear_antiga():
+    for barra, pecas, kerf in _instancias(300, semente=2):
+        plano = [b['pecas'] for b in otimizar(barra, pecas, kerf, 'ffd')['barras']]
+        assert plano == _ffd_linear(barra, pecas, kerf), (barra, pecas, kerf)
+
+
+def test_exato_nunca_pior_que_as_heuristicas():
+    for barra, pecas, kerf in _instancias(80, semente=3):
+        exato = otimizar(barra, pecas, kerf, 'exato', limite_tempo=1)['resumo']['barras_necessarias']
+        for heuristica in ('ffd', 'bfd'):
+            assert exato <= otimizar(barra, pecas, kerf, heuristica)['resumo']['barras_necessarias']
+
+
+def test_otimo_confere_com_a_forca_bruta():
+    for barra, pecas, kerf in _instancias(150, semente=4, max_tipos=4, max_qtd=3):
+        for estrategia in ESTRATEGIAS:
+            resumo = otimizar(barra, pecas, kerf, estrategia, limite_tempo=2)['resumo']
+            if resumo['otimo']:
+                assert resumo['barras_necessarias'] == _minimo_de_barras(barra, pecas, kerf), (pecas, kerf)
+
+
+def test_padroes_cortados_nao_provam_otimo(monkeypatch):
+    """Com um padrão por nível a busca não é completa: `otimo` não pode ser afirmado à toa."""
+    monkeypatch.setattr(corte_barras, 'MAX_PADROES_POR_BARRA', 1)
+    # A busca cortada fica em 5 barras; o mínimo é 4
+    resumo = otimizar(1000, [(383, 3), (358, 3), (400, 2), (245, 3)], 0, 'exato', limite_tempo=1)['resumo']
+    assert (resumo['barras_necessarias'], resumo['otimo']) == (5, False)
+
+    rng = random.Random(5)
+    for _ in range(300):
+        pecas = [(rng.randint(150, 600), rng.randint(1, 3)) for _ in range(rng.randint(3, 4))]
+        resumo = otimizar(1000, pecas, 0, 'exato', limite_tempo=1)['resumo']
+        if resumo['otimo']:
+            assert resumo['barras_necessarias'] == _minimo_de_barras(1000, pecas, 0), pecas
+
+
+@pytest.mark.parametrize('estrategia', list(ESTRATEGIAS))
+def test_estoque_e_retalhos_respeitam_as_quantidades(estrategia):
+    rng = random.Random(6)
+    for _ in range(60):
+        kerf = rng.choice([0, 3])
+        pecas = [(rng.randint(100, 2500), rng.randint(1, 5)) for _ in range(rng.randint(1, 5))]
+        estoque = [(3000, rng.randint(0, 4)), (6000, rng.randint(0, 3)), (12000, None)]
+        retalhos = [{'id': i, 'comprimento': rng.randint(300, 2800), 'quantidade': rng.randint(1, 3)}
+                    for i in range(rng.randint(0, 4))]
+
+        resultado = otimizar_estoque(estoque, pecas, kerf, estrategia, limite_tempo=0.5,
+                                     retalhos=retalhos, sobra_minima=300)
+
+        _conferir(resultado, pecas, kerf)
+        novas = Counter(b['comprimento_total'] for b in resultado['barras'] if b['retalho'] is None)
+        for comprimento, quantidade in estoque:
+            assert quantidade is None or novas[comprimento] <= quantidade, (comprimento, novas)
+        usados = Counter(b['retalho']['id'] for b in resultado['barras'] if b['retalho'] is not None)
+        for retalho in retalhos:
+            assert usados[retalho['id']] <= retalho['quantidade']
+        for barra in resultado['barras']:
+            if barra['retalho'] is not None:
+                assert barra['comprimento_total'] == barra['retalho']['comprimento']
+        assert sorted(resultado['resumo']['retalhos_consumidos'], key=lambda r: r['id']) == \
+            sorted((b['retalho'] for b in resultado['barras'] if b['retalho'] is not None), key=lambda r: r['id'])
+        assert len(resultado['resumo']['novos_retalhos']) == sum(b['novo_retalho'] for b in resultado['barras'])
+
+
+def test_estoque_insuficiente():
+    with pytest.raises(ValueError):
+        otimizar_estoque([(6000, 1)], [(4000, 2)], 3)
+    with pytest.raises(ValueError):
+        otimizar_estoque([(3000, None)], [(4000, 1)], 3)
@@ -0,0 +1,204 @@
+# test_encaixe_chapas.py
+"""
+Encaixe de peças em chapas (encaixe_chapas.py) em instâncias aleatórias.
+
+    python -m pytest test_encaixe_chapas.py
+
+Para cada estratégia de `ESTRATEGIAS`: toda peça é colocada ou volta em
+`nao_couberam`, as peças ficam dentro da chapa e não se sobrepõem contando o
+espaço entre elas; o 'auto' nunca fica pior que a guilhotina. A
+`busca_paralela` (um processo, semente fixa) devolve um encaixe válido,
+nunca pior que o `encaixar`, só avisa melhoras e para com `parar`.
+
+No modo 'serra', a sequência de cortes (`chapa['cortes']`): fases em ordem,
+cada corte depois dos que delimitam as pontas dele, nenhum corte pela peça e
+o kerf exato entre peças vizinhas.
+"""
+import random
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from encaixe_chapas import ESTRATEGIAS, _custo, busca_paralela, encaixar
+
+CHAPAS = [(3000, 1200), (2750, 1850), (1000, 1000)]
+
+
+def _instancias(n, semente):
+    rng = random.Random(semente)
+    for _ in range(n):
+        chapa_w, chapa_h = rng.choice(CHAPAS)
+        espaco = rng.choice([0, 3, 5])
+        pecas = []
+        for tipo in range(rng.randint(1, 7)):
+            w, h = rng.randint(40, chapa_w), rng.randint(40, chapa_h)
+            if rng.random() < 0.1:
+                w = chapa_w + rng.randint(1, 200)  # não cabe em chapa nenhuma
+            pecas += [{'id': tipo + 1, 'largura': w, 'altura': h}] * rng.randint(1, 8)
+        yield pecas, chapa_w, chapa_h, espaco
+
+
+def _medidas(peca):
+    return peca['id'], tuple(sorted((peca['largura'], peca['altura'])))
+
+
+def _sobrepoem(a, b, espaco):
+    """Os retângulos de `a` e `b` ficam a menos de `espaco` um do outro (ou se cruzam)."""
+    return (a['x'] < b['x'] + b['largura'] + espaco and b['x'] < a['x'] + a['largura'] + espaco
+            and a['y'] < b['y'] + b['altura'] + espaco and b['y'] < a['y'] + a['altura'] + espaco)
+
+
+def _conferir(chapas, nao_couberam, pecas, chapa_w, chapa_h, espaco):
+    colocadas = [p for chapa in chapas for p in chapa['pecas_colocadas']]
+    assert Counter(map(_medidas, colocadas + nao_couberam)) == Counter(map(_medidas, pecas))
+    for peca in nao_couberam:
+        assert not (min(peca['largura'], peca['altura']) <= min(chapa_w, chapa_h)
+                    and max(peca['largura'], peca['altura']) <= max(chapa_w, chapa_h)), peca
+    for chapa in chapas:
+        assert chapa['pecas_colocadas']
+        pecas_chapa = chapa['pecas_colocadas']
+        for p in pecas_chapa:
+            assert p['x'] >= 0 and p['y'] >= 0, p
+            assert p['x'] + p['largura'] <= chapa_w and p['y'] + p['altura'] <= chapa_h, p
+        for i, a in enumerate(pecas_chapa):
+            for b in pecas_chapa[i + 1:]:
+                assert not _sobrepoem(a, b, espaco), (a, b)
+
+
+@pytest.mark.parametrize('estrategia', list(ESTRATEGIAS))
+def test_pecas_dentro_da_chapa_sem_sobreposicao(estrategia):
+    for pecas, chapa_w, chapa_h, espaco in _instancias(40, semente=1):
+        chapas, nao_couberam, nome = encaixar(pecas, chapa_w, chapa_h, espaco, estrategia)
+        assert nome in ESTRATEGIAS and nome != 'auto'
+        _conferir(chapas, nao_couberam, pecas, chapa_w, chapa_h, espaco)
+
+
+def test_auto_nunca_pior_que_guilhotina():
+    for pecas, chapa_w, chapa_h, espaco in _instancias(40, semente=2):
+        auto, _, _ = encaixar(pecas, chapa_w, chapa_h, espaco, 'auto')
+        guilhotina, _, _ = encaixar(pecas, chapa_w, chapa_h, espaco, 'guilhotina')
+        assert len(auto) <= len(guilhotina)
+        assert _custo(auto) <= _custo(guilhotina)
+
+
+# --- Multi-start (busca_paralela) ---
+
+def _instancia_media():
+    rng = random.Random(7)
+    pecas = [{'id': i, 'largura': rng.randint(150, 900), 'altura': rng.randint(150, 700)}
+             for i in range(40)]
+    return pecas, 3000, 1200, 3
+
+
+def test_busca_paralela_valida_e_nunca_pior_que_encaixar():
+    pecas, chapa_w, chapa_h, espaco = _instancia_media()
+    custos = []
+    chapas, nao_couberam, nome = busca_paralela(
+        pecas, chapa_w, chapa_h, espaco, limite_tempo=0.5, processos=1, semente=11,
+        ao_melhorar=lambda chapas, *_: custos.append(_custo(chapas)))
+
+    assert nome in ESTRATEGIAS and nome != 'auto'
+    _conferir(chapas, nao_couberam, pecas, chapa_w, chapa_h, espaco)
+    inicial, _, _ = encaixar(pecas, chapa_w, chapa_h, espaco)
+    assert _custo(chapas) <= _custo(inicial)
+    # O primeiro aviso é o próprio encaixar; os seguintes, só melhoras estritas
+    assert custos and custos[0] == _custo(inicial)
+    assert all(depois < antes for antes, depois in zip(custos, custos[1:]))
+    assert custos[-1] == _custo(chapas)
+
+
+def test_busca_paralela_para_quando_pedido():
+    pecas, chapa_w, chapa_h, espaco = _instancia_media()
+    parar = threading.Event()
+    parar.set()
+    inicio = time.monotonic()
+    chapas, nao_couberam, _ = busca_paralela(pecas, chapa_w, chapa_h, espaco, limite_tempo=30,
+                                             processos=1, semente=11, parar=parar)
+    # Só o lote já enviado termina (DURACAO_LOTE), muito antes do limite
+    assert time.monotonic() - inicio < 10
+    _conferir(chapas, nao_couberam, pecas, chapa_w, chapa_h, espaco)
+
+
+# --- Sequência de cortes do modo 'serra' (_Serra.cortes) ---
+
+def _cortes_das_chapas(semente, n=60):
+    for pecas, chapa_w, chapa_h, kerf in _instancias(n, semente):
+        chapas, _, _ = encaixar(pecas, chapa_w, chapa_h, kerf, 'serra')
+        for chapa in chapas:
+            yield chapa, chapa_w, chapa_h, kerf
+
+
+def _posicao(corte):
+    return corte['y1'] if corte['orientacao'] == 'H' else corte['x1']
+
+
+def test_cortes_em_ordem_de_fase():
+    for chapa, _, _, kerf in _cortes_das_chapas(semente=3):
+        cortes = chapa['cortes']
+        assert [c['ordem'] for c in cortes] == list(range(1, len(cortes) + 1))
+        fases = [c['fase'] for c in cortes]
+        assert fases == sorted(fases)
+        if fases:
+            assert fases[0] == 1
+            # Sem fases vazias no meio
+            assert sorted(set(fases)) == list(range(1, max(fases) + 1))
+        assert all(c['kerf'] == kerf for c in cortes)
+
+
+def test_cada_corte_depois_dos_cortes_que_o_delimitam():
+    """As pontas de um corte ficam na borda da chapa ou num corte perpendicular feito antes."""
+    for chapa, chapa_w, chapa_h, kerf in _cortes_das_chapas(semente=4):
+        feitos = []
+        for corte in chapa['cortes']:
+            if corte['orientacao'] == 'H':
+                inicio, fim, bordas, fixo = corte['x1'], corte['x2'], (0, chapa_w), corte['y1']
+            else:
+                inicio, fim, bordas, fixo = corte['y1'], corte['y2'], (0, chapa_h), corte['x1']
+            perpendiculares = [c for c in feitos if c['orientacao'] != corte['orientacao']]
+
+            def apoia(c, ponta):
+                de, ate = (c['x1'], c['x2']) if c['orientacao'] == 'H' else (c['y1'], c['y2'])
+                return _posicao(c) == ponta and de <= fixo <= ate
+
+            assert inicio == bordas[0] or any(apoia(c, inicio - kerf) for c in perpendiculares), corte
+            assert fim == bordas[1] or any(apoia(c, fim) for c in perpendiculares), corte
+            feitos.append(corte)
+
+
+def _atravessa(corte, peca):
+    """Com kerf 0 o corte é uma linha: não pode passar pelo interior da peça."""
+    if corte['orientacao'] == 'H':
+        return (peca['y'] < corte['y1'] < peca['y'] + peca['altura']
+                and peca['x'] < corte['x2'] and corte['x1'] < peca['x'] + peca['largura'])
+    return (peca['x'] < corte['x1'] < peca['x'] + peca['largura']
+            and peca['y'] < corte['y2'] and corte['y1'] < peca['y'] + peca['altura'])
+
+
+def test_nenhum_corte_atravessa_uma_peca():
+    for chapa, chapa_w, chapa_h, kerf in _cortes_das_chapas(semente=5):
+        for corte in chapa['cortes']:
+            assert 0 <= corte['x1'] <= corte['x2'] <= chapa_w and 0 <= corte['y1'] <= corte['y2'] <= chapa_h
+            # Faixa consumida pelo disco: da posição do corte até posição + kerf
+            faixa = {'x': corte['x1'], 'y': corte['y1'],
+                     'largura': kerf if corte['orientacao'] == 'V' else corte['x2'] - corte['x1'],
+                     'altura': kerf if corte['orientacao'] == 'H' else corte['y2'] - corte['y1']}
+            for peca in chapa['pecas_colocadas']:
+                if kerf:
+                    assert not _sobrepoem(peca, faixa, 0), (corte, peca)
+                else:
+                    assert not _atravessa(corte, peca), (corte, peca)
+
+
+def test_kerf_entre_pecas_vizinhas():
+    for chapa, _, _, kerf in _cortes_das_chapas(semente=6):
+        pecas = chapa['pecas_colocadas']
+        for i, a in enumerate(pecas):
+            for b in pecas[i + 1:]:
+                assert not _sobrepoem(a, b, kerf), (a, b, kerf)
+        # O disco só é descontado nos cortes: cada peça começa na borda ou logo após um corte
+        inicios_x = {0} | {c['x1'] + kerf for c in chapa['cortes'] if c['orientacao'] == 'V'}
+        inicios_y = {0} | {c['y1'] + kerf for c in chapa['cortes'] if c['orientacao'] == 'H'}
+        for peca in pecas:
+            assert peca['x'] in inicios_x and peca['y'] in inicios_y, peca
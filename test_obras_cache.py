@@ -0,0 +1,112 @@
+# test_obras_cache.py
+"""
+Sincronização do cache da tela de Obras (obras_cache.py).
+
+    python -m pytest test_obras_cache.py
+
+As consultas rodam num SQLite em memória com as colunas usadas pelo cache;
+o cursor traduz os placeholders e a consulta ao information_schema.
+"""
+import sqlite3
+
+import pytest
+
+from obras_cache import ObrasCache, pedido_display
+
+TABELAS = """
+    CREATE TABLE add_cliente (idcliente INTEGER PRIMARY KEY, cliente TEXT, endereco TEXT, atualizado_em TEXT);
+    CREATE TABLE pedido (idpedido INTEGER PRIMARY KEY, idcliente INTEGER, numero_pedido TEXT,
+                         data_entrega TEXT, data_insercao TEXT, atualizado_em TEXT);
+    CREATE TABLE itens (id INTEGER PRIMARY KEY, codigo TEXT, descricao TEXT, atualizado_em TEXT);
+    CREATE TABLE item_composicao (id INTEGER PRIMARY KEY, id_item_filho INTEGER, atualizado_em TEXT);
+    CREATE TABLE cliente_item (
+        id_item INTEGER PRIMARY KEY, idpedido INTEGER, id_composicao INTEGER, item_raiz_id INTEGER,
+        quantidade_prod INTEGER, lote TEXT, data_engenharia TEXT, data_programacao TEXT, data_pcp TEXT,
+        data_producao TEXT, data_qualidade TEXT, caminho TEXT, tag TEXT, data_prog_fim TEXT,
+        obs_detalhes TEXT, obs_programacao TEXT, obs_producao TEXT, atualizado_em TEXT);
+"""
+
+
+class CursorSQLite:
+    """DictCursor do pymysql sobre um banco SQLite."""
+
+    def __init__(self, conexao):
+        self.conexao = conexao
+        self.linhas = []
+
+    def execute(self, sql, params=()):
+        if 'information_schema' in sql:
+            coluna, *tabelas = params
+            self.linhas = [{'TABLE_NAME': t} for t in tabelas
+                           if any(c[1] == coluna for c in self.conexao.execute(f"PRAGMA table_info({t})"))]
+            return
+        cur = self.conexao.execute(sql.replace('%s', '?'), list(params))
+        nomes = [d[0] for d in cur.description]
+        self.linhas = [dict(zip(nomes, row)) for row in cur.fetchall()]
+
+    def fetchall(self):
+        return self.linhas
+
+    def fetchone(self):
+        return self.linhas[0] if self.linhas else None
+
+
+@pytest.fixture
+def banco():
+    conexao = sqlite3.connect(':memory:')
+    conexao.executescript(TABELAS)
+    conexao.executescript("""
+        INSERT INTO add_cliente VALUES (1, 'Fazenda Boa Vista', 'Rio Verde', '2024-01-01 08:00:00'),
+                                       (2, 'Cooperativa Sul', 'Jataí', '2024-01-01 08:00:00');
+        INSERT INTO pedido VALUES (10, 1, 'P-100', NULL, '2024-01-02', '2024-01-02 08:00:00'),
+                                  (11, 2, 'P-110', NULL, '2024-01-03', '2024-01-03 08:00:00');
+        INSERT INTO itens VALUES (1, 'EQ-1', 'Secador', '2024-01-01 08:00:00'),
+                                 (2, 'CJ-1', 'Fornalha', '2024-01-01 08:00:00');
+        INSERT INTO item_composicao VALUES (5, 2, '2024-01-01 08:00:00');
+        INSERT INTO cliente_item (id_item, idpedido, id_composicao, item_raiz_id, quantidade_prod, atualizado_em)
+        VALUES (100, 10, 5, 1, 1, '2024-01-02 08:00:00'), (110, 11, 5, 1, 1, '2024-01-03 08:00:00');
+    """)
+    return conexao
+
+
+def test_delta_traz_o_pedido_alterado(banco):
+    cache = ObrasCache()
+    cursor = CursorSQLite(banco)
+    assert cache.sync(cursor) == {10, 11}
+
+    banco.execute("UPDATE pedido SET numero_pedido = 'P-101', atualizado_em = '2024-01-04 08:00:00' WHERE idpedido = 10")
+    assert 10 in cache.sync(cursor)
+    assert cache.ultima_sync['modo'] == 'incremental'
+    assert cache.pedido_por_id(10)['numero_pedido'] == 'P-101'
+
+
+def test_cliente_renomeado_depois_da_primeira_sync(banco):
+    cache = ObrasCache()
+    cursor = CursorSQLite(banco)
+    cache.sync(cursor)
+    antigo = pedido_display(cache.pedido_por_id(10))
+
+    # Só add_cliente muda: o pedido 10 fica abaixo da marca d'água de `pedido`
+    banco.execute("UPDATE add_cliente SET cliente = 'Fazenda Santa Rita', atualizado_em = '2024-01-05 08:00:00' "
+                  "WHERE idcliente = 1")
+    cache.sync(cursor)
+
+    assert cache.ultima_sync['modo'] == 'completo'
+    assert cache.pedido_por_id(10)['cliente'] == 'Fazenda Santa Rita'
+    assert cache.pedido_por_display(antigo) is None
+    assert cache.pedido_por_display(pedido_display(cache.pedido_por_id(10)))['idpedido'] == 10
+
+    # Sem novas mudanças, volta ao delta
+    cache.sync(cursor)
+    assert cache.ultima_sync['modo'] == 'incremental'
+
+
+def test_item_redescrito_chega_aos_itens_em_cache(banco):
+    cache = ObrasCache()
+    cursor = CursorSQLite(banco)
+    cache.sync(cursor)
+
+    banco.execute("UPDATE itens SET descricao = 'Fornalha 2.0', atualizado_em = '2024-01-05 08:00:00' WHERE id = 2")
+    cache.sync(cursor)
+
+    assert {cache.item_por_vinculo(i)['conjunto'] for i in (100, 110)} == {'Fornalha 2.0'}
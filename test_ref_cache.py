@@ -0,0 +1,153 @@
+# test_ref_cache.py
+"""
+`cached` / `invalidate` do ref_cache com os três backends.
+
+    python -m pytest test_ref_cache.py
+
+O SQLite usa um arquivo temporário aberto por dois `Cache` (como dois
+processos); o Redis é um cliente falso em memória com a mesma interface.
+"""
+import fnmatch
+
+import pytest
+
+import config
+import ref_cache
+from ref_cache import Cache, RedisCache, SQLiteCache, TTLCache, cached, invalidate
+
+
+class RedisFalso:
+    """get/set/mget/incr/scan_iter/delete de um servidor Redis, num dicionário."""
+
+    def __init__(self):
+        self.dados = {}
+
+    def get(self, key):
+        return self.dados.get(key)
+
+    def set(self, key, value, ex=None):
+        self.dados[key] = value
+
+    def mget(self, keys):
+        return [self.dados.get(k) for k in keys]
+
+    def incr(self, key):
+        self.dados[key] = str(int(self.dados.get(key, 0)) + 1).encode()
+        return int(self.dados[key])
+
+    def scan_iter(self, pattern):
+        return [k for k in list(self.dados) if fnmatch.fnmatchcase(k, pattern)]
+
+    def delete(self, key):
+        self.dados.pop(key, None)
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def dois_caches(request, tmp_path):
+    """Dois `Cache` que compartilham o backend (processos diferentes, nos backends compartilhados)."""
+    if request.param == 'memory':
+        backend = TTLCache(max_entries=16, ttl=60)
+        return Cache(backend, ttl=60), Cache(backend, ttl=60)
+    if request.param == 'sqlite':
+        caminho = str(tmp_path / 'cache.sqlite3')
+        return Cache(SQLiteCache(caminho), ttl=60), Cache(SQLiteCache(caminho), ttl=60)
+    cliente = RedisFalso()
+    return Cache(RedisCache(client=cliente), ttl=60), Cache(RedisCache(client=cliente), ttl=60)
+
+
+@pytest.fixture
+def cache_global(monkeypatch, dois_caches):
+    """Instala o primeiro cache como o cache global usado por `cached`/`invalidate`."""
+    monkeypatch.setattr(config, 'REF_CACHE_ENABLED', True)
+    monkeypatch.setattr(ref_cache, '_cache', dois_caches[0])
+    return dois_caches
+
+
+class Carga:
+    """Loader que conta as chamadas e devolve linhas novas a cada uma."""
+
+    def __init__(self):
+        self.chamadas = 0
+
+    def __call__(self):
+        self.chamadas += 1
+        return [{'id': 1, 'versao': self.chamadas}]
+
+
+def test_segunda_leitura_vem_do_cache(cache_global):
+    carga = Carga()
+    assert cached(('itens',), ('itens',), carga) == [{'id': 1, 'versao': 1}]
+    assert cached(('itens',), ('itens',), carga) == [{'id': 1, 'versao': 1}]
+    assert carga.chamadas == 1
+    stats = ref_cache.cache_stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+
+def test_invalidate_vale_so_para_as_tabelas_da_entrada(cache_global):
+    itens, clientes = Carga(), Carga()
+    cached(('itens',), ('itens',), itens)
+    cached(('clientes',), ('add_cliente',), clientes)
+
+    invalidate('itens')
+
+    assert cached(('itens',), ('itens',), itens) == [{'id': 1, 'versao': 2}]
+    cached(('clientes',), ('add_cliente',), clientes)
+    assert (itens.chamadas, clientes.chamadas) == (2, 1)
+
+
+def test_invalidate_de_um_cache_chega_ao_outro(dois_caches):
+    """Com backend compartilhado, o commit de um processo invalida a cópia do outro."""
+    a, b = dois_caches
+    carga = Carga()
+    a.cached('composicao', ('item_composicao',), carga)
+    assert b.cached('composicao', ('item_composicao',), carga) == [{'id': 1, 'versao': 1}]
+
+    b.invalidate('item_composicao')
+
+    assert a.cached('composicao', ('item_composicao',), carga) == [{'id': 1, 'versao': 2}]
+    assert carga.chamadas == 2
+
+
+def test_valor_devolvido_e_uma_copia(cache_global):
+    linhas = cached('itens', ('itens',), Carga())
+    linhas[0]['versao'] = 99
+    linhas.append({'id': 2})
+    assert cached('itens', ('itens',), Carga()) == [{'id': 1, 'versao': 1}]
+
+
+def test_cache_desligado_sempre_vai_ao_banco(cache_global, monkeypatch):
+    monkeypatch.setattr(config, 'REF_CACHE_ENABLED', False)
+    carga = Carga()
+    cached('itens', ('itens',), carga)
+    cached('itens', ('itens',), carga)
+    assert carga.chamadas == 2
+
+
+def test_backend_com_falha_vai_ao_banco():
+    class Quebrado(TTLCache):
+        def versions(self, tables):
+            raise ConnectionError("fora do ar")
+
+    cache = Cache(Quebrado(), ttl=60)
+    carga = Carga()
+    cache.cached('itens', ('itens',), carga)
+    cache.cached('itens', ('itens',), carga)
+    assert carga.chamadas == 2
+    assert cache.stats()['errors'] == 2
+
+
+def test_ttl_expira_e_lru_descarta_o_mais_antigo(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(ref_cache.time, 'monotonic', lambda: agora[0])
+    cache = Cache(TTLCache(max_entries=2, ttl=10), ttl=10)
+    a, b, c = Carga(), Carga(), Carga()
+
+    cache.cached('a', (), a)
+    agora[0] += 11
+    cache.cached('a', (), a)
+    assert a.chamadas == 2
+
+    cache.cached('b', (), b)
+    cache.cached('c', (), c)  # terceira entrada: 'a' é a menos usada e sai
+    cache.cached('a', (), a)
+    assert (a.chamadas, b.chamadas, c.chamadas) == (3, 1, 1)
@@ -0,0 +1,138 @@
+# test_status_tr.py
+"""
+Regras de status das TRs em Python (`novo_status_tr`) x versão em SQL
+(tabela `status_tr_regra` + `ROLLUP_SQL`).
+
+    python -m pytest test_status_tr.py
+
+Sem banco, os testes conferem o SQL gerado: a expressão de `chave_sql`
+(reproduzida passo a passo) e as linhas do `SEED_STATUS_TR_REGRA`. A
+equivalência de fato só é verificada no MySQL: esse teste roda com
+TEST_DB_NAME definido (um banco do servidor do .env) e usa tabelas
+TEMPORARY, que somem ao fim da conexão.
+"""
+import itertools
+import os
+import re
+
+import pytest
+
+from status_tr import (REGRAS_STATUS_TR, ROLLUP_SQL, SEED_STATUS_TR_REGRA, STATUS_TR_REGRA_DDL,
+                       chave_sql, normalize_status_key, novo_status_tr)
+
+STATUS_ITENS = [
+    'Aguardando Programação', 'aguardando programacao', 'AGUARDANDO PCP', 'Em Produção', 'Produzindo',
+    'Produção Finalizada', 'Esperando Qualidade', 'Liberado para Expedição', 'Pátio', 'Patiô',
+    'Entregue', ' entregue ', 'ENTREGUE', 'Cancelada', '\tcancelada\n', 'Finalizado', ' ', '', None,
+]
+STATUS_ATUAIS = [None, '', 'PRODUZINDO', ' produzindo ', 'ENTREGUE', 'CANCELADA',
+                 'EM PROGRAMAÇÃO', 'em programação', 'PATIO', 'Outro']
+
+
+def _casos():
+    for n in (1, 2, 3):
+        for itens in itertools.combinations_with_replacement(range(len(STATUS_ITENS)), n):
+            for atual in STATUS_ATUAIS:
+                yield atual, [STATUS_ITENS[i] for i in itens]
+
+
+def _rollup_por_tabela(status_atual, status_itens):
+    """Modelo em Python do ROLLUP_SQL sobre REGRAS_STATUS_TR (não executa o SQL)."""
+    chaves = {normalize_status_key(s) for s in status_itens if s}
+    regras = {chave: (prioridade, status, regra) for chave, status, prioridade, regra in REGRAS_STATUS_TR}
+    aplicaveis = [regras[c][:2] for c in chaves
+                  if c in regras and (regras[c][2] == 'qualquer' or len(chaves) == 1)]
+    if not aplicaveis:
+        return None
+    novo = min(aplicaveis)[1]
+    if status_atual is None or status_atual.strip().upper() != novo:
+        return novo
+    return None
+
+
+def test_modelo_da_tabela_de_regras_concorda_com_novo_status_tr():
+    for atual, itens in _casos():
+        assert _rollup_por_tabela(atual, itens) == novo_status_tr(atual, itens), (atual, itens)
+
+
+def _avaliar_chave_sql(valor):
+    """Aplica a `valor`, em Python e na mesma ordem, cada passo da expressão de `chave_sql`."""
+    expr = chave_sql('c')
+    pares = re.findall(r", '([^']*)', '([^']*)'\)", expr)
+    (regex_strip, vazio), trocas = pares[0], pares[1:]
+    assert expr.startswith('REPLACE(' * len(trocas) + 'LOWER(REGEXP_REPLACE('
+                           'CONVERT(c USING utf8mb4) COLLATE utf8mb4_bin, '), expr
+    valor = re.sub(regex_strip.replace('[[:space:]]', r'\s'), vazio, valor)
+    valor = valor.lower()
+    for antigo, novo in trocas:
+        valor = valor.replace(antigo, novo)
+    return valor
+
+
+def test_chave_sql_normaliza_como_normalize_status_key():
+    for status in STATUS_ITENS + [status for _, status, _, _ in REGRAS_STATUS_TR]:
+        if status:
+            assert _avaliar_chave_sql(status) == normalize_status_key(status), status
+
+
+def test_seed_grava_as_regras_de_python():
+    linhas = re.findall(r"\('([^']*)', '([^']*)', (\d+), '([^']*)'\)", SEED_STATUS_TR_REGRA)
+    assert [(c, s, int(p), r) for c, s, p, r in linhas] == REGRAS_STATUS_TR
+    for chave, status, _, regra in REGRAS_STATUS_TR:
+        # A chave casa com a saída de chave_sql; o status, com o UPPER(TRIM(pt.status)) do rollup
+        assert normalize_status_key(chave) == chave
+        assert status == status.strip().upper()
+        assert regra in ('qualquer', 'todos')
+
+
+def test_prioridades_sem_empate_entre_status_diferentes():
+    por_prioridade = {}
+    for _, status, prioridade, _ in REGRAS_STATUS_TR:
+        assert por_prioridade.setdefault(prioridade, status) == status
+
+
+@pytest.fixture
+def mysql_cursor():
+    banco = os.getenv('TEST_DB_NAME')
+    if not banco:
+        pytest.skip("TEST_DB_NAME não definido")
+    import pymysql
+    import config
+    kwargs = dict(host=config.DB_HOST, user=config.DB_USER, password=config.DB_PASS,
+                  port=int(config.DB_PORT or 3306), database=banco, charset='utf8mb4',
+                  cursorclass=pymysql.cursors.DictCursor)
+    if os.path.exists(config.SSL_CA_PATH):
+        kwargs['ssl'] = {'ca': config.SSL_CA_PATH}
+    connection = pymysql.connect(**kwargs)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE TEMPORARY TABLE pedidos_tr (idpedidos_tr INT PRIMARY KEY, status VARCHAR(60))")
+            cursor.execute("CREATE TEMPORARY TABLE cliente_item (id_item INT PRIMARY KEY, status_producao VARCHAR(60))")
+            cursor.execute("CREATE TEMPORARY TABLE pedidos_tr_vinculo ("
+                           "idpedidos_tr INT NOT NULL, id_item INT NOT NULL, PRIMARY KEY (idpedidos_tr, id_item))")
+            cursor.execute(f"CREATE TEMPORARY TABLE status_tr_regra ({STATUS_TR_REGRA_DDL})")
+            cursor.execute(SEED_STATUS_TR_REGRA)
+            yield cursor
+    finally:
+        connection.close()
+
+
+def test_rollup_sql_equivale_as_regras_em_python(mysql_cursor):
+    casos = list(_casos())
+    trs, itens, vinculos = [], [], []
+    for id_tr, (atual, status_itens) in enumerate(casos, start=1):
+        trs.append((id_tr, atual))
+        for status in status_itens:
+            itens.append((len(itens) + 1, status))
+            vinculos.append((id_tr, len(itens)))
+    mysql_cursor.executemany("INSERT INTO pedidos_tr (idpedidos_tr, status) VALUES (%s, %s)", trs)
+    mysql_cursor.executemany("INSERT INTO cliente_item (id_item, status_producao) VALUES (%s, %s)", itens)
+    mysql_cursor.executemany("INSERT INTO pedidos_tr_vinculo (idpedidos_tr, id_item) VALUES (%s, %s)", vinculos)
+
+    mysql_cursor.execute(ROLLUP_SQL)
+    mysql_cursor.execute("SELECT idpedidos_tr, status FROM pedidos_tr")
+    gravados = {row['idpedidos_tr']: row['status'] for row in mysql_cursor.fetchall()}
+
+    for id_tr, (atual, status_itens) in enumerate(casos, start=1):
+        esperado = novo_status_tr(atual, status_itens) or atual
+        assert gravados[id_tr] == esperado, (atual, status_itens)
@@ -0,0 +1,110 @@
+# text_truncate.py
+"""
+Truncamento de textos com '...' para as colunas das Treeviews.
+
+Medir com `font.measure()` é uma chamada ao Tk por tentativa; encolher o
+texto caractere a caractere custava dezenas de chamadas por linha. Aqui a
+largura de cada caractere é medida uma única vez por fonte e o ponto de corte
+é achado por busca binária nas larguras acumuladas. Os resultados recentes
+(texto, largura) ficam num LRU, de modo que redimensionar a árvore de novo para
+uma largura já vista não recalcula nada.
+
+Uso:
+    from text_truncate import truncar_texto
+
+    texto = truncar_texto(texto, tree.column('desc', 'width'), default_font)
+
+Deve ser chamado na thread da interface (as medições usam o Tk).
+"""
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+
+RETICENCIAS = '...'
+NBSP = '\u00A0'
+LRU_RESULTADOS = 20000  # (texto, largura) guardados por fonte
+
+
+class TextTruncator:
+    """Truncador ligado a uma fonte do Tk, com tabela de larguras e LRU de resultados."""
+
+    def __init__(self, font_obj, max_resultados=LRU_RESULTADOS):
+        self.font = font_obj
+        self.max_resultados = max_resultados
+        self._larguras = {}              # caractere -> largura em pixels
+        self._resultados = OrderedDict() # (texto, limite, sem_quebra) -> texto final
+        self._reticencias = font_obj.measure(RETICENCIAS)
+        self.hits = 0
+        self.misses = 0
+
+    def _largura_char(self, ch):
+        largura = self._larguras.get(ch)
+        if largura is None:
+            largura = self._larguras[ch] = self.font.measure(ch)
+        return largura
+
+    def largura(self, text):
+        """Largura aproximada do texto (soma das larguras dos caracteres)."""
+        return sum(self._largura_char(ch) for ch in text)
+
+    def truncar(self, text, max_width, margin=0, sem_quebra=False):
+        """
+        Trunca o texto com '...' para caber em `max_width - margin` pixels.
+        Com `sem_quebra`, troca espaços por espaços não separáveis (uma linha só na Treeview).
+        """
+        if not isinstance(text, str):
+            return text
+
+        limite = max_width - margin
+        chave = (text, limite, sem_quebra)
+        resultado = self._resultados.get(chave)
+        if resultado is not None:
+            self._resultados.move_to_end(chave)
+            self.hits += 1
+            return resultado
+        self.misses += 1
+
+        acumuladas = list(accumulate(self._largura_char(ch) for ch in text))
+        if not acumuladas or acumuladas[-1] <= limite:
+            resultado = text
+        else:
+            # Maior prefixo que, somado às reticências, ainda cabe
+            corte = bisect_right(acumuladas, limite - self._reticencias)
+            resultado = text[:corte] + RETICENCIAS
+        if sem_quebra:
+            resultado = resultado.replace(' ', NBSP)
+
+        self._resultados[chave] = resultado
+        if len(self._resultados) > self.max_resultados:
+            self._resultados.popitem(last=False)
+        return resultado
+
+    def limpar(self):
+        """Descarta tabela e resultados (ex.: após mudar o tamanho da fonte)."""
+        self._larguras.clear()
+        self._resultados.clear()
+        self._reticencias = self.font.measure(RETICENCIAS)
+
+
+_truncadores = {}  # atributos efetivos da fonte (família, tamanho, peso...) -> truncador
+
+
+def get_truncator(font_obj):
+    """
+    Truncador compartilhado pelas fontes com os mesmos atributos efetivos
+    (`font_obj.actual()`): fontes sem nome criadas a cada tela ganham nomes
+    novos ('font12', ...), mas medem igual e reaproveitam a mesma tabela.
+    """
+    truncador = getattr(font_obj, '_truncador', None)
+    if truncador is None:
+        chave = tuple(sorted(font_obj.actual().items()))
+        truncador = _truncadores.get(chave)
+        if truncador is None:
+            truncador = _truncadores[chave] = TextTruncator(font_obj)
+        font_obj._truncador = truncador  # Evita o actual() (uma chamada ao Tk) nas próximas linhas
+    return truncador
+
+
+def truncar_texto(text, max_width, font_obj, margin=0, sem_quebra=False):
+    """Atalho para `get_truncator(font_obj).truncar(...)`."""
+    return get_truncator(font_obj).truncar(text, max_width, margin=margin, sem_quebra=sem_quebra)
@@ -0,0 +1,128 @@
+# tk_worker.py
+"""
+Executor compartilhado para as cargas de banco das telas Tk.
+
+As consultas rodam num pool limitado de threads (`config.TK_WORKERS`) e o
+resultado volta para a thread da interface via `after()`, onde os callbacks
+podem mexer nos widgets com segurança.
+
+Uso:
+    from tk_worker import CanalDeCarga
+
+    self._carga = CanalDeCarga(self.main_frame)
+    self._carga.executar(buscar, termo,
+                         ao_concluir=self.preencher_tabela,
+                         ao_falhar=lambda e: messagebox.showerror("Erro", str(e)))
+
+Cada `CanalDeCarga` entrega apenas o resultado do último pedido: ao chamar
+`executar` de novo (ex.: o usuário digitou outra letra no filtro), a tarefa
+anterior é cancelada se ainda não começou, ou tem o resultado descartado.
+"""
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Pool de threads global, criado na primeira chamada."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, config.TK_WORKERS),
+                                               thread_name_prefix='tk-db')
+    return _executor
+
+
+class Tarefa:
+    """Referência a uma carga enviada ao executor."""
+
+    def __init__(self):
+        self.future = None
+        self.cancelada = False
+
+    def cancelar(self):
+        self.cancelada = True
+        if self.future is not None:
+            self.future.cancel()
+
+
+def _erro_padrao(erro):
+    print(f"Erro em carga de segundo plano: {erro}")
+
+
+def executar_em_segundo_plano(widget, fn, *args, ao_concluir=None, ao_falhar=None, **kwargs):
+    """
+    Executa `fn(*args, **kwargs)` no pool e chama `ao_concluir(resultado)` ou
+    `ao_falhar(exceção)` na thread da interface do `widget`.
+    """
+    tarefa = Tarefa()
+
+    def entregar(future):
+        if future.cancelled() or tarefa.cancelada:
+            return
+
+        def aplicar():
+            if tarefa.cancelada:
+                return
+            try:
+                if not widget.winfo_exists():
+                    return # A tela foi fechada enquanto a consulta rodava
+            except tk.TclError:
+                return
+            erro = future.exception()
+            if erro is not None:
+                (ao_falhar or _erro_padrao)(erro)
+            elif ao_concluir is not None:
+                ao_concluir(future.result())
+        try:
+            widget.after(0, aplicar)
+        except (RuntimeError, tk.TclError):
+            pass # Interface já encerrada
+
+    tarefa.future = get_executor().submit(fn, *args, **kwargs)
+    tarefa.future.add_done_callback(entregar)
+    return tarefa
+
+
+class CanalDeCarga:
+    """Envia cargas ao executor mantendo só a mais recente (as anteriores são canceladas)."""
+
+    def __init__(self, widget):
+        self.widget = widget
+        self._atual = None
+
+    @property
+    def ocupado(self):
+        return self._atual is not None and not self._atual.future.done()
+
+    def executar(self, fn, *args, ao_concluir=None, ao_falhar=None, **kwargs):
+        self.cancelar()
+        tarefa = None
+
+        def concluir(resultado):
+            if tarefa is self._atual:
+                self._atual = None
+            if ao_concluir is not None:
+                ao_concluir(resultado)
+
+        def falhar(erro):
+            if tarefa is self._atual:
+                self._atual = None
+            (ao_falhar or _erro_padrao)(erro)
+
+        tarefa = executar_em_segundo_plano(self.widget, fn, *args,
+                                           ao_concluir=concluir, ao_falhar=falhar, **kwargs)
+        self._atual = tarefa
+        return tarefa
+
+    def cancelar(self):
+        """Cancela a carga em andamento (o resultado, se vier, é descartado)."""
+        if self._atual is not None:
+            self._atual.cancelar()
+            self._atual = None
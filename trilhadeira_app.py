@@ -1,7 +1,6 @@
 import tkinter as tk
 from tkinter import messagebox
-import pymysql
-from config import DB_HOST, DB_USER, DB_PASS, DB_NAME
+from db_pool import get_connection
 from datetime import datetime
 from collections import Counter 
 import customtkinter as ctk
@@ -9,7 +8,8 @@ from select2_tkinter import Select2Tkinter
 from PIL import Image, ImageTk
 import os
 import sys
-import threading
+from tk_worker import CanalDeCarga
+from status_tr import normalize_status_key, aplicar_regras, atualizar_status_tr, sincronizar_vinculos_tr
 
 def resource_path(relative_path):
     """ Obtém o caminho absoluto para o recurso, funciona para dev e para PyInstaller """
@@ -47,27 +47,29 @@ class TrilhadeiraApp:
 
         self.modelos_tr = ["TR-60", "TR-80", "TR-80 BD", "TR-100", "TR-120", "TR-120s", "TR-150s"]
 
+        self._carga_dados = CanalDeCarga(self.main_frame) # Recargas seguidas: só a última monta os cards
+        self._tabelas_existentes = {} # Tabelas criadas pelas migrações (verificadas uma vez)
+
         self.create_widgets()
         self.load_tr_images()
         self.start_loading_data()
         self.parent.bind("<Configure>", self.on_resize, add="+")
 
     def get_db_connection(self):
-        return pymysql.connect(
-            host=DB_HOST, user=DB_USER, password=DB_PASS,
-            database=DB_NAME, charset='utf8mb4',
-            cursorclass=pymysql.cursors.DictCursor
-        )
+        return get_connection()
+
+    def _tem_tabela(self, cursor, nome):
+        """True se a tabela já existe (criada por python migrations.py upgrade)."""
+        if nome not in self._tabelas_existentes:
+            cursor.execute("""
+                SELECT 1 FROM information_schema.TABLES
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+            """, (nome,))
+            self._tabelas_existentes[nome] = cursor.fetchone() is not None
+        return self._tabelas_existentes[nome]
 
     def normalize_status_key(self, s):
-        if not s: return ''
-        s = str(s).strip().lower()
-        # Simple normalization, can be expanded
-        replacements = {'á': 'a', 'ã': 'a', 'ç': 'c', 'é': 'e', 'ê': 'e', 'í': 'i', 'ó': 'o', 'õ': 'o', 'ú': 'u'}
-        for old, new in replacements.items():
-            s = s.replace(old, new)
-        s = s.replace(' ', '-')
-        return s
+        return normalize_status_key(s)
 
     def create_widgets(self):
         # --- Filtros de Status ---
@@ -238,10 +240,17 @@ class TrilhadeiraApp:
             widget.destroy()
         self.cards = []
         
-        threading.Thread(target=self._load_data_thread, daemon=True).start()
+        self._carga_dados.executar(self._load_data_thread,
+                                   ao_concluir=self.display_loaded_data,
+                                   ao_falhar=self._on_load_error)
+
+    def _on_load_error(self, error):
+        self.loading_spinner.stop()
+        self.loading_frame.place_forget()
+        messagebox.showerror("Erro", f"Erro ao carregar pedidos: {error}")
 
     def _load_data_thread(self):
-        """Função executada na thread para carregar dados do banco."""
+        """Função executada no executor de segundo plano para carregar dados do banco."""
         self.update_all_statuses() # Atualiza status no início
         
         try:
@@ -262,8 +271,8 @@ class TrilhadeiraApp:
         finally:
             conn.close()
         
-        # Agenda a atualização da UI na thread principal
-        self.main_frame.after(0, self.display_loaded_data, pedidos)
+        # O executor entrega o resultado a display_loaded_data na thread principal
+        return pedidos
 
     def load_pedidos_tr(self):
         for widget in self.scrollable_frame.winfo_children():
@@ -530,86 +539,49 @@ class TrilhadeiraApp:
                 conn.close()
 
     def update_all_statuses(self):
-        """Port da lógica de atualização automática de status do PHP."""
+        """Port da lógica de atualização automática de status do PHP (regras em status_tr.py)."""
         try:
             conn = self.get_db_connection()
             with conn.cursor() as cursor:
-                # 1. Obter todos os pedidos_tr com seus vinculos e status de produção dos itens em uma única query
-                sql = """
-                    SELECT 
-                        pt.idpedidos_tr, 
-                        pt.status AS current_tr_status,
-                        ci.status_producao
-                    FROM pedidos_tr pt
-                    JOIN cliente_item ci 
-                        ON FIND_IN_SET(ci.id_item, REPLACE(pt.vinculos_item, ';', ','))
-                    WHERE pt.vinculos_item IS NOT NULL AND pt.vinculos_item != ''
-                """
+                if self._tem_tabela(cursor, 'pedidos_tr_vinculo'):
+                    # TRs gravadas/alteradas só na coluna antiga (ex.: pelo sistema PHP); sem divergência, só lê
+                    sincronizar_vinculos_tr(cursor)
+
+                    if self._tem_tabela(cursor, 'status_tr_regra'):
+                        # Regras na tabela status_tr_regra: um único UPDATE calcula e grava todas as TRs
+                        atualizar_status_tr(cursor)
+                        conn.commit()
+                        return
+
+                    # Junções pelas chaves primárias: uma linha por (TR, status distinto)
+                    sql = """
+                        SELECT
+                            pt.idpedidos_tr,
+                            pt.status AS current_tr_status,
+                            ci.status_producao
+                        FROM pedidos_tr_vinculo v
+                        JOIN pedidos_tr pt ON pt.idpedidos_tr = v.idpedidos_tr
+                        JOIN cliente_item ci ON ci.id_item = v.id_item
+                        GROUP BY pt.idpedidos_tr, pt.status, ci.status_producao
+                    """
+                else:
+                    # Sem a migração 4: FIND_IN_SET não usa índice (varre TRs x itens)
+                    sql = """
+                        SELECT 
+                            pt.idpedidos_tr, 
+                            pt.status AS current_tr_status,
+                            ci.status_producao
+                        FROM pedidos_tr pt
+                        JOIN cliente_item ci 
+                            ON FIND_IN_SET(ci.id_item, REPLACE(pt.vinculos_item, ';', ','))
+                        WHERE pt.vinculos_item IS NOT NULL AND pt.vinculos_item != ''
+                    """
                 cursor.execute(sql)
                 results = cursor.fetchall()
 
-            # 2. Agrupar os status de produção por idpedidos_tr
-            statuses_by_pedido = {}
-            for row in results:
-                pedido_id = row['idpedidos_tr']
-                if pedido_id not in statuses_by_pedido:
-                    statuses_by_pedido[pedido_id] = {
-                        'current_status': row['current_tr_status'],
-                        'item_statuses': []
-                    }
-                if row['status_producao']:
-                    statuses_by_pedido[pedido_id]['item_statuses'].append(row['status_producao'])
-
-            # 3. Determinar o novo status para cada pedido e preparar updates
-            updates_to_perform = []
-            for pedido_id, data in statuses_by_pedido.items():
-                # Se não houver itens com status, não faz nada com este pedido.
-                # Isso evita que um pedido sem itens vinculados tenha seu status alterado indevidamente.
-                if not data.get('item_statuses'):
-                    continue
-
-                # Normaliza os status dos itens para comparação
-                norm_statuses = {self.normalize_status_key(s) for s in data['item_statuses']}
-
-                # Padrão é manter o status atual, a menos que uma regra seja atendida.
-                novo_status_tr = data['current_status']
-
-                # --- Nova Lógica de Prioridade ---
-                # A ordem dos 'if/elif' define a prioridade.
-                # Se qualquer item estiver 'Aguardando Programação', o status da TR é 'EM PROGRAMAÇÃO'.
-                if 'aguardando-programacao' in norm_statuses:
-                    novo_status_tr = 'EM PROGRAMAÇÃO'
-                # Se não houver nenhum 'Aguardando Programação', mas houver algum 'Aguardando PCP',
-                # o status da TR é 'A INICIAR PRODUÇÃO'.
-                elif 'aguardando-pcp' in norm_statuses:
-                    novo_status_tr = 'A INICIAR PRODUÇÃO'
-                # E assim por diante, seguindo a hierarquia do processo de produção.
-                elif 'em-producao' in norm_statuses or 'produzindo' in norm_statuses:
-                    novo_status_tr = 'PRODUZINDO'
-                elif 'producao-finalizada' in norm_statuses or 'esperando-qualidade' in norm_statuses:
-                    novo_status_tr = 'ESPERANDO QUALIDADE'
-                elif 'liberado-para-expedicao' in norm_statuses or 'patio' in norm_statuses:
-                    novo_status_tr = 'PATIO'
-                # Se todos os itens estiverem 'Entregue', o status da TR se torna 'ENTREGUE'.
-                elif norm_statuses == {'entregue'}:
-                    novo_status_tr = 'ENTREGUE'
-                # Se todos os itens estiverem 'Cancelada', o status da TR se torna 'CANCELADA'.
-                elif norm_statuses == {'cancelada'}:
-                    novo_status_tr = 'CANCELADA'
-                else:
-                    # Se nenhuma das condições acima for atendida (ex: status mistos em fases avançadas),
-                    # o status da TR não é alterado.
-                    pass
-
-                # Adicionar à lista de updates se o status mudou
-                # e se o novo status não for nulo ou vazio.
-                if novo_status_tr and (data['current_status'] is None or novo_status_tr.strip().upper() != data['current_status'].strip().upper()):
-                    updates_to_perform.append((novo_status_tr, pedido_id))
-
-            # 4. Executar todos os updates de uma vez
-            if updates_to_perform:
-                with conn.cursor() as cursor_update:
-                    cursor_update.executemany("UPDATE pedidos_tr SET status = %s WHERE idpedidos_tr = %s", updates_to_perform)
+            # Sem a migração 5: as mesmas regras, aplicadas em Python
+            with conn.cursor() as cursor_update:
+                aplicar_regras(cursor_update, results)
             conn.commit()
         except Exception as e:
             print(f"Erro ao atualizar status em lote: {e}")
@@ -839,16 +811,30 @@ class TrilhadeiraApp:
                 vinculos_item_string = ';'.join(map(str, todos_vinculos_ids))
 
                 # 2. Verificar se algum vínculo já existe
-                check_conditions = " OR ".join([f"FIND_IN_SET(%s, REPLACE(vinculos_item, ';', ','))" for _ in todos_vinculos_ids])
-                sql_check = f"SELECT idpedidos_tr FROM pedidos_tr WHERE {check_conditions}"
+                usa_tabela_vinculo = self._tem_tabela(cursor, 'pedidos_tr_vinculo')
+                if usa_tabela_vinculo:
+                    placeholders = ','.join(['%s'] * len(todos_vinculos_ids))
+                    # JOIN: vínculos de TRs já excluídas (ex.: pelo sistema PHP) não bloqueiam o item
+                    sql_check = f"""
+                        SELECT v.idpedidos_tr FROM pedidos_tr_vinculo v
+                        JOIN pedidos_tr pt ON pt.idpedidos_tr = v.idpedidos_tr
+                        WHERE v.id_item IN ({placeholders}) LIMIT 1
+                    """
+                else:
+                    check_conditions = " OR ".join([f"FIND_IN_SET(%s, REPLACE(vinculos_item, ';', ','))" for _ in todos_vinculos_ids])
+                    sql_check = f"SELECT idpedidos_tr FROM pedidos_tr WHERE {check_conditions}"
                 cursor.execute(sql_check, todos_vinculos_ids)
                 if cursor.fetchone():
                     messagebox.showerror("Erro", "Um ou mais itens deste equipamento já foram inseridos na trilhadeira.", parent=self.modal)
                     return
 
-                # 3. Inserir
+                # 3. Inserir (vinculos_item continua preenchido para quem ainda lê a coluna antiga)
                 sql_insert = "INSERT INTO pedidos_tr (id_pedido, modelo, id_vinculo, vinculos_item) VALUES (%s, %s, %s, %s)"
                 cursor.execute(sql_insert, (pedido_id, modelo, id_vinculo_principal, vinculos_item_string))
+                if usa_tabela_vinculo:
+                    id_tr = cursor.lastrowid
+                    cursor.executemany("INSERT INTO pedidos_tr_vinculo (idpedidos_tr, id_item) VALUES (%s, %s)",
+                                       [(id_tr, id_item) for id_item in todos_vinculos_ids])
                 conn.commit()
 
                 messagebox.showinfo("Sucesso", "Registro inserido com sucesso!", parent=self.modal)
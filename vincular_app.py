@@ -3,7 +3,11 @@ from tkinter import ttk, messagebox, simpledialog, font
 import customtkinter as ctk
 import pymysql
 import datetime
-from config import DB_HOST, DB_USER, DB_PASS, DB_NAME
+from db_pool import get_connection
+from tk_worker import executar_em_segundo_plano
+from text_truncate import truncar_texto
+from ref_cache import cached, invalidate
+from status_tr import atualizar_status_tr_itens_excluidos
 
 class VincularApp:
     def __init__(self, parent, user):
@@ -18,16 +22,15 @@ class VincularApp:
         self.create_widgets()
         self.load_initial_data()
 
-    def _execute_query(self, query, params=None, fetch=None):
+    def _execute_query(self, query, params=None, fetch=None, after=None):
+        """`after(cursor)` roda após a query, na mesma transação (antes do commit)."""
         conn = None
         try:
-            conn = pymysql.connect(
-                host=DB_HOST, user=DB_USER, password=DB_PASS,
-                database=DB_NAME, charset='utf8mb4',
-                cursorclass=pymysql.cursors.DictCursor
-            )
+            conn = get_connection()
             with conn.cursor() as cursor:
                 cursor.execute(query, params or ())
+                if after:
+                    after(cursor)
                 if fetch == 'one':
                     return cursor.fetchone()
                 elif fetch == 'all':
@@ -152,33 +155,47 @@ class VincularApp:
         self.selected_vinculo_id = None
 
     def load_initial_data(self):
-        # Carregar Pedidos
+        """Carrega pedidos, itens raiz e composições no executor de segundo plano."""
+        executar_em_segundo_plano(self.main_frame, self._fetch_initial_data,
+                                  ao_concluir=self._apply_initial_data,
+                                  ao_falhar=lambda e: messagebox.showerror("Erro de Banco de Dados", f"Erro: {e}"))
+
+    def _fetch_initial_data(self):
+        """Executa as consultas iniciais (fora da thread da interface)."""
         sql_pedidos = """
             SELECT p.idpedido, p.numero_pedido, c.cliente
             FROM pedido p JOIN add_cliente c ON p.idcliente = c.idcliente
             ORDER BY p.idpedido DESC
         """
-        pedidos = self._execute_query(sql_pedidos, fetch='all')
-        if pedidos:
-            self.pedido_map = {f"{p['numero_pedido']} - {p['cliente']}": p['idpedido'] for p in pedidos}
-            # Não configura mais o combobox, os dados são usados no modal
-            # self.pedido_combo.configure(values=list(self.pedido_map.keys()))
-
-        # Carregar Itens Raiz
         sql_itens_raiz = """
             SELECT DISTINCT i.id, i.codigo, i.descricao
             FROM itens i JOIN item_composicao ic ON i.id = ic.id_item_pai
             ORDER BY i.codigo
         """
-        itens_raiz = self._execute_query(sql_itens_raiz, fetch='all')
+        sql_all_comps = "SELECT id, id_item_pai, id_item_filho, quantidade FROM item_composicao"
+        with get_connection() as conn, conn.cursor() as cursor:
+            def fetch(sql):
+                cursor.execute(sql)
+                return cursor.fetchall()
+            pedidos = fetch(sql_pedidos)
+            # Itens raiz e composições mudam pouco: vêm do cache de referência
+            itens_raiz = cached(('itens_raiz',), ('itens', 'item_composicao'), lambda: fetch(sql_itens_raiz))
+            all_comps_data = cached(('item_composicao',), ('item_composicao',), lambda: fetch(sql_all_comps))
+        return pedidos, itens_raiz, all_comps_data
+
+    def _apply_initial_data(self, data):
+        pedidos, itens_raiz, all_comps_data = data
+        if pedidos:
+            self.pedido_map = {f"{p['numero_pedido']} - {p['cliente']}": p['idpedido'] for p in pedidos}
+            # Não configura mais o combobox, os dados são usados no modal
+            # self.pedido_combo.configure(values=list(self.pedido_map.keys()))
+
         if itens_raiz:
             self.item_raiz_map = {f"{i['codigo']} - {i['descricao']}": i['id'] for i in itens_raiz}
             # Não configura mais o combobox, os dados são usados no modal
             # self.item_raiz_combo.configure(values=list(self.item_raiz_map.keys()))
 
         # Carregar todas as composições em memória para performance
-        sql_all_comps = "SELECT id, id_item_pai, id_item_filho, quantidade FROM item_composicao"
-        all_comps_data = self._execute_query(sql_all_comps, fetch='all')
         if all_comps_data:
             for comp in all_comps_data:
                 pai_id = comp['id_item_pai']
@@ -315,15 +332,7 @@ class VincularApp:
 
     def _truncate_text(self, text, max_width, font_obj):
         """Trunca o texto com '...' se exceder a largura máxima da coluna."""
-        if not isinstance(text, str):
-            return text
-        
-        text_width = font_obj.measure(text)
-        if text_width > max_width:
-            while font_obj.measure(text + '...') > max_width and len(text) > 0:
-                text = text[:-1]
-            return text + '...'
-        return text
+        return truncar_texto(text, max_width, font_obj)
 
     def on_item_raiz_selected(self, event=None):
         self.itens_listbox.delete(0, 'end')
@@ -410,6 +419,8 @@ class VincularApp:
             if self._execute_query(sql_insert, params):
                 inserted_count += 1
 
+        if inserted_count:
+            invalidate('cliente_item')
         messagebox.showinfo("Sucesso", f"Operação concluída. {inserted_count} registros inseridos.")
         self.on_pedido_selected() # Recarrega a lista de vínculos
 
@@ -491,6 +502,7 @@ class VincularApp:
         if nova_quantidade is not None and nova_quantidade >= 0:
             sql = "UPDATE cliente_item SET quantidade_prod = %s WHERE id_item = %s"
             if self._execute_query(sql, (nova_quantidade, self.selected_vinculo_id)):
+                invalidate('cliente_item')
                 messagebox.showinfo("Sucesso", "Quantidade atualizada com sucesso.")
                 self.on_pedido_selected() # Recarrega a lista
             else:
@@ -506,7 +518,11 @@ class VincularApp:
 
         if messagebox.askyesno("Confirmar Exclusão", f"Tem certeza que deseja excluir o vínculo para o item:\n{descricao}?"):
             sql = "DELETE FROM cliente_item WHERE id_item = %s"
-            if self._execute_query(sql, (self.selected_vinculo_id,)):
+            id_vinculo = self.selected_vinculo_id
+            # As TRs que tinham este item recalculam o status sem ele
+            if self._execute_query(sql, (id_vinculo,),
+                                   after=lambda cursor: atualizar_status_tr_itens_excluidos(cursor, [id_vinculo])):
+                invalidate('cliente_item')
                 messagebox.showinfo("Sucesso", "Vínculo excluído com sucesso.")
                 self.on_pedido_selected() # Recarrega a lista
             else:
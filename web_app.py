@@ -1,9 +1,18 @@
 from flask import Flask, render_template, jsonify, request, redirect, url_for, session, flash, send_from_directory, send_file
-import pymysql
-from config import DB_HOST, DB_USER, DB_PASS, DB_NAME
+from models import get_raw_connection, get_engine_metrics
+from api_paging import PageArgsError, parse_page_args, paged_response, like, where_clause
+from api_stream import stream_format, stream_query
+from http_cache import conditional_response
+from ref_cache import cached, invalidate, cache_stats
+from log_setup import setup_logging, logging_stats
+import request_metrics
+from slow_query import slow_query_report
+from status_tr import atualizar_status_tr_itens_excluidos
+import config
 from werkzeug.security import check_password_hash
 from werkzeug.utils import secure_filename
 from functools import wraps
+import hmac
 import datetime
 import os
 import io
@@ -14,10 +23,11 @@ try:
 except ImportError:
     DocxTemplate = None
 
-logging.basicConfig(level=logging.DEBUG)  # Configure o nível de log no início do arquivo
+setup_logging()  # Logging em fila (stdout + config.LOG_FILE com rotação), ver log_setup.py
 
 # Inicializa a aplicação Flask
 app = Flask(__name__)
+request_metrics.init_app(app)  # Server-Timing + percentis por endpoint (/metrics/requests)
 # Chave secreta para gerenciar sessões de usuário. ESSENCIAL para o login funcionar.
 # Mude para um valor seguro e aleatório.
 app.secret_key = 'chave-secreta-para-a-sessao-web'
@@ -27,16 +37,14 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 def get_db_connection():
-    """Cria e retorna uma conexão com o banco de dados."""
-    connection = pymysql.connect(
-        host=DB_HOST,
-        user=DB_USER,
-        password=DB_PASS,
-        database=DB_NAME,
-        charset='utf8mb4',
-        cursorclass=pymysql.cursors.DictCursor
-    )
-    return connection
+    """Retorna uma conexão do engine compartilhado com app.py (close() a devolve ao pool)."""
+    return get_raw_connection()
+
+def fetch_all(sql, params=None):
+    """Executa a consulta numa conexão do pool e retorna todas as linhas."""
+    with get_db_connection() as connection, connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
 
 def login_required(f):
     """
@@ -126,30 +134,75 @@ def home(): # type: ignore
 
 @app.route('/api/slide-data')
 @login_required # <-- A API TAMBÉM EXIGE LOGIN
+@conditional_response('cliente_item', 'pedido', 'add_cliente', 'itens')
 def get_slide_data(): # type: ignore
-    """Endpoint de API para buscar os dados do slide show."""
+    """
+    Endpoint de API para buscar os dados do slide show.
+    Paginado por pedido (idpedido decrescente): cada página traz todos os itens de até `limit` pedidos.
+    Com `?stream=1` (ou `?stream=ndjson`) envia todos os itens filtrados em streaming, sem paginação.
+    """
+    try:
+        page = parse_page_args()
+    except PageArgsError as e:
+        return jsonify({"error": str(e)}), 400
+
+    base_from = """
+        FROM cliente_item ci
+        JOIN pedido p ON ci.idpedido = p.idpedido
+        JOIN add_cliente ac ON p.idcliente = ac.idcliente
+        JOIN itens pai ON ci.item_raiz_id = pai.id
+        JOIN itens filho ON ci.id_item_fk = filho.id
+    """
+    where, params = [], []
+    if page['q']:
+        where.append("(p.numero_pedido LIKE %s OR ac.cliente LIKE %s OR pai.descricao LIKE %s OR filho.descricao LIKE %s)")
+        params += [like(page['q'])] * 4
+    if page['status']:
+        where.append("ci.status_producao = %s")
+        params.append(page['status'])
+    columns = """
+        p.idpedido,
+        p.numero_pedido AS pedido,
+        ac.cliente AS nome_cliente,
+        ac.endereco,
+        ci.id_item AS id_vinculo,
+        ci.status_producao,
+        pai.descricao AS equipamento_pai,
+        filho.descricao AS conjunto
+    """
+    page_where = where + (["p.idpedido < %s"] if page['cursor'] is not None else [])
+    page_params = params + ([page['cursor']] if page['cursor'] is not None else [])
+
     try:
+        fmt = stream_format()
+        if fmt:
+            return stream_query(
+                f"SELECT {columns} {base_from} {where_clause(where)} ORDER BY p.idpedido DESC", params, fmt)
+
         with get_db_connection() as connection, connection.cursor() as cursor:
-            sql = """
-                SELECT 
-                    p.idpedido,
-                    p.numero_pedido AS pedido,
-                    ac.cliente AS nome_cliente,
-                    ac.endereco,
-                    ci.id_item AS id_vinculo,
-                    ci.status_producao,
-                    pai.descricao AS equipamento_pai,
-                    filho.descricao AS conjunto
-                FROM cliente_item ci
-                JOIN pedido p ON ci.idpedido = p.idpedido
-                JOIN add_cliente ac ON p.idcliente = ac.idcliente
-                JOIN itens pai ON ci.item_raiz_id = pai.id
-                JOIN itens filho ON ci.id_item_fk = filho.id
-                ORDER BY p.idpedido DESC;
-            """
-            cursor.execute(sql)
-            slide_data = cursor.fetchall()
-        return jsonify(slide_data)
+            cursor.execute(f"SELECT COUNT(DISTINCT p.idpedido) AS total {base_from} {where_clause(where)}", params)
+            total = cursor.fetchone()['total']
+
+            # Pedidos da página (um a mais para saber se existe a próxima)
+            cursor.execute(
+                f"SELECT DISTINCT p.idpedido {base_from} {where_clause(page_where)} ORDER BY p.idpedido DESC LIMIT %s",
+                page_params + [page['limit'] + 1])
+            ids = [row['idpedido'] for row in cursor.fetchall()]
+            next_cursor = ids[page['limit'] - 1] if len(ids) > page['limit'] else None
+            ids = ids[:page['limit']]
+
+            slide_data = []
+            if ids:
+                placeholders = ','.join(['%s'] * len(ids))
+                sql = f"""
+                    SELECT {columns}
+                    {base_from}
+                    {where_clause(where + [f"p.idpedido IN ({placeholders})"])}
+                    ORDER BY p.idpedido DESC
+                """
+                cursor.execute(sql, params + ids)
+                slide_data = cursor.fetchall()
+        return paged_response(slide_data, total, next_cursor, page)
     except Exception as e:
         print(f"Erro na API: {e}")
         return jsonify({"error": "Erro ao buscar dados"}), 500
@@ -168,19 +221,48 @@ def pedidos_page(): # type: ignore
 @app.route('/api/pedidos', methods=['GET'])
 @login_required
 def get_pedidos(): # type: ignore
-    """API para buscar todos os pedidos."""
+    """
+    API para buscar os pedidos, do mais recente para o mais antigo.
+    Aceita `q` (número, cliente ou endereço), `status` (status de algum item do pedido),
+    `limit` e `cursor` (idpedido do último pedido da página anterior).
+    """
+    try:
+        page = parse_page_args()
+    except PageArgsError as e:
+        return jsonify({"error": str(e)}), 400
+
+    where, params = [], []
+    if page['q']:
+        where.append("(p.numero_pedido LIKE %s OR c.cliente LIKE %s OR c.endereco LIKE %s)")
+        params += [like(page['q'])] * 3
+    if page['status']:
+        where.append("EXISTS (SELECT 1 FROM cliente_item ci WHERE ci.idpedido = p.idpedido AND ci.status_producao = %s)")
+        params.append(page['status'])
+    page_where = where + (["p.idpedido < %s"] if page['cursor'] is not None else [])
+    page_params = params + ([page['cursor']] if page['cursor'] is not None else [])
+
     try:
         with get_db_connection() as connection, connection.cursor() as cursor:
-            sql = """
+            base_from = "FROM pedido p LEFT JOIN add_cliente c ON p.idcliente = c.idcliente"
+            cursor.execute(f"SELECT COUNT(*) AS total {base_from} {where_clause(where)}", params)
+            total = cursor.fetchone()['total']
+
+            sql = f"""
                 SELECT 
                     p.idpedido, p.numero_pedido, p.data_entrega, p.pdf,
                     c.idcliente, c.cliente, c.endereco
-                FROM pedido p
-                LEFT JOIN add_cliente c ON p.idcliente = c.idcliente
-                ORDER BY p.numero_pedido DESC
+                {base_from}
+                {where_clause(page_where)}
+                ORDER BY p.idpedido DESC
+                LIMIT %s
             """
-            cursor.execute(sql)
+            # Um a mais para saber se existe a próxima página
+            cursor.execute(sql, page_params + [page['limit'] + 1])
             pedidos = cursor.fetchall()
+            next_cursor = None
+            if len(pedidos) > page['limit']:
+                pedidos = pedidos[:page['limit']]
+                next_cursor = pedidos[-1]['idpedido']
             # Formata a data para o frontend
             for pedido in pedidos:
                 # Formata a data
@@ -190,7 +272,7 @@ def get_pedidos(): # type: ignore
                 # Cria os campos 'id' e 'display' que o frontend espera para o modal de seleção
                 pedido['id'] = pedido['idpedido']
                 pedido['display'] = f"Nº {pedido['numero_pedido']} - {pedido.get('cliente', 'Cliente não definido')}"
-            return jsonify(pedidos)
+            return paged_response(pedidos, total, next_cursor, page)
     except Exception as e:
         print(f"Erro na API de pedidos: {e}")
         return jsonify({"error": "Erro ao buscar pedidos"}), 500
@@ -215,6 +297,7 @@ def create_pedido(): # type: ignore
             sql = "INSERT INTO pedido (numero_pedido, idcliente, data_entrega, pdf) VALUES (%s, %s, %s, %s)"
             cursor.execute(sql, (numero_pedido, idcliente, data_entrega, pdf_filename))
             connection.commit()
+            invalidate('pedido')
 
         return jsonify({"success": True, "message": "Pedido criado com sucesso!"}), 201
 
@@ -251,6 +334,7 @@ def update_pedido(pedido_id): # type: ignore
             sql = "UPDATE pedido SET numero_pedido = %s, idcliente = %s, data_entrega = %s, pdf = %s WHERE idpedido = %s"
             cursor.execute(sql, (numero_pedido, idcliente, data_entrega, pdf_filename, pedido_id))
             connection.commit()
+            invalidate('pedido')
 
         return jsonify({"success": True, "message": "Pedido atualizado com sucesso!"})
 
@@ -260,14 +344,14 @@ def update_pedido(pedido_id): # type: ignore
 
 @app.route('/api/clientes', methods=['GET'])
 @login_required
+@conditional_response('add_cliente')
 def get_clientes(): # type: ignore
     """API para buscar todos os nomes de clientes únicos."""
     try:
-        with get_db_connection() as connection, connection.cursor() as cursor:
-            # Usamos DISTINCT para evitar nomes de clientes duplicados
-            cursor.execute("SELECT DISTINCT cliente FROM add_cliente ORDER BY cliente")
-            clientes = cursor.fetchall()
-            return jsonify([c['cliente'] for c in clientes])
+        # Usamos DISTINCT para evitar nomes de clientes duplicados
+        clientes = cached(('clientes',), ('add_cliente',),
+                          lambda: fetch_all("SELECT DISTINCT cliente FROM add_cliente ORDER BY cliente"))
+        return jsonify([c['cliente'] for c in clientes])
     except Exception as e:
         print(f"Erro na API de clientes: {e}")
         return jsonify({"error": "Erro ao buscar clientes"}), 500
@@ -280,12 +364,11 @@ def get_enderecos(): # type: ignore
     if not cliente_nome:
         return jsonify({"error": "Nome do cliente é obrigatório"}), 400
     try:
-        with get_db_connection() as connection, connection.cursor() as cursor:
-            # Retorna o id e o endereço para um dado nome de cliente
-            sql = "SELECT idcliente, endereco FROM add_cliente WHERE cliente = %s ORDER BY endereco"
-            cursor.execute(sql, (cliente_nome,))
-            enderecos = cursor.fetchall()
-            return jsonify(enderecos)
+        # Retorna o id e o endereço para um dado nome de cliente
+        sql = "SELECT idcliente, endereco FROM add_cliente WHERE cliente = %s ORDER BY endereco"
+        enderecos = cached(('enderecos', cliente_nome), ('add_cliente',),
+                           lambda: fetch_all(sql, (cliente_nome,)))
+        return jsonify(enderecos)
     except Exception as e:
         print(f"Erro na API de endereços: {e}")
         return jsonify({"error": "Erro ao buscar endereços"}), 500
@@ -300,6 +383,7 @@ def create_cliente(): # type: ignore
             sql = "INSERT INTO add_cliente (cliente, endereco) VALUES (%s, %s)"
             cursor.execute(sql, (data['cliente'], data['endereco']))
             connection.commit()
+            invalidate('add_cliente')
             return jsonify({"success": True, "message": "Cliente criado com sucesso!"}), 201
     except Exception as e:
         print(f"Erro ao criar cliente: {e}")
@@ -395,32 +479,41 @@ def trilhadeira_page():
     }
     return render_template('trilhadeira.html', user=user)
 
+def _data_entrega_iso(row):
+    """Converte `data_entrega` para ISO 8601 (o jsonify usaria o formato de data HTTP)."""
+    if row.get('data_entrega'):
+        row['data_entrega'] = row['data_entrega'].isoformat()
+    return row
+
 # Rota de API para buscar os dados da Trilhadeira
 @app.route('/api/trilhadeira')
 @login_required # type: ignore
 def get_trilhadeira_data():
     connection = None # Garante que a variável exista
+    # Esta query é uma adaptação da que está no seu código Tkinter
+    sql = """
+        SELECT 
+            p.idpedido, p.numero_pedido, ac.cliente, ac.endereco, p.data_entrega,
+            pt.idpedidos_tr, pt.status, pt.modelo, pt.montagem, pt.frete, 
+            pt.frequencia, pt.bica, pt.n_serie, pt.observacao
+        FROM pedidos_tr AS pt
+        JOIN pedido AS p ON pt.id_pedido = p.idpedido
+        JOIN add_cliente AS ac ON p.idcliente = ac.idcliente
+        ORDER BY p.data_entrega DESC, p.idpedido DESC
+    """
     try:
+        fmt = stream_format()
+        if fmt:
+            return stream_query(sql, None, fmt, transform=_data_entrega_iso)
+
         connection = get_db_connection() # Use sua função existente para conectar ao DB
         with connection.cursor() as cursor:
-            # Esta query é uma adaptação da que está no seu código Tkinter
-            sql = """
-                SELECT 
-                    p.idpedido, p.numero_pedido, ac.cliente, ac.endereco, p.data_entrega,
-                    pt.idpedidos_tr, pt.status, pt.modelo, pt.montagem, pt.frete, 
-                    pt.frequencia, pt.bica, pt.n_serie, pt.observacao
-                FROM pedidos_tr AS pt
-                JOIN pedido AS p ON pt.id_pedido = p.idpedido
-                JOIN add_cliente AS ac ON p.idcliente = ac.idcliente
-                ORDER BY p.data_entrega DESC, p.idpedido DESC
-            """
             cursor.execute(sql)
             data = cursor.fetchall()
             
             # Converte objetos datetime para string para serem serializáveis em JSON
             for row in data:
-                if row.get('data_entrega'):
-                    row['data_entrega'] = row['data_entrega'].isoformat()
+                _data_entrega_iso(row)
 
             return jsonify(data)
     except Exception as e:
@@ -433,6 +526,7 @@ def get_trilhadeira_data():
 # Rota de API para buscar equipamentos disponíveis para a Trilhadeira
 @app.route('/api/equipamentos-tr', methods=['GET'])
 @login_required # type: ignore
+@conditional_response('itens', 'cliente_item', 'pedidos_tr')
 def get_equipamentos_tr():
     """
     Endpoint para buscar equipamentos que podem ser adicionados à trilhadeira.
@@ -477,6 +571,7 @@ def cliente_produto_page():
 
 @app.route('/api/itens-raiz', methods=['GET'])
 @login_required
+@conditional_response('itens', 'item_composicao')
 def get_itens_raiz(): # type: ignore
     """API para buscar todos os itens que são 'pais' (equipamentos)."""
     try:
@@ -583,6 +678,7 @@ def vincular_item(): # type: ignore
                 )
                 cursor.execute(sql, params)
             connection.commit()
+            invalidate('cliente_item')
         return jsonify({"message": "Vínculo(s) criado(s) com sucesso!"}), 201
     except Exception as e:
         print(f"Erro ao vincular item: {e}")
@@ -595,6 +691,7 @@ def update_vinculo_quantidade(vinculo_id): # type: ignore
     with get_db_connection() as conn, conn.cursor() as cursor:
         cursor.execute("UPDATE cliente_item SET quantidade_prod = %s WHERE id_item = %s", (data['quantidade'], vinculo_id))
         conn.commit()
+        invalidate('cliente_item')
     return jsonify({"message": "Quantidade atualizada com sucesso!"})
 
 @app.route('/api/vinculo/<int:vinculo_id>', methods=['DELETE']) # type: ignore
@@ -602,7 +699,9 @@ def update_vinculo_quantidade(vinculo_id): # type: ignore
 def delete_vinculo(vinculo_id):
     with get_db_connection() as conn, conn.cursor() as cursor:
         cursor.execute("DELETE FROM cliente_item WHERE id_item = %s", (vinculo_id,))
+        atualizar_status_tr_itens_excluidos(cursor, [vinculo_id]) # TRs que tinham o item
         conn.commit()
+        invalidate('cliente_item')
     return jsonify({"message": "Vínculo excluído com sucesso!"})
 
 @app.route('/cadastro-itens') # type: ignore
@@ -618,42 +717,46 @@ def cadastro_itens_page():
 
 @app.route('/api/itens', methods=['GET'])
 @login_required
+@conditional_response('itens')
 def get_itens(): # type: ignore
     """API para buscar todos os itens."""
     try:
-        with get_db_connection() as connection, connection.cursor() as cursor:
-            # Retorna todos os itens para preencher as listas no frontend
-            sql = "SELECT id, codigo, descricao FROM itens ORDER BY descricao"
-            cursor.execute(sql)
-            itens = cursor.fetchall()
-            return jsonify(itens)
+        # Retorna todos os itens para preencher as listas no frontend
+        itens = cached(('itens',), ('itens',),
+                       lambda: fetch_all("SELECT id, codigo, descricao FROM itens ORDER BY descricao"))
+        return jsonify(itens)
     except Exception as e:
         print(f"Erro na API de itens: {e}")
         return jsonify({"error": "Erro ao buscar itens"}), 500
 
 @app.route('/api/item-composicao', methods=['GET'])
 @login_required
+@conditional_response('item_composicao', 'itens')
 def get_item_composicao(): # type: ignore
-    """API para buscar toda a hierarquia de composição de itens."""
+    """API para buscar toda a hierarquia de composição de itens (`?stream=1` envia em streaming)."""
+    sql = """
+        SELECT 
+            ic.id, 
+            ic.id_item_pai,
+            p.codigo AS pai_codigo,
+            p.descricao AS pai_desc,
+            ic.id_item_filho,
+            f.codigo AS filho_codigo,
+            f.descricao AS filho_desc,
+            ic.quantidade
+        FROM item_composicao ic
+        /* Junta com a tabela de itens para obter os dados do PAI */
+        JOIN itens p ON ic.id_item_pai = p.id
+        /* Junta com a tabela de itens novamente para obter os dados do FILHO */
+        JOIN itens f ON ic.id_item_filho = f.id
+        ORDER BY p.descricao, f.descricao;
+    """
     try:
+        fmt = stream_format()
+        if fmt:
+            return stream_query(sql, None, fmt)
+
         with get_db_connection() as connection, connection.cursor() as cursor:
-            sql = """
-                SELECT 
-                    ic.id, 
-                    ic.id_item_pai,
-                    p.codigo AS pai_codigo,
-                    p.descricao AS pai_desc,
-                    ic.id_item_filho,
-                    f.codigo AS filho_codigo,
-                    f.descricao AS filho_desc,
-                    ic.quantidade
-                FROM item_composicao ic
-                /* Junta com a tabela de itens para obter os dados do PAI */
-                JOIN itens p ON ic.id_item_pai = p.id
-                /* Junta com a tabela de itens novamente para obter os dados do FILHO */
-                JOIN itens f ON ic.id_item_filho = f.id
-                ORDER BY p.descricao, f.descricao;
-            """
             cursor.execute(sql)
             composicao = cursor.fetchall()
             return jsonify(composicao)
@@ -712,15 +815,19 @@ def material_page(): # type: ignore
 @app.route('/api/chapas', methods=['GET'])
 @login_required
 def get_chapas(): # type: ignore
-    """API para buscar todas as chapas em estoque."""
+    """API para buscar todas as chapas em estoque (`?stream=1` envia em streaming)."""
+    sql = """
+        SELECT idmateriais, descricao_material, bitola, largura, comprimento, quant_kg, quant_un 
+        FROM materiais
+        WHERE tipo_material = 'chapa'
+        ORDER BY descricao_material ASC
+    """
     try:
+        fmt = stream_format()
+        if fmt:
+            return stream_query(sql, None, fmt)
+
         with get_db_connection() as connection, connection.cursor() as cursor:
-            sql = """
-                SELECT idmateriais, descricao_material, bitola, largura, comprimento, quant_kg, quant_un 
-                FROM materiais
-                WHERE tipo_material = 'chapa'
-                ORDER BY descricao_material ASC
-            """
             cursor.execute(sql)
             chapas = cursor.fetchall()
             return jsonify(chapas)
@@ -728,8 +835,6 @@ def get_chapas(): # type: ignore
         print(f"Erro na API de buscar chapas: {e}")
         return jsonify({"error": "Erro ao buscar chapas"}), 500
 
-logging.basicConfig(level=logging.DEBUG)  # Configure o nível de log
-
 @app.route('/api/chapas', methods=['POST'])
 @login_required
 def add_chapa(): # type: ignore
@@ -936,6 +1041,37 @@ def get_serra_items():
         logging.error(f"Erro na API de buscar itens de serra: {e}")
         return jsonify({"error": "Erro ao buscar itens de serra"}), 500
 
+def metrics_required(f):
+    """Decorator das rotas /metrics: admin logado ou o token METRICS_TOKEN (cabeçalho X-Metrics-Token ou ?token=)."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = request.headers.get('X-Metrics-Token') or request.args.get('token') or ''
+        # compare_digest: o tempo da comparação não revela quantos caracteres do token acertaram
+        token_ok = bool(config.METRICS_TOKEN) and hmac.compare_digest(token.encode(), config.METRICS_TOKEN.encode())
+        if not (session.get('role') == 'admin' or token_ok):
+            return jsonify({"error": "Não autorizado"}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+@app.route('/metrics')
+@metrics_required
+def metrics(): # type: ignore
+    """Estado do pool de conexões deste worker (conexões em uso, tempo de espera)."""
+    return jsonify({"engine": get_engine_metrics(), "ref_cache": cache_stats(), "logging": logging_stats()})
+
+@app.route('/metrics/requests')
+@metrics_required
+def metrics_requests(): # type: ignore
+    """Percentis de tempo total/banco por endpoint deste worker (mais lentos primeiro)."""
+    return jsonify({"pid": os.getpid(), "endpoints": request_metrics.endpoint_stats()})
+
+@app.route('/metrics/slow-queries')
+@metrics_required
+def metrics_slow_queries(): # type: ignore
+    """Consultas lentas deste worker com EXPLAIN (o agregado de todos: `python slow_query.py`)."""
+    return jsonify({"pid": os.getpid(), "threshold_ms": config.SLOW_QUERY_MS,
+                    "queries": slow_query_report(request.args.get('top', 20, type=int))})
+
 if __name__ == '__main__':
     # Executa o servidor web. Acesse http://127.0.0.1:5000 no seu navegador.
     # O modo debug recarrega o servidor automaticamente quando você salva o arquivo.